@@ -0,0 +1,124 @@
+import time
+import uuid
+import chess
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional, List, Any
+from backend.chess_agent.inference_server import InferenceServer
+from backend.configs.api_config import ApiConfig
+
+
+@dataclass
+class GameSession:
+    session_id: str
+    model_name: str
+    board: chess.Board
+    agent_color: chess.Color
+    inference_server: Optional[InferenceServer] = None  # resolved once, again only after ModelStore evicted the model
+    connected: bool = False
+    last_active: float = field(default_factory=time.monotonic)
+
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+
+class SessionLimitError(Exception):
+    pass
+
+
+class SessionInUseError(Exception):
+    pass
+
+
+class GameSessionStore:
+
+    # live games of this process, a disconnected game can be resumed by its session_id until it is idle for too long
+    _sessions: Dict[str, GameSession] = {}
+    _lock = threading.Lock()
+
+    created = 0
+    evicted = 0
+
+
+    @classmethod
+    def create(cls, model_name: str, board: chess.Board, agent_color: chess.Color) -> GameSession:
+        cls.evict_idle()
+
+        with cls._lock:
+            if len(cls._sessions) >= ApiConfig.MAX_SESSIONS:
+                raise SessionLimitError(f"Too many game sessions ({ApiConfig.MAX_SESSIONS}), try again later")
+
+            session = GameSession(session_id=uuid.uuid4().hex, model_name=model_name, board=board, agent_color=agent_color, connected=True)
+            cls._sessions[session.session_id] = session
+            cls.created += 1
+
+        return session
+
+
+    @classmethod
+    def get(cls, session_id: str) -> Optional[GameSession]:
+        with cls._lock:
+            session = cls._sessions.get(session_id)
+
+        if session is not None:
+            session.touch()
+
+        return session
+
+
+    @classmethod
+    def attach(cls, session_id: str) -> Optional[GameSession]:
+        # one connection per session, two sockets pushing moves to the same board would interleave them
+        with cls._lock:
+            session = cls._sessions.get(session_id)
+
+            if session is None:
+                return None
+
+            if session.connected:
+                raise SessionInUseError(f"Session {session_id} is already connected")
+
+            session.connected = True
+            session.touch()
+
+        return session
+
+
+    @classmethod
+    def detach(cls, session: GameSession):
+        with cls._lock:
+            session.connected = False
+
+
+    @classmethod
+    def remove(cls, session_id: str):
+        with cls._lock:
+            cls._sessions.pop(session_id, None)
+
+
+    @classmethod
+    def evict_idle(cls, idle_timeout_s: float = ApiConfig.SESSION_IDLE_TIMEOUT_S) -> List[str]:
+        deadline = time.monotonic() - idle_timeout_s
+
+        with cls._lock:
+            session_ids = [session_id for session_id, session in cls._sessions.items() if session.last_active < deadline]
+
+            for session_id in session_ids:
+                del cls._sessions[session_id]
+
+            cls.evicted += len(session_ids)
+
+        return session_ids
+
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        with cls._lock:
+            return {
+                'sessions': len(cls._sessions),
+                'connected': sum(session.connected for session in cls._sessions.values()),
+                'max_sessions': ApiConfig.MAX_SESSIONS,
+                'created': cls.created,
+                'evicted': cls.evicted,
+            }
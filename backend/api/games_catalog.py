@@ -0,0 +1,222 @@
+import os
+import time
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Tuple, Any
+from backend.chess_env.game_archive import GameArchive, RESULTS
+from backend.configs.api_config import ApiConfig
+from backend.configs.path_config import PathConfig
+from backend.utils.pgn_reader import PgnReader
+
+
+@dataclass
+class GamesQuery:
+    offset: int = 0
+    limit: Optional[int] = None
+    sort_by: str = "mtime_ns"
+    descending: bool = True
+    mode: Optional[str] = None
+    result: Optional[str] = None
+    min_episode: Optional[int] = None
+    max_episode: Optional[int] = None
+    min_elo: Optional[int] = None  # both players
+    max_elo: Optional[int] = None
+    min_moves: Optional[int] = None
+    max_moves: Optional[int] = None
+
+
+class GamesCatalog:
+
+    # saved games indexed in sqlite, the directory is rescanned only when it changes and only changed files are parsed
+    # games from the game archive are indexed from its records, they have no file of their own
+    SORT_COLUMNS = ("mtime_ns", "episode", "white_elo", "black_elo", "moves_num", "file_name")
+    COLUMNS = ("file_name", "mtime_ns", "size", "mode", "episode", "white_elo", "black_elo", "result", "moves_num")
+
+    _connection: Optional[sqlite3.Connection] = None
+    _lock = threading.Lock()
+
+    _dir_mtime_ns: Optional[int] = None
+    _refreshed_at: float = 0.0
+
+    files_parsed = 0
+
+
+    @classmethod
+    def query(cls, games_query: GamesQuery) -> Tuple[List[Dict[str, Any]], int]:
+        if games_query.sort_by not in GamesCatalog.SORT_COLUMNS:
+            raise ValueError(f"Unsupported sort column: {games_query.sort_by}. Available columns: {GamesCatalog.SORT_COLUMNS}")
+
+        cls.refresh()
+
+        conditions, params = GamesCatalog.get_conditions(games_query=games_query)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "DESC" if games_query.descending else "ASC"
+
+        with cls._lock:
+            connection = cls.get_connection()
+            total = connection.execute(f"SELECT COUNT(*) FROM games {where}", params).fetchone()[0]
+            rows = connection.execute(
+                f"SELECT {', '.join(GamesCatalog.COLUMNS)} FROM games {where} "
+                f"ORDER BY {games_query.sort_by} {order}, file_name {order} LIMIT ? OFFSET ?",
+                [*params, games_query.limit if games_query.limit is not None else -1, games_query.offset],
+            ).fetchall()
+
+        return [dict(zip(GamesCatalog.COLUMNS, row)) for row in rows], total
+
+
+    @staticmethod
+    def get_conditions(games_query: GamesQuery) -> Tuple[List[str], List[Any]]:
+        conditions, params = [], []
+
+        for condition, value in (
+            ("mode = ?", games_query.mode),
+            ("result = ?", games_query.result),
+            ("episode >= ?", games_query.min_episode),
+            ("episode <= ?", games_query.max_episode),
+            ("moves_num >= ?", games_query.min_moves),
+            ("moves_num <= ?", games_query.max_moves),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+
+        if games_query.min_elo is not None:
+            conditions.append("MIN(white_elo, black_elo) >= ?")
+            params.append(games_query.min_elo)
+
+        if games_query.max_elo is not None:
+            conditions.append("MAX(white_elo, black_elo) <= ?")
+            params.append(games_query.max_elo)
+
+        return conditions, params
+
+
+    @classmethod
+    def refresh(cls, force: bool = False) -> int:
+        # a file added or removed changes the mtime of the directory, an unchanged directory is not scanned at all
+        games_path = PathConfig.SAVED_GAMES_PATH_BASE
+        dir_mtime_ns = os.stat(games_path).st_mtime_ns
+
+        archive = GameArchive.open(read_only=True)
+        archive_changed = archive is not None and archive.refresh() > 0
+
+        if not force and not archive_changed and dir_mtime_ns == cls._dir_mtime_ns \
+                and time.monotonic() - cls._refreshed_at < ApiConfig.GAMES_CATALOG_RESCAN_INTERVAL_S:
+            return 0
+
+        with cls._lock:
+            connection = cls.get_connection()
+            indexed = {file_name: (mtime_ns, size) for file_name, mtime_ns, size in connection.execute("SELECT file_name, mtime_ns, size FROM games WHERE archived = 0")}
+
+            changed_rows = []
+            present = set()
+
+            with os.scandir(games_path) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".pgn") or not entry.is_file():
+                        continue
+
+                    stat = entry.stat()
+                    present.add(entry.name)
+
+                    if indexed.get(entry.name) != (stat.st_mtime_ns, stat.st_size):
+                        changed_rows.append(GamesCatalog.parse_game_file(file_path=entry.path, mtime_ns=stat.st_mtime_ns, size=stat.st_size))
+
+            removed = [(file_name,) for file_name in indexed.keys() - present]
+
+            with connection:
+                connection.executemany(f"INSERT OR REPLACE INTO games ({', '.join(GamesCatalog.COLUMNS)}) "
+                                       f"VALUES ({', '.join('?' * len(GamesCatalog.COLUMNS))})", changed_rows)
+                connection.executemany("DELETE FROM games WHERE file_name = ? AND archived = 0", removed)
+
+            archived_num = GamesCatalog.index_archive(connection=connection, archive=archive) if archive is not None else 0
+
+            cls._dir_mtime_ns = dir_mtime_ns
+            cls._refreshed_at = time.monotonic()
+            cls.files_parsed += len(changed_rows)
+
+        return len(changed_rows) + len(removed) + archived_num
+
+
+    @staticmethod
+    def index_archive(connection: sqlite3.Connection, archive: GameArchive) -> int:
+        # archive records are append-only and carry their own metadata, only the ones after the last indexed record are added
+        row = connection.execute("SELECT value FROM catalog_state WHERE key = 'archive_records'").fetchone()
+        indexed_num = row[0] if row is not None else 0
+
+        if indexed_num > len(archive):  # the archive was replaced
+            connection.execute("DELETE FROM games WHERE archived = 1")
+            indexed_num = 0
+
+        records = archive.records[indexed_num:]
+        rows = [
+            (archive.get_record_file_name(record_idx=indexed_num + i), int(record['saved_at'] * 1e9), int(record['length']),
+             record['mode'].decode("utf-8"), int(record['episode']), int(record['white_elo']), int(record['black_elo']),
+             RESULTS[record['result']], int(record['moves_num']))
+            for i, record in enumerate(records)
+        ]
+
+        with connection:
+            connection.executemany(f"INSERT OR REPLACE INTO games ({', '.join(GamesCatalog.COLUMNS)}, archived) "
+                                   f"VALUES ({', '.join('?' * len(GamesCatalog.COLUMNS))}, 1)", rows)
+            connection.execute("INSERT OR REPLACE INTO catalog_state VALUES ('archive_records', ?)", (len(archive),))
+
+        return len(rows)
+
+
+    @staticmethod
+    def parse_game_file(file_path: str, mtime_ns: int, size: int) -> Tuple:
+        # episode and elo from the name save_game_pgn gives the file, result and moves num from the pgn itself
+        file_name = os.path.basename(file_path)
+        match = GameArchive.FILE_NAME_PATTERN.match(file_name)
+
+        parsed_game = PgnReader.parse(file_path=file_path)  # not cached, a full scan would flush the games being replayed
+
+        headers = parsed_game.headers if parsed_game is not None else {}
+        moves_num = len(parsed_game.moves) if parsed_game is not None else 0
+
+        if match is not None:
+            mode, episode = match["mode"], int(match["episode"])
+            white_elo, black_elo = int(match["white_elo"]), int(match["black_elo"])
+        else:
+            mode, episode = None, None
+            white_elo = GamesCatalog.parse_elo(headers.get("white_elo"))
+            black_elo = GamesCatalog.parse_elo(headers.get("black_elo"))
+
+        result = headers.get("result", headers.get("Result"))
+
+        return file_name, mtime_ns, size, mode, episode, white_elo, black_elo, result, moves_num
+
+
+    @staticmethod
+    def parse_elo(elo: Optional[str]) -> Optional[int]:
+        try:
+            return int(float(elo))
+        except (TypeError, ValueError):
+            return None
+
+
+    @classmethod
+    def get_connection(cls) -> sqlite3.Connection:
+        if cls._connection is None:
+            catalog_path = ApiConfig.GAMES_CATALOG_PATH or os.path.join(PathConfig.SAVED_GAMES_PATH_BASE, ".games_catalog.sqlite")
+
+            cls._connection = sqlite3.connect(catalog_path, check_same_thread=False)  # every access goes through _lock
+            cls._connection.execute("PRAGMA journal_mode=WAL")
+            cls._connection.execute(
+                "CREATE TABLE IF NOT EXISTS games ("
+                "file_name TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, mode TEXT, episode INTEGER, "
+                "white_elo INTEGER, black_elo INTEGER, result TEXT, moves_num INTEGER)"
+            )
+
+            # games appended to the game archive, catalogs created before it get the column added
+            if "archived" not in [column[1] for column in cls._connection.execute("PRAGMA table_info(games)")]:
+                cls._connection.execute("ALTER TABLE games ADD COLUMN archived INTEGER NOT NULL DEFAULT 0")
+
+            cls._connection.execute("CREATE TABLE IF NOT EXISTS catalog_state (key TEXT PRIMARY KEY, value INTEGER)")
+
+            for column in GamesCatalog.SORT_COLUMNS:
+                cls._connection.execute(f"CREATE INDEX IF NOT EXISTS games_{column} ON games ({column})")
+
+        return cls._connection
@@ -1,13 +1,52 @@
 import os
-from fastapi import FastAPI
+import chess
+import asyncio
+import contextlib
+from typing import Optional, Tuple, Dict, List
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Query
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from backend.api.game_sessions import GameSession, GameSessionStore, SessionLimitError, SessionInUseError
+from backend.api.games_catalog import GamesCatalog, GamesQuery
 from backend.api.models import *
-from backend.chess_agent.vs_human import VsHuman
+from backend.api.position_analyzer import PositionAnalyzer
+from backend.chess_agent.checkpoints.shared_weights import SharedWeights
+from backend.chess_agent.inference_server import InferenceServer, InferenceServerStoppedError
+from backend.chess_env.chess_env import ChessEnv
+from backend.chess_env.game_archive import GameArchive
+from backend.configs.api_config import ApiConfig
 from backend.configs.path_config import PathConfig
 from backend.utils.utils import Utils
 
 
-app = FastAPI()
+async def start_session_sweeper() -> asyncio.Task:
+    return asyncio.create_task(sweep_idle_sessions())
+
+
+async def stop_session_sweeper(session_sweeper: asyncio.Task):
+    session_sweeper.cancel()
+
+    with contextlib.suppress(asyncio.CancelledError):
+        await session_sweeper
+
+
+async def stop_inference_servers():
+    # stop_all drains the queued requests and joins the server threads, it blocks
+    await asyncio.get_running_loop().run_in_executor(InferenceServerStore.executor, InferenceServerStore.stop_all)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.session_sweeper = await start_session_sweeper()
+
+    try:
+        yield
+    finally:
+        await stop_session_sweeper(session_sweeper=app.state.session_sweeper)
+        await stop_inference_servers()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3007",
@@ -24,21 +63,34 @@ app.add_middleware(
 
 
 @app.get("/file-list", response_model=FileList)
-async def get_file_list(path_type: PathType) -> FileList:
-    path_map = {
-        PathType.games: PathConfig.SAVED_GAMES_PATH_BASE,
-        PathType.models: PathConfig.SAVED_MODELS_PATH_BASE
-    }
+async def get_file_list(path_type: PathType, offset: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1),
+                        sort_by: GamesSortField = GamesSortField.modified, descending: bool = True,
+                        mode: Optional[str] = None, result: Optional[str] = None,
+                        min_episode: Optional[int] = None, max_episode: Optional[int] = None,
+                        min_elo: Optional[int] = None, max_elo: Optional[int] = None,
+                        min_moves: Optional[int] = None, max_moves: Optional[int] = None) -> FileList:
+    # sorting, filtering and paging apply to the saved games only, they are served from the games catalog
+    if path_type == PathType.games:
+        games_query = GamesQuery(offset=offset, limit=limit, sort_by=sort_by.value, descending=descending, mode=mode, result=result,
+                                 min_episode=min_episode, max_episode=max_episode, min_elo=min_elo, max_elo=max_elo,
+                                 min_moves=min_moves, max_moves=max_moves)
+
+        games, total = await asyncio.get_running_loop().run_in_executor(InferenceServerStore.executor, GamesCatalog.query, games_query)
 
-    path = path_map.get(path_type, "")
+        return FileList(
+            file_names=[game["file_name"] for game in games],
+            total=total,
+            games=[SavedGameEntry(**game) for game in games],
+        )
+    elif path_type == PathType.models:
+        path = PathConfig.SAVED_MODELS_PATH_BASE
 
-    if path:
-        file_names = [f for f in os.listdir(path) if os.path.isfile(os.path.join(path, f))]
-        file_names.sort(key=lambda f: os.path.getmtime(os.path.join(path, f)), reverse=True)
+        with os.scandir(path) as entries:
+            files = [(entry.name, entry.stat().st_mtime_ns) for entry in entries if entry.is_file() and ModelStore.is_model_file(entry.name)]
 
-        file_list = FileList(file_names=file_names)
+        file_names = [file_name for file_name, _ in sorted(files, key=lambda file: file[1], reverse=True)]
 
-        return file_list
+        return FileList(file_names=file_names[offset:offset + limit if limit is not None else None], total=len(file_names))
     else:
         return FileList(file_names=[])
 
@@ -50,16 +102,231 @@ async def get_saved_game(file: str) -> SavedGameContent:
     if os.path.isfile(file_path):
         saved_game_content = Utils.extract_data_from_pgn(file=file_path)
         return saved_game_content
+
+    # games saved with GameConfig.ARCHIVE_GAMES have no file of their own
+    archive = GameArchive.open(read_only=True)
+    record_idx = archive.find(file_name=file) if archive is not None else None
+
+    if record_idx is not None:
+        return Utils.extract_data_from_archive(archive=archive, record_idx=record_idx)
     else:
         return SavedGameContent(white_elo='-1', black_elo='-1', result="", moves=[])
 
 
 @app.get("/play-vs-agent", response_model=Move)
 async def load_agent(model_file_name: str, fen: str) -> Move:
-    model, _ = ModelStore.load_model(model_file_name)
+    try:
+        board = chess.Board(fen)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid fen: {e}")
+
+    _, move_info = await choose_agent_move(model_file_name=model_file_name, board=board)
+
+    return move_info
+
+
+@app.websocket("/play-vs-agent/session")
+async def play_vs_agent_session(websocket: WebSocket, model_file_name: Optional[str] = None, fen: str = chess.STARTING_FEN,
+                                agent_color: str = "black", session_id: Optional[str] = None):
+    # the client sends only its moves in uci, the board and the model handle stay on the server between moves
+    await websocket.accept()
+
+    if session_id is not None:
+        try:
+            session = GameSessionStore.attach(session_id=session_id)
+        except SessionInUseError as e:
+            await websocket.close(code=4409, reason=str(e))
+            return
 
-    if model:
-        fen_after_move = Move(move_str=VsHuman.make_move(model=model, fen=fen))
-        return fen_after_move
+        if session is None:
+            await websocket.close(code=4404, reason="Session not found or expired")
+            return
     else:
-        return Move(move_str="")
+        try:
+            if model_file_name is None:
+                raise ValueError("model_file_name or session_id is required")
+
+            session = GameSessionStore.create(model_name=model_file_name, board=chess.Board(fen), agent_color=chess.WHITE if agent_color == "white" else chess.BLACK)
+        except ValueError as e:
+            await websocket.close(code=4400, reason=str(e))
+            return
+        except SessionLimitError as e:
+            await websocket.close(code=1013, reason=str(e))  # try again later
+            return
+
+    try:
+        await websocket.send_json({"type": "session", "session_id": session.session_id, "fen": session.board.fen()})
+
+        if session.board.turn == session.agent_color and not session.board.is_game_over():
+            if not await try_send_agent_move(websocket=websocket, session=session):
+                return
+
+        while not session.board.is_game_over():
+            try:
+                uci = await asyncio.wait_for(websocket.receive_text(), timeout=ApiConfig.SESSION_IDLE_TIMEOUT_S)
+            except asyncio.TimeoutError:
+                GameSessionStore.remove(session_id=session.session_id)
+                await websocket.close(code=1000, reason="Idle timeout")
+                return
+
+            session.touch()
+
+            try:
+                move = chess.Move.from_uci(uci.strip())
+            except ValueError:
+                move = None
+
+            if session.board.turn == session.agent_color or move is None or not session.board.is_legal(move):
+                await websocket.send_json({"type": "error", "detail": f"Illegal move: {uci}", "fen": session.board.fen()})
+                continue
+
+            session.board.push(move)
+
+            if not session.board.is_game_over():
+                if not await try_send_agent_move(websocket=websocket, session=session):
+                    return
+
+        await websocket.send_json({"type": "game_over", "result": session.board.result(), "fen": session.board.fen()})
+        GameSessionStore.remove(session_id=session.session_id)
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        pass  # the session stays resumable until it is idle for SESSION_IDLE_TIMEOUT_S
+    finally:
+        GameSessionStore.detach(session=session)
+
+
+@app.get("/play-vs-agent/metrics", response_model=Dict[str, Dict[str, float]])
+async def get_play_vs_agent_metrics() -> Dict[str, Dict[str, float]]:
+    return InferenceServerStore.get_metrics()
+
+
+@app.post("/analysis")
+async def analyze_positions(analysis_request: AnalysisRequest) -> StreamingResponse:
+    try:
+        boards = PositionAnalyzer.get_boards(fens=analysis_request.fens, pgn=analysis_request.pgn)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not boards:
+        raise HTTPException(status_code=400, detail="No positions, send fens or a pgn")
+
+    if len(boards) > ApiConfig.ANALYSIS_MAX_POSITIONS:
+        raise HTTPException(status_code=400, detail=f"Too many positions ({len(boards)} > {ApiConfig.ANALYSIS_MAX_POSITIONS})")
+
+    loop = asyncio.get_running_loop()
+    model = await run_model_task(analysis_request.model_file_name, ModelStore.load_model, analysis_request.model_file_name)
+
+    async def stream_analysis():
+        # one json line per position (ndjson), sent after every batched forward pass
+        for start in range(0, len(boards), ApiConfig.ANALYSIS_BATCH_SIZE):
+            chunk = boards[start:start + ApiConfig.ANALYSIS_BATCH_SIZE]
+            results = await loop.run_in_executor(InferenceServerStore.executor, PositionAnalyzer.analyze,
+                                                 model, chunk, analysis_request.top_k, analysis_request.include_eval)
+
+            yield "".join(PositionAnalysis(idx=start + i, **result).model_dump_json(exclude_none=True) + "\n" for i, result in enumerate(results))
+
+    return StreamingResponse(stream_analysis(), media_type="application/x-ndjson")
+
+
+@app.get("/play-vs-agent/policy-cache-stats", response_model=PolicyCacheStats)
+async def get_policy_cache_stats() -> PolicyCacheStats:
+    return PolicyCacheStats(**PolicyCache.get_stats())
+
+
+@app.post("/models/preload", response_model=ModelCacheStats)
+async def preload_models(preload_models: PreloadModels) -> ModelCacheStats:
+    await asyncio.get_running_loop().run_in_executor(InferenceServerStore.executor, ModelStore.preload, preload_models.model_file_names)
+
+    return ModelStore.get_stats()
+
+
+@app.get("/models/cache-stats", response_model=ModelCacheStats)
+async def get_model_cache_stats() -> ModelCacheStats:
+    return ModelStore.get_stats()
+
+
+@app.get("/play-vs-agent/sessions/stats", response_model=SessionStats)
+async def get_session_stats() -> SessionStats:
+    return SessionStats(**GameSessionStore.get_stats())
+
+
+async def run_model_task(model_file_name: str, func, *args):
+    # disk access (stat, checkpoint loading) blocks, so it runs in the executor, a missing checkpoint is a 404
+    try:
+        return await asyncio.get_running_loop().run_in_executor(InferenceServerStore.executor, func, *args)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Model not found: {model_file_name}")
+
+
+async def get_inference_server(model_file_name: str) -> InferenceServer:
+    # the forward pass runs in the inference server thread
+    return await run_model_task(model_file_name, InferenceServerStore.get_server, model_file_name)
+
+
+async def choose_agent_move(model_file_name: str, board: chess.Board, inference_server: Optional[InferenceServer] = None) -> Tuple[chess.Move, Move]:
+    if board.is_game_over():
+        raise HTTPException(status_code=400, detail=f"Game is over ({board.result()}), there is no move to play")
+
+    model_version = await run_model_task(model_file_name, ModelStore.get_model_version, model_file_name)
+    policy = PolicyCache.get(model_name=model_file_name, model_version=model_version, board=board)
+
+    if policy is not None:
+        move = ChessEnv.decode_action(board=board, action_no=PolicyCache.sample(policy=policy))
+        return move, Move(move_str=move.uci(), cached=True)
+
+    if inference_server is None:
+        inference_server = await get_inference_server(model_file_name=model_file_name)
+
+    try:
+        result = await asyncio.wrap_future(inference_server.submit_board(board=board))
+    except InferenceServerStoppedError:
+        # the server was replaced between getting and using it, its successor is already running
+        inference_server = await get_inference_server(model_file_name=model_file_name)
+        result = await asyncio.wrap_future(inference_server.submit_board(board=board))
+
+    # under the version of the checkpoint which produced the policy, it may be older than the one looked up above
+    PolicyCache.put(model_name=model_file_name, model_version=inference_server.model_version, board=board,
+                    legal_action_idxs=result.legal_action_idxs, probs=result.probs)
+    move = ChessEnv.decode_action(board=board, action_no=result.action)
+
+    return move, Move(move_str=move.uci(), queue_latency_ms=result.queue_latency * 1000, compute_latency_ms=result.compute_latency * 1000)
+
+
+async def send_agent_move(websocket: WebSocket, session: GameSession):
+    if session.inference_server is None or not session.inference_server.is_running():
+        session.inference_server = await get_inference_server(model_file_name=session.model_name)  # first move or the model was evicted
+
+    move, move_info = await choose_agent_move(model_file_name=session.model_name, board=session.board, inference_server=session.inference_server)
+    session.board.push(move)
+
+    await websocket.send_json({"type": "move", **move_info.model_dump(), "fen": session.board.fen()})
+
+
+async def try_send_agent_move(websocket: WebSocket, session: GameSession) -> bool:
+    # a failed agent move is reported to the client and the connection is closed, the agent is still to move
+    # when the session is resumed, so the move is tried again then
+    try:
+        await send_agent_move(websocket=websocket, session=session)
+        return True
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else f"Agent move failed: {e!r}"
+        print(f"Session {session.session_id}: {detail}")
+
+        await websocket.send_json({"type": "error", "detail": detail, "fen": session.board.fen()})
+        await websocket.close(code=1011, reason="Agent move failed")
+
+        return False
+
+
+async def sweep_idle_sessions():
+    while True:
+        await asyncio.sleep(ApiConfig.SESSION_SWEEP_INTERVAL_S)
+        GameSessionStore.evict_idle()
+
+
+@app.get("/models/shared-weights", response_model=List[ResidentWeights])
+async def get_shared_weights() -> List[ResidentWeights]:
+    return [ResidentWeights(**resident_weights) for resident_weights in SharedWeights.get_resident()]
@@ -1,9 +1,19 @@
+import os
+import torch
+import threading
+import torch.nn as nn
 from enum import Enum
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from cachetools import LRUCache
-from typing import List, Tuple
-from torch.optim import Optimizer
-from backend.chess_agent.models.cnn_fc.cnn_fc import CnnFc
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Any, Callable, Optional, Dict, Tuple
+from backend.chess_agent.checkpoints.model_exporter import ModelExporter
+from backend.chess_agent.checkpoints.shared_weights import SharedWeights
+from backend.chess_agent.inference_server import InferenceServer
+from backend.api.policy_cache import PolicyCache
+from backend.chess_agent.vs_human import VsHuman
+from backend.configs.api_config import ApiConfig
+from backend.configs.path_config import PathConfig
 from backend.utils.utils import Utils
 
 
@@ -11,8 +21,29 @@ class ChessRlFile(BaseModel):
     file_name: str
 
 
+class SavedGameEntry(BaseModel):
+    file_name: str
+    mode: Optional[str]
+    episode: Optional[int]
+    white_elo: Optional[int]
+    black_elo: Optional[int]
+    result: Optional[str]
+    moves_num: int
+
+
 class FileList(BaseModel):
     file_names: List[str]
+    total: Optional[int] = None  # files matching the filters, file_names is one page of them
+    games: Optional[List[SavedGameEntry]] = None
+
+
+class GamesSortField(str, Enum):
+    modified = "mtime_ns"
+    episode = "episode"
+    white_elo = "white_elo"
+    black_elo = "black_elo"
+    moves_num = "moves_num"
+    file_name = "file_name"
 
 
 class PathType(str, Enum):
@@ -29,23 +60,308 @@ class SavedGameContent(BaseModel):
 
 class Move(BaseModel):
     move_str: str
+    queue_latency_ms: Optional[float] = None  # waiting for the batched forward pass
+    compute_latency_ms: Optional[float] = None  # the batched forward pass and sampling
+    cached: bool = False  # sampled from the policy cache without the network
+
+
+class AnalysisRequest(BaseModel):
+    model_file_name: str
+    fens: Optional[List[str]] = None  # fens or pgn, the pgn is analyzed position by position along the mainline
+    pgn: Optional[str] = None
+    top_k: int = Field(default=5, ge=1)
+    include_eval: bool = False  # CustomEval breakdown of every position
+
+
+class AnalyzedMove(BaseModel):
+    move: str
+    prob: float
+
+
+class PositionAnalysis(BaseModel):
+    idx: int
+    fen: str
+    moves: List[AnalyzedMove]
+    eval: Optional[Dict[str, float]] = None
+
+
+class SessionStats(BaseModel):
+    sessions: int
+    connected: int
+    max_sessions: int
+    created: int
+    evicted: int
+
+
+class PolicyCacheStats(BaseModel):
+    hits: int
+    misses: int
+    hit_rate: float
+    invalidations: int
+    size: int
+    max_size: int
+
+
+class ModelCacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    evicted_bytes: int
+    current_bytes: int
+    max_bytes: int
+    model_file_names: List[str]
+
+
+class ResidentWeights(BaseModel):
+    checkpoint_path: str
+    weights_path: str
+    weights_bytes: int
+    attached_at: float
+
+
+class PreloadModels(BaseModel):
+    model_file_names: List[str]
+
+
+class ModelCache(LRUCache):
+
+    # LRUCache sized in bytes, counts the evictions and collects the evicted models for the eviction hooks
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize=maxsize, getsizeof=ModelCache.get_model_size)
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.evicted_names: List[str] = []  # the hooks run later, outside of the lock of the cache owner
+
+
+    def popitem(self):
+        key, value = super().popitem()
+
+        self.evictions += 1
+        self.evicted_bytes += self.getsizeof(value)
+        self.evicted_names.append(key)
+
+        return key, value
+
+
+    @staticmethod
+    def get_model_size(model: nn.Module) -> int:
+        if hasattr(model, 'model_bytes'):
+            return model.model_bytes  # onnx session
+
+        # state_dict also covers the packed weights of int8 layers which aren't parameters
+        return sum(ModelCache.get_tensors_size(value) for value in model.state_dict().values())
+
+
+    @staticmethod
+    def get_tensors_size(value: Any) -> int:
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+
+        if isinstance(value, (tuple, list)):
+            return sum(ModelCache.get_tensors_size(item) for item in value)
+
+        return 0
 
 
 class ModelStore:
 
-    _cache: LRUCache[str, Tuple[CnnFc, Optimizer]] = LRUCache(maxsize=7)
+    _cache: ModelCache = ModelCache(maxsize=ApiConfig.MODEL_CACHE_MAX_BYTES)
+    _versions: Dict[str, str] = {}  # model name -> checkpoint version of the cached model
+    _lock = threading.Lock()  # guards the cache and the stats, never held during a disk load
+    _load_locks: Dict[str, threading.Lock] = {}  # model name -> lock of its disk load
+    _eviction_hooks: List[Callable[[str], None]] = []
+    hits = 0
+    misses = 0
+
+    # checkpoints and their exported variants, anything else in the models directory (.onnx.data, .lock, .tmp) isn't a model
+    MODEL_FILE_SUFFIXES: Tuple[str, ...] = (".pth", ".pt", ".onnx")
+
+
+    @classmethod
+    def load_model(cls, model_name: str) -> nn.Module:
+        try:
+            return cls.load_model_locked(model_name=model_name)
+        finally:
+            cls.run_eviction_hooks()
+
+
+    @classmethod
+    def load_model_locked(cls, model_name: str) -> nn.Module:
+        version = ModelStore.get_model_version(model_name=model_name)
+        model = cls.get_cached_model(model_name=model_name, version=version)
+
+        if model is not None:
+            return model
+
+        # one disk load per model at a time, the other models are looked up and loaded meanwhile
+        with cls.get_load_lock(model_name=model_name):
+            model = cls.get_cached_model(model_name=model_name, version=version)
+
+            if model is not None:
+                return model  # loaded by another thread while this one waited
+
+            if ApiConfig.SHARED_WEIGHTS and not ModelExporter.is_variant(filepath=model_name):
+                model = SharedWeights.load_model(checkpoint_path=os.path.join(PathConfig.SAVED_MODELS_PATH_BASE, model_name))
+            else:
+                model = Utils.load_inference_model(file_name=model_name, mmap=ApiConfig.MODEL_MMAP)
+
+            with cls._lock:
+                cls.misses += 1
+
+                try:
+                    cls._cache[model_name] = model
+                    cls._versions[model_name] = version
+                except ValueError:
+                    print(f"Model {model_name} ({ModelCache.get_model_size(model)} bytes) doesn't fit into the model cache, it won't be cached")
+
+            return model
+
+
+    @classmethod
+    def get_cached_model(cls, model_name: str, version: str) -> Optional[nn.Module]:
+        with cls._lock:
+            if model_name not in cls._cache:
+                return None
+
+            if cls._versions.get(model_name) == version:
+                cls.hits += 1
+                return cls._cache[model_name]
+
+            cls._cache.pop(model_name)  # the checkpoint was replaced
+            cls._cache.evicted_names.append(model_name)
+
+            return None
+
+
+    @classmethod
+    def get_load_lock(cls, model_name: str) -> threading.Lock:
+        with cls._lock:
+            return cls._load_locks.setdefault(model_name, threading.Lock())
+
+
+    @classmethod
+    def preload(cls, model_names: List[str]) -> List[str]:
+        # warms the cache in the given order, so the first ones are evicted first when the budget is too small
+        for model_name in model_names:
+            cls.load_model(model_name)
+
+        return [model_name for model_name in model_names if model_name in cls._cache]
+
+
+    @classmethod
+    def get_stats(cls) -> ModelCacheStats:
+        return ModelCacheStats(
+            hits=cls.hits,
+            misses=cls.misses,
+            evictions=cls._cache.evictions,
+            evicted_bytes=cls._cache.evicted_bytes,
+            current_bytes=int(cls._cache.currsize),
+            max_bytes=int(cls._cache.maxsize),
+            model_file_names=list(cls._cache.keys()),
+        )
+
+
+    @staticmethod
+    def is_model_file(file_name: str) -> bool:
+        return file_name.endswith(ModelStore.MODEL_FILE_SUFFIXES)
+
+
+    @staticmethod
+    def get_model_version(model_name: str) -> str:
+        # a checkpoint written again under the same name is a different model
+        stat = os.stat(os.path.join(PathConfig.SAVED_MODELS_PATH_BASE, model_name))
+
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
 
 
     @classmethod
-    def load_model(cls, model_name: str) -> Tuple[CnnFc, Optimizer]:
-        if model_name not in cls._cache:
-            model, optimizer = Utils.create_default_model_and_optimizer()
-            Utils.load_model(model=model, optimizer=optimizer, file_name=model_name)
-            cls._cache[model_name] = (model, optimizer)
+    def add_eviction_hook(cls, eviction_hook: Callable[[str], None]):
+        cls._eviction_hooks.append(eviction_hook)
 
-        return cls._cache[model_name]
+
+    @classmethod
+    def run_eviction_hooks(cls):
+        # the hooks may stop inference servers, so they never run while _lock blocks the other model loads
+        with cls._lock:
+            evicted_names, cls._cache.evicted_names = cls._cache.evicted_names, []
+
+            for model_name in evicted_names:
+                if model_name not in cls._cache:
+                    cls._versions.pop(model_name, None)
+
+        for model_name in evicted_names:
+            for eviction_hook in cls._eviction_hooks:
+                eviction_hook(model_name)
 
 
     @classmethod
     def clear_cache(cls):
-        cls._cache.clear()
\ No newline at end of file
+        with cls._lock:
+            cls._cache.evicted_names.extend(cls._cache.keys())  # clear doesn't go through popitem
+            cls._cache.clear()
+
+        cls.run_eviction_hooks()
+
+
+class InferenceServerStore:
+
+    # one micro-batching inference server per loaded model, the event loop only awaits their futures
+    executor = ThreadPoolExecutor(max_workers=ApiConfig.MODEL_LOADER_WORKERS, thread_name_prefix="model-loader")
+
+    _servers: Dict[str, InferenceServer] = {}
+    _lock = threading.Lock()
+
+
+    @classmethod
+    def get_server(cls, model_name: str) -> InferenceServer:
+        # a running server keeps its model alive, so a model too big for the model cache stays pinned to its server
+        version = ModelStore.get_model_version(model_name=model_name)
+
+        with cls._lock:
+            inference_server = cls._servers.get(model_name)
+
+            if inference_server is not None and inference_server.is_running() and inference_server.model_version == version:
+                return inference_server
+
+        model = ModelStore.load_model(model_name)
+
+        with cls._lock:
+            inference_server = cls._servers.get(model_name)
+
+            if inference_server is not None and inference_server.is_running() and inference_server.model_version == version:
+                return inference_server  # another thread was faster
+
+            if inference_server is not None:
+                inference_server.stop(wait=False)  # the checkpoint was replaced, the old server answers its queued requests and exits
+
+            inference_server = InferenceServer(model=model, device=VsHuman.get_model_device(model=model), model_version=version,
+                                               max_batch_size=ApiConfig.INFERENCE_MAX_BATCH_SIZE, max_wait_ms=ApiConfig.INFERENCE_MAX_WAIT_MS).start()
+            cls._servers[model_name] = inference_server
+
+            return inference_server
+
+
+    @classmethod
+    def remove_server(cls, model_name: str, wait: bool = False):
+        with cls._lock:
+            inference_server = cls._servers.pop(model_name, None)
+
+        if inference_server is not None:
+            inference_server.stop(wait=wait)
+
+
+    @classmethod
+    def get_metrics(cls) -> Dict[str, Dict[str, float]]:
+        with cls._lock:
+            return {model_name: inference_server.get_metrics() for model_name, inference_server in cls._servers.items()}
+
+
+    @classmethod
+    def stop_all(cls):
+        for model_name in list(cls._servers.keys()):
+            cls.remove_server(model_name=model_name, wait=True)
+
+
+ModelStore.add_eviction_hook(InferenceServerStore.remove_server)
+ModelStore.add_eviction_hook(PolicyCache.invalidate_model)
+ModelStore.add_eviction_hook(SharedWeights.release)
@@ -0,0 +1,93 @@
+import chess
+import threading
+import chess.polyglot
+import numpy as np
+from cachetools import LRUCache
+from dataclasses import dataclass
+from typing import Optional, Any, Dict
+from backend.configs.api_config import ApiConfig
+
+
+@dataclass(frozen=True)
+class CachedPolicy:
+    legal_action_idxs: np.ndarray  # uint16, every action idx < ACTION_SPACE
+    probs: np.ndarray  # float32 masked softmax over legal_action_idxs
+
+
+class PolicyCache:
+
+    # move distributions of positions the model has already seen, the move itself is still sampled per request
+    # (model name, model version, zobrist hash) -> policy, a checkpoint replaced under the same name never hits the old entries,
+    # even when the model was never in ModelStore (too big for its budget) and so never invalidated
+    _cache: LRUCache = LRUCache(maxsize=ApiConfig.POLICY_CACHE_SIZE)
+    _lock = threading.Lock()
+
+    hits = 0
+    misses = 0
+    invalidations = 0
+
+
+    @classmethod
+    def get(cls, model_name: str, model_version: Optional[str], board: chess.Board) -> Optional[CachedPolicy]:
+        key = (model_name, model_version, chess.polyglot.zobrist_hash(board))
+
+        with cls._lock:
+            policy = cls._cache.get(key)
+
+            if policy is None:
+                cls.misses += 1
+            else:
+                cls.hits += 1
+
+        return policy
+
+
+    @classmethod
+    def put(cls, model_name: str, model_version: Optional[str], board: chess.Board, legal_action_idxs: np.ndarray, probs: np.ndarray) -> CachedPolicy:
+        policy = CachedPolicy(legal_action_idxs=np.asarray(legal_action_idxs, dtype=np.uint16), probs=np.asarray(probs, dtype=np.float32))
+
+        with cls._lock:
+            cls._cache[(model_name, model_version, chess.polyglot.zobrist_hash(board))] = policy
+
+        return policy
+
+
+    @staticmethod
+    def sample(policy: CachedPolicy) -> int:
+        cumulative_probs = np.cumsum(policy.probs)
+        idx = np.searchsorted(cumulative_probs, np.random.rand() * cumulative_probs[-1], side='right')
+
+        return int(policy.legal_action_idxs[min(idx, len(policy.legal_action_idxs) - 1)])
+
+
+    @classmethod
+    def invalidate_model(cls, model_name: str):
+        # called when ModelStore evicts the model, frees the entries of every version before the LRU would
+        with cls._lock:
+            keys = [key for key in cls._cache.keys() if key[0] == model_name]
+
+            for key in keys:
+                del cls._cache[key]
+
+            cls.invalidations += len(keys)
+
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        with cls._lock:
+            requests = cls.hits + cls.misses
+
+            return {
+                'hits': cls.hits,
+                'misses': cls.misses,
+                'hit_rate': cls.hits / requests if requests else 0.0,
+                'invalidations': cls.invalidations,
+                'size': len(cls._cache),
+                'max_size': cls._cache.maxsize,
+            }
+
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            cls._cache.clear()
@@ -0,0 +1,83 @@
+import io
+import chess
+import torch
+import chess.pgn
+import torch.nn as nn
+from typing import List, Optional, Dict, Any
+from backend.chess_agent.vs_human import VsHuman
+from backend.chess_env.chess_env import ChessEnv
+from backend.chess_env.observation_encoder import ObservationEncoder
+from backend.evals.custom_eval import CustomEval
+from backend.utils.chess_env_utils import ChessEnvUtils
+from backend.utils.ragged_actions import RaggedActions
+
+
+class PositionAnalyzer:
+
+    @staticmethod
+    def get_boards(fens: Optional[List[str]], pgn: Optional[str]) -> List[chess.Board]:
+        # ValueError for an invalid fen or pgn, the endpoint turns it into a 400
+        if fens:
+            return [chess.Board(fen) for fen in fens]
+
+        if pgn:
+            game = chess.pgn.read_game(io.StringIO(pgn))
+
+            if game is None or game.errors:
+                raise ValueError(f"Invalid PGN: {game.errors if game is not None else 'no game found'}")
+
+            # every position of the mainline, before each move and after the last one
+            board = game.board()
+            boards = [board.copy(stack=False)]
+
+            for move in game.mainline_moves():
+                board.push(move)
+                boards.append(board.copy(stack=False))
+
+            return boards
+
+        return []
+
+
+    @staticmethod
+    def analyze(model: nn.Module, boards: List[chess.Board], top_k: int, include_eval: bool) -> List[Dict[str, Any]]:
+        # one batched forward pass for all the positions which still have legal moves
+        legal_action_idxs_lst = [ChessEnvUtils.get_legal_action_idxs(board) for board in boards]
+        playable = [i for i, legal_action_idxs in enumerate(legal_action_idxs_lst) if len(legal_action_idxs)]
+
+        top_moves = {i: [] for i in range(len(boards))}
+
+        if playable:
+            observations = torch.from_numpy(ObservationEncoder.encode_batch(boards=[boards[i] for i in playable]))
+            legal_actions = RaggedActions.from_lists([legal_action_idxs_lst[i] for i in playable])
+
+            with torch.inference_mode():
+                legal_logits = legal_actions.get_legal_logits(model=model, x=observations.to(device=VsHuman.get_model_device(model=model)))
+                probs = torch.softmax(legal_actions.to_padded(values=legal_logits.float().cpu()), dim=1)
+
+            top_probs, top_cols = probs.topk(k=min(top_k, probs.size(1)), dim=1)
+            padded_action_idxs = legal_actions.to_padded(values=legal_actions.action_idxs.cpu(), fill_value=-1)
+            top_action_idxs = padded_action_idxs.gather(dim=1, index=top_cols)
+
+            for row, i in enumerate(playable):
+                top_moves[i] = [
+                    {"move": ChessEnv.decode_action(board=boards[i], action_no=int(action_idx)).uci(), "prob": float(prob)}
+                    for action_idx, prob in zip(top_action_idxs[row].tolist(), top_probs[row].tolist())
+                    if action_idx >= 0  # padding of positions with less than top_k legal moves
+                ]
+
+        if include_eval:
+            features = CustomEval.evaluate_batch(boards=boards)
+            scores = CustomEval.score_batch(features=features)
+
+        results = []
+
+        for i, board in enumerate(boards):
+            result = {"fen": board.fen(), "moves": top_moves[i]}
+
+            if include_eval:
+                result["eval"] = {**dict(zip(CustomEval.FEATURE_NAMES, features[i].tolist())), "score": float(scores[i])}
+
+            results.append(result)
+
+        return results
@@ -0,0 +1,361 @@
+import copy
+import queue
+import functools
+import chess
+import torch
+import numpy as np
+import torch.multiprocessing as mp
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from torch.distributions import Categorical
+from backend.chess_agent.inference_server import InferenceServer
+from backend.chess_agent.replay_store import ReplayStore
+from backend.chess_agent.self_play import SelfPlay, PolicyStep
+from backend.chess_env.chess_env import ChessEnv
+from backend.configs.inference_config import InferenceConfig
+from backend.configs.training_config import TrainingConfig
+from backend.utils.chess_env_utils import ChessEnvUtils
+from backend.utils.utils import Utils
+
+
+@dataclass
+class Trajectory:
+    observations: np.ndarray  # (T, 12, 8, 8) uint8
+    # legal actions in the RaggedActions layout (flattened row after row), a few dozen idxs per move instead of an ACTION_SPACE mask
+    legal_action_idxs: np.ndarray  # (L,) int64
+    legal_actions_nums: np.ndarray  # (T,) int64, legal actions num of every position
+    actions: np.ndarray  # (T,) int64
+    rewards: np.ndarray  # (T,) float32, reward of the player who made the move
+    turns: np.ndarray  # (T,) bool, chess.WHITE / chess.BLACK
+    explored: np.ndarray  # (T,) bool, random move (epsilon) instead of a sampled one
+    positions: np.ndarray  # (T,) POSITION_DTYPE records for the replay store
+    behavior_log_probs: np.ndarray  # (T,) float32, log_prob of the move under the weights which chose it
+
+    winner: Optional[bool]
+    final_board: chess.Board
+    white_elo: float
+    black_elo: float
+    eval_score_list: List[float] = field(default_factory=list)
+
+    weights_version: int = 0
+    worker_id: int = 0
+
+
+class InferenceClient:
+
+    # actor side of the inference process, the observations of all actors go through one batched forward pass
+    def __init__(self, worker_id: int, request_queue, response_queue, stop_event):
+        self.worker_id = worker_id
+        self.request_queue = request_queue
+        self.response_queue = response_queue
+        self.stop_event = stop_event
+
+
+    def get_action(self, observation: np.ndarray, legal_action_idxs: np.ndarray) -> Tuple[int, float, int]:
+        # (action, its log_prob, weights version the inference process had when it got the request)
+        self.request_queue.put((self.worker_id, observation.astype(np.uint8), legal_action_idxs))
+
+        while not self.stop_event.is_set():
+            try:
+                action, log_prob, weights_version = self.response_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            if action is None:
+                raise RuntimeError(f"Inference process failed: {weights_version}")
+
+            return action, log_prob, weights_version
+
+        raise InterruptedError("Training was stopped")
+
+
+def send_inference_result(response_queue, weights_version: int, future) -> None:
+    if future.exception() is not None:
+        response_queue.put((None, None, repr(future.exception())))
+        return
+
+    result = future.result()
+    log_prob = float(np.log(result.probs[np.flatnonzero(result.legal_action_idxs == result.action)[0]]))
+
+    response_queue.put((result.action, log_prob, weights_version))
+
+
+def run_inference_process(shared_model, weights_version, weights_lock, request_queue, response_queues, stop_event, device,
+                          max_batch_size: int, max_wait_ms: float) -> None:
+    model = copy.deepcopy(shared_model).to(device=device).eval()
+    inference_server = InferenceServer(model=model, device=device, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms).start()
+    local_version = -1
+
+    try:
+        while not stop_event.is_set():
+            if local_version != weights_version.value:
+                # the forward pass holds model_lock, so no batch runs on half updated weights
+                with weights_lock, inference_server.model_lock:
+                    model.load_state_dict(shared_model.state_dict())
+                    local_version = weights_version.value
+
+            try:
+                worker_id, observation, legal_action_idxs = request_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            try:
+                future = inference_server.submit(observation=observation.astype(np.float32), legal_action_idxs=legal_action_idxs)
+            except ValueError as e:
+                response_queues[worker_id].put((None, None, repr(e)))
+                continue
+
+            future.add_done_callback(functools.partial(send_inference_result, response_queues[worker_id], local_version))
+    finally:
+        inference_server.stop()
+
+
+def collect_trajectory(env: ChessEnv, model, epsilon: float, weights_version: int, inference_client: Optional[InferenceClient] = None) -> Trajectory:
+    # with inference_client the actor processes share one batched forward pass in the inference process instead of running the model themselves
+    # weights_version = version current when the episode starts, kept as is when every move is explored
+    observations, legal_action_idxs_lst, actions, rewards, turns, explored, positions, behavior_log_probs = [], [], [], [], [], [], [], []
+
+    observation = env.reset()
+    done = False
+    info = {}
+    oldest_weights_version = weights_version
+
+    with torch.no_grad():
+        while not done:
+            turn = env.board.turn
+            legal_action_idxs = ChessEnvUtils.get_legal_action_idxs(env.board)
+
+            is_explored = np.random.rand() < epsilon
+
+            if is_explored:
+                # same log_prob as the learner gives random moves, so their importance ratio is 1
+                action_chosen = int(np.random.choice(legal_action_idxs))
+                behavior_log_prob = -float(np.log(len(legal_action_idxs)))
+            elif inference_client is not None:
+                action_chosen, behavior_log_prob, inference_weights_version = inference_client.get_action(observation=observation,
+                                                                                                          legal_action_idxs=legal_action_idxs)
+                oldest_weights_version = min(oldest_weights_version, inference_weights_version)
+            else:
+                legal_mask = ChessEnvUtils.get_legal_mask(env.board)
+                logits = model(torch.from_numpy(observation).unsqueeze(0))
+                masked_logits = logits.masked_fill(~torch.from_numpy(legal_mask).unsqueeze(0), float('-inf'))
+                dist = Categorical(logits=masked_logits)
+                sampled_tensor = dist.sample()
+                action_chosen = int(sampled_tensor.item())
+                behavior_log_prob = float(dist.log_prob(sampled_tensor).item())
+
+            positions.append(ReplayStore.encode_position(board=env.board, action=action_chosen))
+            observations.append(observation.astype(np.uint8))
+            legal_action_idxs_lst.append(legal_action_idxs)
+            actions.append(action_chosen)
+            turns.append(turn)
+            explored.append(is_explored)
+            behavior_log_probs.append(behavior_log_prob)
+
+            observation, (white_reward, black_reward), done, info = env.step(action_chosen)
+            rewards.append(white_reward if turn == chess.WHITE else black_reward)
+            positions[-1]['reward'] = rewards[-1]
+
+    trajectory = Trajectory(
+        observations=np.stack(observations),
+        legal_action_idxs=np.concatenate(legal_action_idxs_lst).astype(np.int64, copy=False),
+        legal_actions_nums=np.array([len(legal_action_idxs) for legal_action_idxs in legal_action_idxs_lst], dtype=np.int64),
+        actions=np.array(actions, dtype=np.int64),
+        rewards=np.array(rewards, dtype=np.float32),
+        turns=np.array(turns, dtype=np.bool_),
+        explored=np.array(explored, dtype=np.bool_),
+        positions=np.concatenate(positions),
+        behavior_log_probs=np.array(behavior_log_probs, dtype=np.float32),
+        winner=info.get('winner'),
+        final_board=env.board.copy(),
+        white_elo=env.white_elo,
+        black_elo=env.black_elo,
+        eval_score_list=list(env.eval_score_list),
+        weights_version=oldest_weights_version,
+    )
+
+    return trajectory
+
+
+def run_actor(worker_id: int, shared_model, weights_version, weights_lock, trajectory_queue, stop_event,
+              weight_sync_interval: int, epsilon: float, seed: int, request_queue=None, response_queue=None) -> None:
+    torch.set_num_threads(1)  # one core per actor, the parallelism comes from the processes
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    env = ChessEnv()
+    inference_client = InferenceClient(worker_id=worker_id, request_queue=request_queue, response_queue=response_queue,
+                                       stop_event=stop_event) if request_queue is not None else None
+    model = copy.deepcopy(shared_model) if inference_client is None else None  # private copy, the shared one is overwritten by the learner
+    local_version = -1
+    episodes = 0
+
+    while not stop_event.is_set():
+        if model is not None and episodes % weight_sync_interval == 0 and local_version != weights_version.value:
+            with weights_lock:
+                model.load_state_dict(shared_model.state_dict())
+                local_version = weights_version.value
+
+        # the inference process can lag behind weights_version, collect_trajectory keeps the oldest version it played with
+        episode_weights_version = local_version if model is not None else weights_version.value
+
+        try:
+            trajectory = collect_trajectory(env=env, model=model, epsilon=epsilon, weights_version=episode_weights_version,
+                                            inference_client=inference_client)
+        except InterruptedError:
+            break
+
+        trajectory.worker_id = worker_id
+        episodes += 1
+
+        while not stop_event.is_set():
+            try:
+                trajectory_queue.put(trajectory, timeout=1.0)
+                break
+            except queue.Full:
+                continue
+
+
+class ActorLearner(SelfPlay):
+
+    def __init__(self, device, replay_store: Optional[ReplayStore] = None, num_workers: int = TrainingConfig.NUM_WORKERS, weight_sync_interval: int = TrainingConfig.WEIGHT_SYNC_INTERVAL,
+                 max_staleness: int = TrainingConfig.MAX_STALENESS, queue_size: int = TrainingConfig.TRAJECTORY_QUEUE_SIZE,
+                 log_prob_minibatch_size: int = TrainingConfig.LOG_PROB_MINIBATCH_SIZE, inference_process: bool = TrainingConfig.ACTOR_INFERENCE_PROCESS):
+        # the actors can't send autograd graphs, so the log_probs are always recomputed with the current weights
+        super().__init__(device=device, replay_store=replay_store, recompute_log_probs=True, log_prob_minibatch_size=log_prob_minibatch_size)
+
+        self.num_workers = num_workers
+        self.weight_sync_interval = weight_sync_interval
+        self.max_staleness = max_staleness
+        self.queue_size = queue_size
+        self.inference_process = inference_process
+
+        self.trajectories_num = 0
+        self.dropped_trajectories = 0
+
+
+    def train_actor_learner(self, model, optimizer, model_save=True):
+        ctx = mp.get_context('spawn')
+
+        shared_model = copy.deepcopy(model).to(device='cpu').share_memory()
+        weights_version = ctx.Value('i', 0)
+        weights_lock = ctx.Lock()
+        trajectory_queue = ctx.Queue(maxsize=self.queue_size)
+        stop_event = ctx.Event()
+
+        # the actors send observations to one inference process which batches them, instead of each running its own model copy
+        request_queue = ctx.Queue() if self.inference_process else None
+        response_queues = [ctx.Queue() if self.inference_process else None for _ in range(self.num_workers)]
+
+        workers = [
+            ctx.Process(
+                target=run_actor,
+                args=(worker_id, shared_model, weights_version, weights_lock, trajectory_queue, stop_event,
+                      self.weight_sync_interval, TrainingConfig.EPSILON, int(np.random.randint(2 ** 31)) + worker_id,
+                      request_queue, response_queues[worker_id]),
+                daemon=True,
+            )
+            for worker_id in range(self.num_workers)
+        ]
+
+        if self.inference_process:
+            workers.append(ctx.Process(
+                target=run_inference_process,
+                args=(shared_model, weights_version, weights_lock, request_queue, response_queues, stop_event, self.device,
+                      InferenceConfig.MAX_BATCH_SIZE, InferenceConfig.MAX_WAIT_MS),
+                daemon=True,
+            ))
+
+        for worker in workers:
+            worker.start()
+
+        pgn_env = ChessEnv()  # only used to save the games played by the actors
+        curr_episode = TrainingConfig.INIT_EPISODE - 1
+        interrupted = False
+
+        try:
+            while curr_episode < TrainingConfig.EPISODES:
+                try:
+                    trajectory = trajectory_queue.get(timeout=1.0)
+                except queue.Empty:
+                    ActorLearner.check_workers(workers=workers)
+                    continue
+
+                if weights_version.value - trajectory.weights_version > self.max_staleness:
+                    self.dropped_trajectories += 1
+                    continue
+
+                curr_episode += 1
+                self.trajectories_num += 1
+                self.add_trajectory(trajectory=trajectory)
+                self.count_result(winner=trajectory.winner)
+                self.log_training_info(episode=curr_episode, eval_score_list=trajectory.eval_score_list, loss=None)
+                self.store_episode_positions(positions=[trajectory.positions], episode=curr_episode)
+
+                if trajectory.winner is not None:
+                    pgn_env.white_elo, pgn_env.black_elo = trajectory.white_elo, trajectory.black_elo
+                    pgn_env.save_game_pgn(episode=curr_episode, board=trajectory.final_board)
+
+                if self.trajectories_num >= TrainingConfig.UPDATE_FREQUENCY:
+                    self.compute_discounted_rewards()
+
+                    loss = self.update_model(model=model, optimizer=optimizer)
+
+                    with weights_lock:
+                        shared_model.load_state_dict(model.state_dict())  # copies in place into the shared memory
+                        weights_version.value += 1
+
+                    print(f"Model was updated! (weights version: {weights_version.value}, dropped stale trajectories: {self.dropped_trajectories})")
+                    self.log_training_info(episode=curr_episode, eval_score_list=None, loss=loss)
+                    print("=" * 50)
+
+                    self.reset_probs_and_rewards()
+                    self.flush_replay_store()
+                    self.trajectories_num = 0
+
+        except KeyboardInterrupt:
+            if model_save:
+                interrupted = True
+                print("Training interrupted! Saving model...")
+                Utils.save_model(model=model, optimizer=optimizer, episodes=curr_episode)
+        finally:
+            stop_event.set()
+            self.flush_replay_store()
+
+            for worker in workers:
+                worker.join(timeout=5.0)
+
+                if worker.is_alive():
+                    worker.terminate()
+
+            if model_save and not interrupted:
+                Utils.save_model(model=model, optimizer=optimizer, episodes=curr_episode)
+
+            print(f"White wins: {self.white_wins}; Black wins: {self.black_wins}; Draws: {self.draws};")
+            Utils.plot_loss(loss_list=self.loss_list, mode="actor-learner")
+
+
+    @staticmethod
+    def check_workers(workers) -> None:
+        # the actors and the inference process only exit after stop_event, a dead one would leave the learner waiting forever
+        for worker in workers:
+            if not worker.is_alive():
+                raise RuntimeError(f"{worker.name} exited during training (exitcode: {worker.exitcode})")
+
+
+    def add_trajectory(self, trajectory: Trajectory):
+        legal_action_idxs_lst = np.split(trajectory.legal_action_idxs, np.cumsum(trajectory.legal_actions_nums)[:-1])
+
+        for t in range(len(trajectory.actions)):
+            step = PolicyStep(observation=trajectory.observations[t], legal_action_idxs=legal_action_idxs_lst[t],
+                              action=int(trajectory.actions[t]), explored=bool(trajectory.explored[t]),
+                              behavior_log_prob=float(trajectory.behavior_log_probs[t]))
+
+            if trajectory.turns[t] == chess.WHITE:
+                self.all_white_log_probs.append(step)
+                self.all_white_rewards.append(float(trajectory.rewards[t]))
+            else:
+                self.all_black_log_probs.append(step)
+                self.all_black_rewards.append(float(trajectory.rewards[t]))
+
+        self.mark_episode_end()
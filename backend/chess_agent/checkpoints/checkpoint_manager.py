@@ -4,10 +4,17 @@ from pathlib import Path
 from typing import Optional
 from backend.chess_agent.checkpoints.checkpoint import Checkpoint
 from backend.chess_agent.models.base_model import BaseModel
+from backend.chess_agent.models.model_factory import ModelFactory
 from backend.configs.path_config import PathConfig
+from backend.enums import ModelType
 from backend.utils.utils import Utils
 
 
+# allowed once for the process, the safe_globals context manager resets the process-wide allowlist on exit,
+# which breaks weights only loads running at the same time in other threads
+torch.serialization.add_safe_globals([ModelType])
+
+
 class CheckpointManager:
 
     @staticmethod
@@ -60,4 +67,32 @@ class CheckpointManager:
         if checkpoint.loss is not None:
             print(f"Checkpoint loss: {checkpoint.loss:.6f}")
 
-        return checkpoint
\ No newline at end of file
+        return checkpoint
+
+
+    @staticmethod
+    def load_inference_model(filepath: str, mmap: bool = False) -> BaseModel:
+        # weights only: no optimizer state, no autograd and eval mode (dropout off)
+        from backend.chess_agent.checkpoints.model_exporter import ModelExporter
+
+        if ModelExporter.is_variant(filepath=filepath):
+            print(f"Exported model loaded from {filepath}")
+            return ModelExporter.load_variant(filepath=filepath)
+
+        device = Utils.get_device()
+        mmap = mmap and device.type == "cpu"  # memory-mapped tensors can't live on the gpu
+
+        checkpoint_data = torch.load(filepath, map_location=device, mmap=mmap, weights_only=True)
+
+        if 'model_config_dict' in checkpoint_data:
+            model = ModelFactory.create_model(config=ModelFactory.create_config(config_dict=checkpoint_data['model_config_dict']))
+        else:
+            # old format: {'model_state_dict', 'optimizer_state_dict'} of the default model
+            model = Utils.create_default_model()
+
+        model.load_state_dict(checkpoint_data['model_state_dict'], assign=mmap)  # assign keeps the memory-mapped tensors instead of copying them
+        model.to(device=device).eval().requires_grad_(False)
+
+        print(f"Inference model [{model.model_name}] loaded from {filepath}{' (mmap)' if mmap else ''}")
+
+        return model
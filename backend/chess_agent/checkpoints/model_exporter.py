@@ -0,0 +1,215 @@
+import time
+import chess
+import torch
+import random
+import torch.nn as nn
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from backend.chess_agent.checkpoints.checkpoint_manager import CheckpointManager
+from backend.chess_agent.models.model_factory import ModelFactory
+from backend.chess_env.observation_encoder import ObservationEncoder
+from backend.utils.chess_env_utils import ChessEnvUtils
+from backend.utils.ragged_actions import RaggedActions
+from backend.utils.utils import Utils
+
+
+class OnnxModel(nn.Module):
+
+    # onnxruntime session behind the nn.Module interface used by VsHuman and the inference server
+    def __init__(self, filepath: str):
+        super().__init__()
+
+        import onnxruntime
+
+        self.session = onnxruntime.InferenceSession(filepath, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.model_bytes = Path(filepath).stat().st_size
+
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        logits = self.session.run(None, {self.input_name: x.detach().cpu().numpy()})[0]
+
+        return torch.from_numpy(logits)
+
+
+class ModelExporter:
+
+    INT8_SUFFIX = "-int8.pth"
+    TRACED_SUFFIX = "-traced.pt"
+    ONNX_SUFFIX = ".onnx"
+
+    VARIANTS = ("int8", "traced", "onnx")
+    PARITY_POSITIONS_NUM = 256
+
+
+    @staticmethod
+    def export(filepath: str, variants: Tuple[str, ...] = VARIANTS, min_agreement: float = 0.95) -> Dict[str, Dict]:
+        # variants of a checkpoint for cpu serving, written next to it, each with a policy parity report against the float model
+        float_model = CheckpointManager.load_inference_model(filepath=filepath).to(device="cpu")
+        boards = ModelExporter.get_parity_boards(positions_num=ModelExporter.PARITY_POSITIONS_NUM)
+
+        exported = {}
+
+        for variant in variants:
+            if variant == "int8":
+                try:
+                    variant_path = ModelExporter.export_int8(model=float_model, filepath=filepath)
+                except ValueError as e:
+                    print(f"{e}, the int8 variant is skipped")
+                    continue
+            elif variant == "traced":
+                variant_path = ModelExporter.export_traced(model=float_model, filepath=filepath)
+            elif variant == "onnx":
+                variant_path = ModelExporter.export_onnx(model=float_model, filepath=filepath)
+
+                if variant_path is None:
+                    continue
+            else:
+                raise ValueError(f"Unsupported export variant: {variant}. Available variants: {ModelExporter.VARIANTS}")
+
+            report = ModelExporter.check_parity(float_model=float_model, variant_model=ModelExporter.load_variant(filepath=variant_path), boards=boards)
+            exported[variant] = {"path": variant_path, **report}
+
+            print(f"Exported {variant} to {variant_path}: {report}")
+
+            if report["top1_agreement"] < min_agreement:
+                print(f"WARNING: {variant} picks the same best move only in {report['top1_agreement']:.1%} of the positions!")
+
+        return exported
+
+
+    @staticmethod
+    def export_int8(model: nn.Module, filepath: str) -> str:
+        # int8 weights of every nn.Linear, activations are quantized on the fly (cpu only)
+        if not any(isinstance(module, nn.Linear) for module in model.modules()):
+            raise ValueError(f"{type(model).__name__} has no nn.Linear layers, dynamic int8 quantization wouldn't change it")
+
+        quantized_model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        variant_path = ModelExporter.get_variant_path(filepath=filepath, suffix=ModelExporter.INT8_SUFFIX)
+
+        torch.save({
+            'model_config_dict': model.get_model_config().to_dict() if hasattr(model, 'get_model_config') else None,
+            'model_state_dict': quantized_model.state_dict(),
+        }, variant_path)
+
+        return variant_path
+
+
+    @staticmethod
+    def export_traced(model: nn.Module, filepath: str) -> str:
+        variant_path = ModelExporter.get_variant_path(filepath=filepath, suffix=ModelExporter.TRACED_SUFFIX)
+
+        with torch.inference_mode():
+            traced_model = torch.jit.trace(model, ModelExporter.get_example_input())
+
+        torch.jit.save(torch.jit.freeze(traced_model), variant_path)
+
+        return variant_path
+
+
+    @staticmethod
+    def export_onnx(model: nn.Module, filepath: str) -> Optional[str]:
+        try:
+            import onnx  # noqa: F401, torch.onnx.export needs it
+        except ImportError:
+            print("onnx is not installed, the onnx variant is skipped")
+            return None
+
+        variant_path = ModelExporter.get_variant_path(filepath=filepath, suffix=ModelExporter.ONNX_SUFFIX)
+
+        # weights embedded in the .onnx file (up to the 2 GB protobuf limit), a .onnx.data sidecar would be listed as another model
+        torch.onnx.export(
+            model, (ModelExporter.get_example_input(),), variant_path,
+            input_names=["observations"], output_names=["logits"],
+            dynamic_axes={"observations": {0: "batch_size"}, "logits": {0: "batch_size"}},
+            external_data=False,
+        )
+
+        return variant_path
+
+
+    @staticmethod
+    def load_variant(filepath: str) -> nn.Module:
+        # exported variants are always served from the cpu
+        if filepath.endswith(ModelExporter.TRACED_SUFFIX):
+            return torch.jit.load(filepath, map_location="cpu").eval()
+
+        if filepath.endswith(ModelExporter.ONNX_SUFFIX):
+            return OnnxModel(filepath=filepath)
+
+        # quantized tensors and their dtypes are allowed by the weights only unpickler, nothing else from the file is executed
+        checkpoint_data = torch.load(filepath, map_location="cpu", weights_only=True)
+        config_dict = checkpoint_data['model_config_dict']
+
+        model = ModelFactory.create_model(config=ModelFactory.create_config(config_dict=config_dict)) if config_dict is not None else Utils.create_default_model()
+        model = torch.ao.quantization.quantize_dynamic(model.to(device="cpu").eval(), {nn.Linear}, dtype=torch.qint8)
+        model.load_state_dict(checkpoint_data['model_state_dict'])
+
+        return model.requires_grad_(False)
+
+
+    @staticmethod
+    def is_variant(filepath: str) -> bool:
+        return filepath.endswith((ModelExporter.INT8_SUFFIX, ModelExporter.TRACED_SUFFIX, ModelExporter.ONNX_SUFFIX))
+
+
+    @staticmethod
+    def check_parity(float_model: nn.Module, variant_model: nn.Module, boards: List[chess.Board]) -> Dict[str, float]:
+        observations = torch.from_numpy(ObservationEncoder.encode_batch(boards=boards))
+        legal_actions = RaggedActions.from_lists([ChessEnvUtils.get_legal_action_idxs(board) for board in boards])
+
+        with torch.inference_mode():
+            float_probs = torch.softmax(legal_actions.to_padded(values=legal_actions.get_legal_logits(model=float_model, x=observations)), dim=1)
+            variant_probs = torch.softmax(legal_actions.to_padded(values=legal_actions.get_legal_logits(model=variant_model, x=observations).float()), dim=1)
+
+        # the same policy = the same best move and (almost) the same sampling distribution
+        return {
+            "top1_agreement": float((float_probs.argmax(dim=1) == variant_probs.argmax(dim=1)).float().mean()),
+            "max_prob_diff": float((float_probs - variant_probs).abs().max()),
+            "float_latency_ms": ModelExporter.measure_latency(model=float_model),
+            "variant_latency_ms": ModelExporter.measure_latency(model=variant_model),
+        }
+
+
+    @staticmethod
+    def measure_latency(model: nn.Module, repeats: int = 50) -> float:
+        # single position like in /play-vs-agent
+        x = ModelExporter.get_example_input()
+
+        with torch.inference_mode():
+            model(x)
+            started_at = time.perf_counter()
+
+            for _ in range(repeats):
+                model(x)
+
+        return (time.perf_counter() - started_at) / repeats * 1000
+
+
+    @staticmethod
+    def get_parity_boards(positions_num: int, seed: int = 0) -> List[chess.Board]:
+        # positions from random games, reproducible so the reports of different exports can be compared
+        rng = random.Random(seed)
+        boards = []
+        board = chess.Board()
+
+        while len(boards) < positions_num:
+            if board.is_game_over():
+                board = chess.Board()
+
+            boards.append(board.copy(stack=False))
+            board.push(rng.choice(list(board.legal_moves)))
+
+        return boards
+
+
+    @staticmethod
+    def get_example_input() -> torch.Tensor:
+        return torch.from_numpy(ObservationEncoder.encode(board=chess.Board())).unsqueeze(0)
+
+
+    @staticmethod
+    def get_variant_path(filepath: str, suffix: str) -> str:
+        path = Path(filepath)
+
+        return str(path.with_name(f"{path.stem}{suffix}"))
@@ -0,0 +1,154 @@
+import os
+import time
+import fcntl
+import torch
+import threading
+import torch.nn as nn
+from pathlib import Path
+from dataclasses import dataclass
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple
+from backend.chess_agent.models.model_factory import ModelFactory
+from backend.configs.api_config import ApiConfig
+from backend.enums import ModelType
+from backend.utils.utils import Utils
+
+
+# allowed once for the process, the safe_globals context manager resets the process-wide allowlist on exit,
+# which breaks weights only loads running at the same time in other threads
+torch.serialization.add_safe_globals([ModelType])
+
+
+@dataclass
+class ResidentWeights:
+    checkpoint_path: str
+    weights_path: str
+    weights_bytes: int
+    attached_at: float
+
+
+class SharedWeights:
+
+    # checkpoint file name -> weights attached by this process
+    # every api worker memory-maps the same weights-only file from shared memory (tmpfs), the pages are in RAM once per host
+    _resident: Dict[str, ResidentWeights] = {}
+    _lock = threading.Lock()
+
+    WEIGHTS_SUFFIX = ".weights.pt"
+    LOAD_ATTEMPTS = 3
+
+
+    @classmethod
+    def load_model(cls, checkpoint_path: str) -> nn.Module:
+        weights_path, weights = SharedWeights.load_weights(checkpoint_path=checkpoint_path)
+
+        if weights['model_config_dict'] is not None:
+            # parameters on the meta device take no memory, assign=True makes them views of the shared pages
+            with torch.device("meta"):
+                model = ModelFactory.create_model(config=ModelFactory.create_config(config_dict=weights['model_config_dict']))
+        else:
+            model = Utils.create_default_model().to(device="cpu")  # old checkpoint format without the model config
+
+        model.load_state_dict(weights['model_state_dict'], assign=True)
+
+        if any(tensor.is_meta for tensor in model.state_dict().values()):
+            raise ValueError(f"Weights file {weights_path} doesn't cover every tensor of {model.model_name}")
+
+        model.eval().requires_grad_(False)
+
+        with cls._lock:
+            cls._resident[Path(checkpoint_path).name] = ResidentWeights(
+                checkpoint_path=checkpoint_path,
+                weights_path=weights_path,
+                weights_bytes=os.path.getsize(weights_path),
+                attached_at=time.time(),
+            )
+
+        print(f"Model [{model.model_name}] attached to shared weights {weights_path}")
+
+        return model
+
+
+    @staticmethod
+    def load_weights(checkpoint_path: str) -> Tuple[str, Dict[str, Any]]:
+        # the checkpoint can be replaced between resolving the weights path and loading it,
+        # then another worker removes the old weights file and the path is resolved again for the new version
+        for attempt in range(SharedWeights.LOAD_ATTEMPTS):
+            weights_path = SharedWeights.ensure_weights_file(checkpoint_path=checkpoint_path)
+
+            try:
+                return weights_path, torch.load(weights_path, map_location="cpu", mmap=True, weights_only=True)
+            except FileNotFoundError:
+                if attempt == SharedWeights.LOAD_ATTEMPTS - 1:
+                    raise
+
+        raise FileNotFoundError(checkpoint_path)
+
+
+    @staticmethod
+    def ensure_weights_file(checkpoint_path: str) -> str:
+        # the first worker writes the file, the others wait on the lock and reuse it
+        weights_path = SharedWeights.get_weights_path(checkpoint_path=checkpoint_path)
+
+        if os.path.isfile(weights_path):
+            return weights_path
+
+        with SharedWeights.file_lock(lock_path=f"{weights_path}.lock"):
+            if not os.path.isfile(weights_path):
+                checkpoint_data = torch.load(checkpoint_path, map_location="cpu", mmap=True, weights_only=True)
+
+                torch.save({
+                    'model_config_dict': checkpoint_data.get('model_config_dict'),
+                    'model_state_dict': checkpoint_data['model_state_dict'],  # no optimizer state
+                }, f"{weights_path}.tmp")
+
+                os.replace(f"{weights_path}.tmp", weights_path)
+                SharedWeights.remove_stale_files(weights_path=weights_path)
+
+        return weights_path
+
+
+    @staticmethod
+    def get_weights_path(checkpoint_path: str) -> str:
+        # the checkpoint version is a part of the name, a replaced checkpoint gets a new weights file
+        stat = os.stat(checkpoint_path)
+        shared_dir = Path(ApiConfig.SHARED_WEIGHTS_DIR)
+        shared_dir.mkdir(parents=True, exist_ok=True)
+
+        return str(shared_dir / f"{Path(checkpoint_path).stem}-{stat.st_mtime_ns}-{stat.st_size}{SharedWeights.WEIGHTS_SUFFIX}")
+
+
+    @staticmethod
+    def remove_stale_files(weights_path: str):
+        # older versions of the same checkpoint, workers still using them keep their mapping until they let it go
+        # the lock files stay, another worker may hold or be waiting on one and a new file would not be locked with it
+        prefix = Path(weights_path).name.rsplit("-", 2)[0]
+
+        for path in Path(weights_path).parent.glob(f"{prefix}-*{SharedWeights.WEIGHTS_SUFFIX}"):
+            if str(path) != weights_path and path.name.rsplit("-", 2)[0] == prefix:
+                path.unlink(missing_ok=True)
+
+
+    @staticmethod
+    @contextmanager
+    def file_lock(lock_path: str):
+        with open(lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+    @classmethod
+    def release(cls, checkpoint_name: str):
+        # the mapping goes away with the last reference to the model, the file stays for the other workers
+        with cls._lock:
+            cls._resident.pop(checkpoint_name, None)
+
+
+    @classmethod
+    def get_resident(cls) -> List[Dict[str, Any]]:
+        with cls._lock:
+            return [vars(resident_weights).copy() for resident_weights in cls._resident.values()]
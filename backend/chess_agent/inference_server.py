@@ -0,0 +1,210 @@
+import time
+import queue
+import chess
+import torch
+import threading
+import numpy as np
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+from backend.chess_env.observation_encoder import ObservationEncoder
+from backend.configs.inference_config import InferenceConfig
+from backend.utils.chess_env_utils import ChessEnvUtils
+from backend.utils.ragged_actions import RaggedActions
+
+
+@dataclass
+class InferenceResult:
+    action: int
+    legal_action_idxs: np.ndarray
+    probs: np.ndarray  # probabilities of legal_action_idxs (masked softmax)
+    queue_latency: float  # seconds from submit to the start of the forward pass
+    compute_latency: float  # seconds of the batched forward pass and sampling
+
+
+class InferenceServerStoppedError(RuntimeError):
+    pass
+
+
+@dataclass
+class InferenceRequest:
+    observation: np.ndarray  # (12, 8, 8) float32
+    legal_action_idxs: np.ndarray
+    future: Future
+    submitted_at: float
+
+
+class InferenceServer:
+
+    def __init__(self, model, device, max_batch_size: int = InferenceConfig.MAX_BATCH_SIZE, max_wait_ms: float = InferenceConfig.MAX_WAIT_MS,
+                 model_version: Optional[str] = None):
+        self.model = model
+        self.model_version = model_version  # version of the checkpoint the model was loaded from
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self.requests: queue.Queue[InferenceRequest] = queue.Queue()
+        self.observations = torch.empty((max_batch_size, ObservationEncoder.PLANES_NUM, 8, 8), dtype=torch.float32)
+
+        self.thread: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+        self.submit_lock = threading.Lock()  # stop can't slip between the stopped check and the put of submit
+        self.model_lock = threading.Lock()  # held by the forward pass, the owner takes it to update the weights in place
+
+        # metrics
+        self.batches_num = 0
+        self.requests_num = 0
+        self.batch_fill_sum = 0.0
+        self.queue_latencies = deque(maxlen=InferenceConfig.METRICS_WINDOW)
+        self.compute_latencies = deque(maxlen=InferenceConfig.METRICS_WINDOW)
+
+
+    def start(self) -> 'InferenceServer':
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.serve, name="inference-server", daemon=True)
+            self.thread.start()
+
+        return self
+
+
+    def stop(self, wait: bool = True) -> None:
+        # new requests are rejected, the ones already queued are still answered
+        with self.submit_lock:
+            self.stop_event.set()
+
+        if wait and self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive() and not self.stop_event.is_set()
+
+
+    def submit(self, observation: np.ndarray, legal_action_idxs: np.ndarray) -> Future:
+        future = Future()
+
+        # a finished game has nothing to sample from, it must not reach (and fail) a batch shared with other requests
+        if len(legal_action_idxs) == 0:
+            future.set_exception(ValueError("Position has no legal moves"))
+            return future
+
+        # every request put before stop_event is set is drained by serve, the ones after it are rejected here
+        with self.submit_lock:
+            if self.stop_event.is_set():
+                future.set_exception(InferenceServerStoppedError("Inference server was stopped"))
+                return future
+
+            self.requests.put(InferenceRequest(observation=observation, legal_action_idxs=legal_action_idxs, future=future, submitted_at=time.perf_counter()))
+
+        return future
+
+
+    def submit_board(self, board: chess.Board) -> Future:
+        return self.submit(observation=ObservationEncoder.encode(board=board), legal_action_idxs=ChessEnvUtils.get_legal_action_idxs(board))
+
+
+    def serve(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                batch = [self.requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+
+            deadline = batch[0].submitted_at + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+
+                try:
+                    batch.append(self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            self.run_batch(batch=batch)
+
+        # don't leave anybody waiting, a replaced server answers what it has already accepted
+        while not self.requests.empty():
+            batch = []
+
+            while len(batch) < self.max_batch_size and not self.requests.empty():
+                batch.append(self.requests.get_nowait())
+
+            self.run_batch(batch=batch)
+
+
+    def run_batch(self, batch: List[InferenceRequest]) -> None:
+        started_at = time.perf_counter()
+        batch_size = len(batch)
+
+        try:
+            for i, request in enumerate(batch):
+                self.observations[i] = torch.from_numpy(request.observation)
+
+            legal_actions = RaggedActions.from_lists([request.legal_action_idxs for request in batch], device=self.device)
+
+            with self.model_lock, torch.inference_mode():
+                legal_logits = legal_actions.get_legal_logits(model=self.model, x=self.observations[:batch_size].to(device=self.device)).float().cpu()
+        except Exception as e:
+            if batch_size > 1:
+                # one bad request must not fail the others, every request is retried on its own
+                for request in batch:
+                    self.run_batch(batch=[request])
+            else:
+                batch[0].future.set_exception(e)
+            return
+
+        results = []
+        offset = 0
+
+        for request in batch:
+            legal_moves_num = len(request.legal_action_idxs)
+
+            try:
+                probs = torch.softmax(legal_logits[offset:offset + legal_moves_num], dim=0)
+                action = int(request.legal_action_idxs[torch.multinomial(probs, num_samples=1)])
+                results.append((request, action, probs.numpy()))
+            except Exception as e:
+                request.future.set_exception(e)
+
+            offset += legal_moves_num
+
+        compute_latency = time.perf_counter() - started_at
+
+        # counted before the results are set, so the metrics already cover every answered request
+        self.batches_num += 1
+        self.requests_num += batch_size
+        self.batch_fill_sum += batch_size / self.max_batch_size
+
+        for request, action, probs in results:
+            queue_latency = started_at - request.submitted_at
+
+            self.queue_latencies.append(queue_latency)
+            self.compute_latencies.append(compute_latency)
+
+            request.future.set_result(InferenceResult(
+                action=action,
+                legal_action_idxs=np.asarray(request.legal_action_idxs),
+                probs=probs,
+                queue_latency=queue_latency,
+                compute_latency=compute_latency,
+            ))
+
+
+    def get_metrics(self) -> Dict[str, float]:
+        def percentile_ms(latencies, q):
+            return float(np.percentile(latencies, q) * 1000) if latencies else 0.0
+
+        return {
+            'batches': self.batches_num,
+            'requests': self.requests_num,
+            'avg_batch_size': self.requests_num / self.batches_num if self.batches_num else 0.0,
+            'avg_batch_fill': self.batch_fill_sum / self.batches_num if self.batches_num else 0.0,
+            'queue_latency_p50_ms': percentile_ms(self.queue_latencies, 50),
+            'queue_latency_p99_ms': percentile_ms(self.queue_latencies, 99),
+            'compute_latency_p50_ms': percentile_ms(self.compute_latencies, 50),
+            'compute_latency_p99_ms': percentile_ms(self.compute_latencies, 99),
+        }
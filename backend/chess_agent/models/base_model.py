@@ -3,6 +3,7 @@ import torch.nn as nn
 from abc import ABC, abstractmethod
 from typing import Tuple
 from backend.chess_agent.models.base_model_config import BaseModelConfig
+from backend.utils.ragged_actions import RaggedActions
 
 
 class BaseModel(ABC, nn.Module):
@@ -21,6 +22,10 @@ class BaseModel(ABC, nn.Module):
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         pass
 
+    def forward_legal(self, x: torch.Tensor, legal_actions: RaggedActions) -> torch.Tensor:
+        # (L,) logits of the legal actions only, models with a linear policy layer override it to skip the other rows
+        return self.forward(x)[legal_actions.batch_idxs, legal_actions.action_idxs]
+
     @abstractmethod
     def get_model_config(self) -> BaseModelConfig:
         pass
@@ -4,6 +4,7 @@ import torch.nn.functional as F
 from backend.chess_agent.models.base_model import BaseModel
 from backend.chess_agent.models.base_model_config import BaseModelConfig
 from backend.chess_agent.models.cnn_fc.cnn_fc_config import CnnFcConfig
+from backend.utils.ragged_actions import RaggedActions
 
 
 class CnnFc(BaseModel):
@@ -64,6 +65,25 @@ class CnnFc(BaseModel):
 
 
     def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.fc_layers[-1](self.forward_features(x))
+
+
+    def forward_legal(self, x: torch.Tensor, legal_actions: RaggedActions) -> torch.Tensor:
+        # only the weight rows of the legal actions (~30 of 4672) take part in the last layer
+        last_fc_layer = self.fc_layers[-1]
+
+        if not isinstance(last_fc_layer, nn.Linear):
+            return super().forward_legal(x, legal_actions)  # int8 quantized layer, its weights are packed
+
+        features = self.forward_features(x)
+
+        weight = last_fc_layer.weight[legal_actions.action_idxs]  # (L, features)
+        bias = last_fc_layer.bias[legal_actions.action_idxs]
+
+        return (features[legal_actions.batch_idxs] * weight).sum(dim=1) + bias
+
+
+    def forward_features(self, x: torch.Tensor) -> torch.Tensor:
         for i, conv_layer in enumerate(self.conv_layers):
             x = conv_layer(x)
             x = self.instance_norm_layers[i](x)
@@ -78,9 +98,7 @@ class CnnFc(BaseModel):
             x = F.relu(fc_layer(x))
             x = F.dropout(input=x, p=self.config.dropout_prob_fc_lst[i], training=self.training)
 
-        # Last FC layer
-        x = self.fc_layers[-1](x)
-
+        # input of the last FC layer
         return x
 
 
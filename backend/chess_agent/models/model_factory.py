@@ -1,8 +1,10 @@
-from typing import Dict, Type, List
+from typing import Dict, Type, List, Any
 from backend.chess_agent.models.base_model import BaseModel
 from backend.chess_agent.models.base_model_config import BaseModelConfig
 from backend.chess_agent.models.cnn_fc.cnn_fc import CnnFc
 from backend.chess_agent.models.cnn_fc.cnn_fc_config import CnnFcConfig
+from backend.chess_agent.models.res_conv.res_conv import ResConv
+from backend.chess_agent.models.res_conv.res_conv_config import ResConvConfig
 from backend.enums import ModelType
 
 
@@ -16,6 +18,7 @@ class ModelFactory:
     def initialize(cls):
         if not cls._initialized:
             cls.register_model(ModelType.CNN_FC, CnnFc, CnnFcConfig)
+            cls.register_model(ModelType.RES_CONV, ResConv, ResConvConfig)
 
             cls._initialized = True
 
@@ -35,6 +38,21 @@ class ModelFactory:
         return model_class(config=config, **kwargs)
 
 
+    @classmethod
+    def create_config(cls, config_dict: Dict[str, Any]) -> BaseModelConfig:
+        cls.initialize()
+
+        model_type = ModelType(config_dict['model_type'])  # enum or its value
+
+        if model_type not in cls._config_registry:
+            raise ValueError(
+                f"Unsupported model type: {model_type.value}."
+                f"Available types: {cls.get_supported_model_types()}"
+            )
+
+        return cls._config_registry[model_type].from_dict({**config_dict, 'model_type': model_type})
+
+
     @classmethod
     def register_model(cls, model_type: ModelType, model_class: Type[BaseModel], config_class: Type[BaseModelConfig]):
         cls._model_registry[model_type] = model_class
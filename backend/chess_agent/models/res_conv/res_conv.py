@@ -0,0 +1,91 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from backend.chess_agent.models.base_model import BaseModel
+from backend.chess_agent.models.base_model_config import BaseModelConfig
+from backend.chess_agent.models.res_conv.res_conv_config import ResConvConfig
+from backend.utils.ragged_actions import RaggedActions
+
+
+class ResBlock(nn.Module):
+
+    def __init__(self, channels: int, kernel_size: int):
+        super().__init__()
+
+        self.conv1 = nn.Conv2d(in_channels=channels, out_channels=channels, kernel_size=kernel_size, padding=kernel_size // 2, bias=False)
+        self.norm1 = nn.InstanceNorm2d(num_features=channels, affine=True)
+        self.conv2 = nn.Conv2d(in_channels=channels, out_channels=channels, kernel_size=kernel_size, padding=kernel_size // 2, bias=False)
+        self.norm2 = nn.InstanceNorm2d(num_features=channels, affine=True)
+
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        out = F.relu(self.norm1(self.conv1(x)))
+        out = self.norm2(self.conv2(out))
+
+        return F.relu(out + x)
+
+
+class ResConv(BaseModel):
+
+    def __init__(self, config: ResConvConfig, **kwargs):
+        super().__init__(config.input_shape, **kwargs)
+
+        self.config = config
+
+        self.input_conv = nn.Conv2d(in_channels=config.input_shape[0], out_channels=config.channels, kernel_size=config.kernel_size,
+                                    padding=config.kernel_size // 2, bias=False)
+        self.input_norm = nn.InstanceNorm2d(num_features=config.channels, affine=True)
+
+        self.res_blocks = nn.ModuleList([ResBlock(channels=config.channels, kernel_size=config.kernel_size) for _ in range(config.res_block_num)])
+
+        # policy head: 1x1 convs, one output plane per move type from every square
+        self.policy_conv = nn.Conv2d(in_channels=config.channels, out_channels=config.policy_channels, kernel_size=1, bias=False)
+        self.policy_norm = nn.InstanceNorm2d(num_features=config.policy_channels, affine=True)
+        self.policy_out = nn.Conv2d(in_channels=config.policy_channels, out_channels=config.policy_planes, kernel_size=1)
+
+        self.init_weights()
+
+
+    def init_weights(self):
+        for module in self.modules():
+            if isinstance(module, nn.Conv2d) and module is not self.policy_out:
+                nn.init.kaiming_uniform_(tensor=module.weight, nonlinearity='relu')  # he
+
+        # small initial logits, close to a uniform policy like the last layer of CnnFc
+        nn.init.orthogonal_(tensor=self.policy_out.weight.view(self.config.policy_planes, -1), gain=0.01)
+        nn.init.zeros_(self.policy_out.bias)
+
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x = self.policy_out(self.forward_features(x))  # (N, planes, 8, 8)
+
+        # (N, 8, 8, planes) -> action idx = square * planes + plane like in the action table
+        return x.permute(0, 2, 3, 1).reshape(x.size(0), -1)
+
+
+    def forward_legal(self, x: torch.Tensor, legal_actions: RaggedActions) -> torch.Tensor:
+        # the last 1x1 conv is a linear layer per square, only the (square, plane) pairs of the legal actions are computed
+        features = self.forward_features(x).flatten(start_dim=2)  # (N, policy_channels, 64)
+        squares, planes = legal_actions.action_idxs // self.config.policy_planes, legal_actions.action_idxs % self.config.policy_planes
+
+        weight = self.policy_out.weight.view(self.config.policy_planes, -1)[planes]  # (L, policy_channels)
+        bias = self.policy_out.bias[planes]
+
+        return (features[legal_actions.batch_idxs, :, squares] * weight).sum(dim=1) + bias
+
+
+    def forward_features(self, x: torch.Tensor) -> torch.Tensor:
+        x = F.relu(self.input_norm(self.input_conv(x)))
+
+        for res_block in self.res_blocks:
+            x = res_block(x)
+
+        x = F.relu(self.policy_norm(self.policy_conv(x)))
+        x = F.dropout2d(input=x, p=self.config.dropout_prob, training=self.training)
+
+        # input of the last policy conv
+        return x
+
+
+    def get_model_config(self) -> BaseModelConfig:
+        return self.config
@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+from backend.chess_agent.models.base_model_config import BaseModelConfig
+from backend.configs.game_config import GameConfig
+from backend.enums import ModelType
+from backend.utils.utils import Utils
+
+
+@dataclass(frozen=True)
+class ResConvConfig(BaseModelConfig):
+    model_type = ModelType.RES_CONV
+
+    channels: int
+    res_block_num: int
+    kernel_size: int
+
+    policy_channels: int
+    policy_planes: int  # moves from every square: 56 queen-like + 8 knight + 9 underpromotions
+
+    dropout_prob: float
+
+
+    def __post_init__(self):
+        Utils.validate_prob(val=self.dropout_prob, name="dropout_prob")
+
+        if self.policy_planes * 64 != GameConfig.ACTION_SPACE:
+            raise ValueError(f"policy_planes * 64 has to be equal to ACTION_SPACE ({GameConfig.ACTION_SPACE}), got {self.policy_planes * 64}")
+
+
+    @classmethod
+    def for_cpu(cls):
+        return cls(
+            model_type=ModelType.RES_CONV, input_shape=(12, 8, 8),
+            channels=64, res_block_num=6, kernel_size=3,
+            policy_channels=64, policy_planes=GameConfig.ACTION_SPACE // 64,
+            dropout_prob=0.1
+        )
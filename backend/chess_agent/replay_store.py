@@ -0,0 +1,163 @@
+import os
+import json
+import chess
+import numpy as np
+from typing import List, Optional, Union
+from backend.chess_env.observation_encoder import ObservationEncoder
+from backend.configs.training_config import TrainingConfig
+
+
+# ~110 bytes per position instead of 3 KB of float32 planes
+POSITION_DTYPE = np.dtype([
+    ('bitboards', '<u8', (ObservationEncoder.PLANES_NUM,)),  # same plane order as the observation
+    ('turn', 'u1'),
+    ('castling', 'u1'),  # bits: 1 = white king side, 2 = white queen side, 4 = black king side, 8 = black queen side
+    ('ep_square', 'i1'),  # -1 = no en passant square
+    ('action', '<u2'),
+    ('reward', '<f4'),  # reward of the player who made the move
+    ('episode', '<u4'),
+    ('done', 'u1'),  # last position of the episode
+])
+
+CASTLING_ROOKS = [chess.BB_H1, chess.BB_A1, chess.BB_H8, chess.BB_A8]
+
+
+class ReplayStore:
+
+    INDEX_FILE_NAME = "index.json"
+
+
+    def __init__(self, path: str, segment_size: int = TrainingConfig.REPLAY_SEGMENT_SIZE, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.segments: List[np.memmap] = []
+        self.size = 0
+
+        index_path = os.path.join(path, ReplayStore.INDEX_FILE_NAME)
+
+        if os.path.isfile(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+
+            self.segment_size = index["segment_size"]
+            self.size = index["size"]
+
+            for segment_idx in range(index["segments_num"]):
+                self.segments.append(np.load(self.get_segment_path(segment_idx=segment_idx), mmap_mode="r" if read_only else "r+"))
+        else:
+            if read_only:
+                raise FileNotFoundError(f"Replay store not found: {path}")
+
+            os.makedirs(path, exist_ok=True)
+            self.segment_size = segment_size
+
+
+    def __len__(self) -> int:
+        return self.size
+
+
+    def append_episode(self, positions: np.ndarray, episode: int) -> None:
+        # positions = (T,) POSITION_DTYPE records of one finished episode
+        if self.read_only:
+            raise PermissionError("Replay store was opened read only")
+
+        positions['episode'] = episode
+        positions['done'] = 0
+        positions['done'][-1] = 1
+
+        written = 0
+
+        while written < len(positions):
+            segment_idx, offset = divmod(self.size, self.segment_size)
+
+            if segment_idx == len(self.segments):
+                self.segments.append(np.lib.format.open_memmap(self.get_segment_path(segment_idx=segment_idx), mode="w+",
+                                                               dtype=POSITION_DTYPE, shape=(self.segment_size,)))
+
+            chunk_size = min(len(positions) - written, self.segment_size - offset)
+            self.segments[segment_idx][offset:offset + chunk_size] = positions[written:written + chunk_size]
+
+            written += chunk_size
+            self.size += chunk_size
+
+
+    def get(self, idxs: np.ndarray) -> np.ndarray:
+        idxs = np.asarray(idxs, dtype=np.int64)
+        positions = np.empty(len(idxs), dtype=POSITION_DTYPE)
+
+        segment_idxs, offsets = np.divmod(idxs, self.segment_size)
+
+        for segment_idx in np.unique(segment_idxs):
+            selected = segment_idxs == segment_idx
+            positions[selected] = self.segments[segment_idx][offsets[selected]]
+
+        return positions
+
+
+    def sample(self, batch_size: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        # a batch of batch_size positions can't be drawn from nothing, an empty batch would only fail later in the learner
+        if self.size == 0:
+            raise ValueError(f"Replay store {self.path} is empty, there are no positions to sample")
+
+        rng = rng if rng is not None else np.random.default_rng()
+
+        return self.get(idxs=rng.integers(0, self.size, size=batch_size))
+
+
+    def flush(self) -> None:
+        for segment in self.segments:
+            segment.flush()
+
+        index = {"segment_size": self.segment_size, "size": self.size, "segments_num": len(self.segments)}
+        index_path = os.path.join(self.path, ReplayStore.INDEX_FILE_NAME)
+
+        with open(f"{index_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(index, f)
+
+        os.replace(f"{index_path}.tmp", index_path)  # the index never points past the flushed data
+
+
+    def get_segment_path(self, segment_idx: int) -> str:
+        return os.path.join(self.path, f"segment-{segment_idx:05d}.npy")
+
+
+    @staticmethod
+    def encode_position(board: chess.Board, action: int, reward: float = 0.0) -> np.ndarray:
+        position = np.zeros(1, dtype=POSITION_DTYPE)
+
+        ObservationEncoder.fill_bitboards(board=board, bitboards=position['bitboards'][0])
+        position['turn'] = board.turn
+        position['castling'] = sum(1 << i for i, rook in enumerate(CASTLING_ROOKS) if board.castling_rights & rook)
+        position['ep_square'] = board.ep_square if board.ep_square is not None else -1
+        position['action'] = action
+        position['reward'] = reward
+
+        return position
+
+
+    @staticmethod
+    def decode_observations(positions: np.ndarray, out: Union[np.ndarray, None] = None) -> np.ndarray:
+        if out is None:
+            out = np.empty((len(positions), ObservationEncoder.PLANES_NUM, 8, 8), dtype=np.float32)
+
+        ObservationEncoder.unpack_bitboards(bitboards=np.ascontiguousarray(positions['bitboards'], dtype='<u8'), out=out)
+
+        return out
+
+
+    @staticmethod
+    def decode_board(position: np.void) -> chess.Board:
+        board = chess.Board.empty()
+
+        for plane, bitboard in enumerate(position['bitboards']):
+            color = chess.WHITE if plane < 6 else chess.BLACK
+            piece_type = plane % 6 + 1
+
+            for square in chess.scan_forward(int(bitboard)):
+                board.set_piece_at(square, chess.Piece(piece_type, color))
+
+        board.turn = bool(position['turn'])
+        board.castling_rights = sum(rook for i, rook in enumerate(CASTLING_ROOKS) if int(position['castling']) & (1 << i))
+        board.ep_square = int(position['ep_square']) if position['ep_square'] >= 0 else None
+
+        return board
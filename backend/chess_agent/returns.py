@@ -0,0 +1,52 @@
+import numpy as np
+from typing import Optional
+
+
+class Returns:
+
+    @staticmethod
+    def discounted_returns(rewards: np.ndarray, dones: np.ndarray, gamma: float) -> np.ndarray:
+        # rewards, dones = (T,) steps of many episodes one after another, done marks the last step of an episode
+        rewards = np.asarray(rewards, dtype=np.float32)
+        dones = np.asarray(dones, dtype=np.bool_)
+
+        if rewards.ndim == 2:
+            return Returns.discounted_returns_batched(rewards=rewards, dones=dones, gamma=gamma)
+
+        if len(rewards) == 0:
+            return rewards
+
+        # every episode becomes a zero padded column, so the reverse scan runs over the longest episode only
+        episode_idxs, step_idxs = Returns.get_episode_layout(dones=dones)
+        padded_rewards = np.zeros((step_idxs.max() + 1, episode_idxs[-1] + 1), dtype=np.float32)
+        padded_rewards[step_idxs, episode_idxs] = rewards
+
+        padded_returns = Returns.discounted_returns_batched(rewards=padded_rewards, dones=np.zeros_like(padded_rewards, dtype=np.bool_), gamma=gamma)
+
+        return padded_returns[step_idxs, episode_idxs]
+
+
+    @staticmethod
+    def discounted_returns_batched(rewards: np.ndarray, dones: np.ndarray, gamma: float, last_returns: Optional[np.ndarray] = None) -> np.ndarray:
+        # rewards, dones = (T, N) steps of N environments, last_returns = (N,) bootstrap of the unfinished episodes
+        returns = np.empty_like(rewards, dtype=np.float32)
+        running = np.zeros(rewards.shape[1], dtype=np.float32) if last_returns is None else np.asarray(last_returns, dtype=np.float32)
+        not_dones = 1.0 - np.asarray(dones, dtype=np.float32)
+
+        for t in range(len(rewards) - 1, -1, -1):
+            running = rewards[t] + gamma * running * not_dones[t]
+            returns[t] = running
+
+        return returns
+
+
+    @staticmethod
+    def get_episode_layout(dones: np.ndarray):
+        # episode idx and step idx inside the episode of every step, an unfinished tail counts as one more episode
+        episode_idxs = np.zeros(len(dones), dtype=np.int64)
+        episode_idxs[1:] = np.cumsum(dones[:-1])
+
+        episode_starts = np.flatnonzero(np.diff(episode_idxs, prepend=-1))
+        step_idxs = np.arange(len(dones)) - episode_starts[episode_idxs]
+
+        return episode_idxs, step_idxs
@@ -1,22 +1,49 @@
 import chess
 import torch
 import numpy as np
+from dataclasses import dataclass
 from torch.distributions import Categorical
+from typing import Optional, List
+from backend.chess_agent.replay_store import ReplayStore
+from backend.chess_agent.returns import Returns
 from backend.chess_env.chess_env import ChessEnv
+from backend.chess_env.batched_chess_env import BatchedChessEnv
+from backend.evals.custom_eval import CustomEval
 from backend.chess_agent.agent_config import *
+from backend.configs.training_config import TrainingConfig
 from backend.utils.chess_env_utils import ChessEnvUtils
+from backend.utils.legal_move_cache import LegalMoveCache
+from backend.utils.ragged_actions import RaggedActions
 from backend.utils.utils import Utils
 
 
+@dataclass
+class PolicyStep:
+    observation: np.ndarray  # (12, 8, 8) uint8
+    legal_action_idxs: np.ndarray
+    action: int
+    explored: bool  # random move (epsilon) instead of a sampled one
+    behavior_log_prob: Optional[float] = None  # log_prob under the (possibly older) weights which chose the move, actor/learner only
+
+
 class SelfPlay:
 
-    def __init__(self, device):
+    def __init__(self, device, replay_store: Optional[ReplayStore] = None, recompute_log_probs: bool = TrainingConfig.RECOMPUTE_LOG_PROBS,
+                 log_prob_minibatch_size: int = TrainingConfig.LOG_PROB_MINIBATCH_SIZE):
         self.device = device
+        self.replay_store = replay_store
+        self.recompute_log_probs = recompute_log_probs
+        self.log_prob_minibatch_size = log_prob_minibatch_size
+        self.episode = 0
+        self.episode_positions = []
 
+        # log_probs with autograd graphs (recompute_log_probs=False) or PolicySteps to recompute them from (recompute_log_probs=True)
         self.all_white_log_probs = []
         self.all_black_log_probs = []
         self.all_white_rewards = []
         self.all_black_rewards = []
+        self.all_white_dones = []  # True at the last move of each player in every episode
+        self.all_black_dones = []
         self.loss_list = []
 
         self.white_wins = 0
@@ -33,6 +60,7 @@ class SelfPlay:
         try:
             for episode in range (INIT_EPISODE, EPISODES + 1):
                 curr_episode = episode
+                self.episode = episode
 
                 self.collect_episode(env=env, model=model)
                 self.log_training_info(episode=episode, eval_score_list=env.eval_score_list, loss=None)
@@ -47,6 +75,7 @@ class SelfPlay:
                     print("=" * 50)
 
                     self.reset_probs_and_rewards()
+                    self.flush_replay_store()
 
                 if self.save_game:
                     env.save_game_pgn(episode=episode)
@@ -57,14 +86,71 @@ class SelfPlay:
                 print("Training interrupted! Saving model...")
                 Utils.save_model(model=model, optimizer=optimizer, episodes=curr_episode)
         finally:
+            self.flush_replay_store()
+
             if model_save and not interrupted:
                 Utils.save_model(model=model, optimizer=optimizer, episodes=curr_episode)
 
             print(f"White wins: {self.white_wins}; Black wins: {self.black_wins}; Draws: {self.draws};")
+            print(f"Legal move cache: {LegalMoveCache.get_stats()}")
+            print(f"Eval cache: {CustomEval.get_cache_stats()}")
+            Utils.plot_loss(loss_list=self.loss_list, mode="self-play")
+
+
+    def train_batched(self, env: BatchedChessEnv, model, optimizer, model_save=True):
+        curr_episode = INIT_EPISODE - 1
+        episodes_since_update = 0
+        interrupted = False
+
+        try:
+            while curr_episode < EPISODES:
+                episodes_num = min(env.num_envs, EPISODES - curr_episode)
+                finished_infos = self.collect_batched_episodes(env=env, model=model, episodes_num=episodes_num)
+
+                for info in finished_infos:
+                    curr_episode += 1
+                    episodes_since_update += 1
+
+                    self.log_training_info(episode=curr_episode, eval_score_list=info['eval_score_list'], loss=None)
+                    self.store_episode_positions(positions=info['positions'], episode=curr_episode)
+
+                    if info['winner'] is not None:
+                        env.envs[info['env_idx']].save_game_pgn(episode=curr_episode, board=info['final_board'])
+
+                if episodes_since_update >= UPDATE_FREQUENCY:
+                    self.compute_discounted_rewards()
+
+                    loss = self.update_model(model=model, optimizer=optimizer)
+
+                    print("Model was updated!")
+                    self.log_training_info(episode=curr_episode, eval_score_list=None, loss=loss)
+                    print("=" * 50)
+
+                    self.reset_probs_and_rewards()
+                    self.flush_replay_store()
+                    episodes_since_update = 0
+
+        except KeyboardInterrupt:
+            if model_save:
+                interrupted = True
+                print("Training interrupted! Saving model...")
+                Utils.save_model(model=model, optimizer=optimizer, episodes=curr_episode)
+        finally:
+            self.flush_replay_store()
+
+            if model_save and not interrupted:
+                Utils.save_model(model=model, optimizer=optimizer, episodes=curr_episode)
+
+            print(f"White wins: {self.white_wins}; Black wins: {self.black_wins}; Draws: {self.draws};")
+            print(f"Legal move cache: {LegalMoveCache.get_stats()}")
+            print(f"Eval cache: {CustomEval.get_cache_stats()}")
             Utils.plot_loss(loss_list=self.loss_list, mode="self-play")
 
 
     def update_model(self, model, optimizer):
+        if self.recompute_log_probs:
+            return self.update_model_recomputed(model=model, optimizer=optimizer)
+
         optimizer.zero_grad()
         loss = self.compute_loss()
         loss.backward()  # gradients calculation
@@ -76,9 +162,67 @@ class SelfPlay:
         return loss
 
 
+    def update_model_recomputed(self, model, optimizer):
+        optimizer.zero_grad()
+        loss = 0.0
+
+        for steps, rewards in ((self.all_white_log_probs, self.all_white_rewards), (self.all_black_log_probs, self.all_black_rewards)):
+            if not steps:
+                continue
+
+            rewards = torch.as_tensor(rewards, dtype=torch.float32, device=self.device)
+            rew_norm = rewards / (rewards.std() + 1e-8)
+
+            # same loss as compute_loss, but only one minibatch graph is alive at a time, gradients are accumulated
+            for start in range(0, len(steps), self.log_prob_minibatch_size):
+                end = start + self.log_prob_minibatch_size
+                log_probs = self.compute_log_probs(model=model, steps=steps[start:end])
+                ratios = self.compute_importance_ratios(log_probs=log_probs, steps=steps[start:end])
+
+                minibatch_loss = -(ratios * log_probs * rew_norm[start:end]).sum() / len(steps)
+                minibatch_loss.backward()
+
+                loss += minibatch_loss.item()
+
+        torch.nn.utils.clip_grad_norm_(parameters=model.parameters(), max_norm=1.0)
+
+        optimizer.step()
+
+        return loss
+
+
+    def compute_log_probs(self, model, steps: List[PolicyStep]) -> torch.Tensor:
+        observations = torch.from_numpy(np.stack([step.observation for step in steps])).to(device=self.device, dtype=torch.float32)
+        actions = torch.tensor([step.action for step in steps], dtype=torch.long, device=self.device)
+        explored = torch.tensor([step.explored for step in steps], dtype=torch.bool, device=self.device)
+
+        legal_actions = RaggedActions.from_lists([step.legal_action_idxs for step in steps], device=self.device)
+
+        # (N, max legal actions num) log_softmax over the legal actions only, illegal ones get no gradient anyway
+        log_probs = torch.log_softmax(legal_actions.to_padded(values=model.forward_legal(observations, legal_actions)), dim=1)
+
+        is_chosen = legal_actions.action_idxs == actions[legal_actions.batch_idxs]
+        log_probs = log_probs[legal_actions.batch_idxs[is_chosen], legal_actions.col_idxs[is_chosen]]
+
+        # random moves keep log(1 / legal_moves_num) like in make_step
+        return torch.where(explored, -torch.log(legal_actions.lengths.float()), log_probs)
+
+
+    def compute_importance_ratios(self, log_probs: torch.Tensor, steps: List[PolicyStep]) -> torch.Tensor:
+        # moves played by older weights (actor/learner) are reweighted by pi_current / pi_behavior,
+        # truncated like the rho of v-trace so a few unlikely moves can't blow up the gradient
+        if steps[0].behavior_log_prob is None:
+            return torch.ones_like(log_probs)
+
+        behavior_log_probs = torch.tensor([step.behavior_log_prob for step in steps], dtype=torch.float32, device=self.device)
+
+        return torch.exp(log_probs.detach() - behavior_log_probs).clamp(max=TrainingConfig.IMPORTANCE_RATIO_CLIP)
+
+
     def compute_loss(self):
-        white_log_probs = torch.stack(self.all_white_log_probs)
-        black_log_probs = torch.stack(self.all_black_log_probs)
+        # (T,) log_probs, (T, 1) would broadcast against (T,) rewards into a (T, T) matrix
+        white_log_probs = torch.stack(self.all_white_log_probs).view(-1)
+        black_log_probs = torch.stack(self.all_black_log_probs).view(-1)
 
         if not isinstance(self.all_white_rewards, torch.Tensor):
             self.all_white_rewards = torch.tensor(data=self.all_white_rewards, dtype=torch.float32).to(device=self.device)
@@ -102,7 +246,7 @@ class SelfPlay:
 
 
     def collect_episode(self, env: ChessEnv, model):
-        observation = env.reset(,
+        observation = env.reset()
 
         done = False
 
@@ -117,52 +261,186 @@ class SelfPlay:
                 self.all_black_rewards.append(black_reward)
                 self.all_black_log_probs.append(log_prob)
 
+        self.mark_episode_end()
+        self.store_episode_positions(positions=self.episode_positions, episode=self.episode)
+        self.episode_positions = []
+
+
+    def collect_batched_episodes(self, env: BatchedChessEnv, model, episodes_num: int):
+        observations, legal_masks = env.reset()
+
+        # a finished board is reset only while fewer than episodes_num games have started, the others wait for the
+        # running games to end, so every started game is finished and none is dropped when the call returns
+        games_started = min(env.num_envs, episodes_num)
+        active = np.arange(env.num_envs) < games_started
+        actions = np.zeros(env.num_envs, dtype=np.int64)
+
+        # trajectories of games which are still running, they are flushed to the all_* lists when the game ends
+        white_log_probs = [[] for _ in range(env.num_envs)]
+        black_log_probs = [[] for _ in range(env.num_envs)]
+        white_rewards = [[] for _ in range(env.num_envs)]
+        black_rewards = [[] for _ in range(env.num_envs)]
+        positions = [[] for _ in range(env.num_envs)]
+
+        finished_infos = []
+
+        while active.any():
+            env_idxs = np.flatnonzero(active)
+            turns = env.get_turns()
+            actions[env_idxs], log_probs = self.make_batched_step(model=model, observations=observations[env_idxs],
+                                                                  legal_masks=legal_masks[env_idxs], device=self.device)
+
+            if self.replay_store is not None:
+                for i in env_idxs:
+                    positions[i].append(ReplayStore.encode_position(board=env.envs[i].board, action=int(actions[i])))
+
+            observations, legal_masks, rewards, dones, infos = env.step(actions, active=active, auto_reset=False)
+
+            for j, i in enumerate(env_idxs):
+                log_prob = log_probs[j] if self.recompute_log_probs else log_probs[j:j + 1]
+
+                if turns[i] == chess.WHITE:
+                    white_rewards[i].append(float(rewards[i, 0]))
+                    white_log_probs[i].append(log_prob)
+                else:
+                    black_rewards[i].append(float(rewards[i, 1]))
+                    black_log_probs[i].append(log_prob)
+
+                if positions[i]:
+                    positions[i][-1]['reward'] = rewards[i, 0] if turns[i] == chess.WHITE else rewards[i, 1]
+
+                if not dones[i]:
+                    continue
+
+                self.all_white_rewards.extend(white_rewards[i])
+                self.all_white_log_probs.extend(white_log_probs[i])
+                self.all_black_rewards.extend(black_rewards[i])
+                self.all_black_log_probs.extend(black_log_probs[i])
+                self.mark_episode_end()
+
+                self.count_result(winner=infos[i].get('winner'))
+                infos[i]['positions'] = positions[i]
+                finished_infos.append(infos[i])
+
+                white_log_probs[i], black_log_probs[i], white_rewards[i], black_rewards[i], positions[i] = [], [], [], [], []
+
+                if games_started < episodes_num:
+                    env.reset_env(env_idx=i)
+                    games_started += 1
+                else:
+                    active[i] = False
+
+        return finished_infos
+
 
     def compute_discounted_rewards(self):
-        white_cumulative_rewards = 0
-        black_cumulative_rewards = 0
+        # the discount chain restarts at every episode boundary
+        white_returns = Returns.discounted_returns(rewards=self.all_white_rewards, dones=self.all_white_dones, gamma=GAMMA)
+        black_returns = Returns.discounted_returns(rewards=self.all_black_rewards, dones=self.all_black_dones, gamma=GAMMA)
 
-        white_discounted_rewards = []
-        black_discounted_rewards = []
+        self.all_white_rewards = torch.from_numpy(white_returns).to(device=self.device)
+        self.all_black_rewards = torch.from_numpy(black_returns).to(device=self.device)
 
-        for reward in reversed(self.all_white_rewards):
-            white_cumulative_rewards = reward + GAMMA * white_cumulative_rewards
-            white_discounted_rewards.insert(0, white_cumulative_rewards)
 
-        for reward in reversed(self.all_black_rewards):
-            black_cumulative_rewards = reward + GAMMA * black_cumulative_rewards
-            black_discounted_rewards.insert(0, black_cumulative_rewards)
+    def mark_episode_end(self):
+        for rewards, dones in ((self.all_white_rewards, self.all_white_dones), (self.all_black_rewards, self.all_black_dones)):
+            dones.extend([False] * (len(rewards) - len(dones)))
 
-        self.all_white_rewards = torch.tensor(data=white_discounted_rewards, dtype=torch.float32).to(device=self.device)
-        self.all_black_rewards = torch.tensor(data=black_discounted_rewards, dtype=torch.float32).to(device=self.device)
+            if dones:
+                dones[-1] = True
 
 
     def make_step(self, env, model, observation, device):
         # observation_tensor = (batch_size = 1, channels, height, width)
-        observation_tensor = torch.tensor(data=observation, dtype=torch.float32).permute(2, 0, 1).unsqueeze(0).to(device=device)
+        observation_tensor = torch.from_numpy(observation).unsqueeze(0).to(device=device)
 
-        logits = model(observation_tensor)
         legal_action_idxs = ChessEnvUtils.get_legal_action_idxs(env.board)
+        legal_actions = RaggedActions.from_lists([legal_action_idxs], device=device)
+
+        # with recompute_log_probs the graph is built later in update_model_recomputed
+        with torch.set_grad_enabled(not self.recompute_log_probs):
+            legal_logits = model.forward_legal(observation_tensor, legal_actions)  # (legal_moves_num,)
 
-        mask = torch.full_like(input=logits, fill_value=float('-inf'))
-        mask[0, legal_action_idxs] = 0.0
-        masked_logits = logits + mask
+        probs = torch.softmax(input=legal_logits, dim=0)
+        dist = Categorical(probs=probs)  # discrete distribution over the legal moves
 
-        probs = torch.softmax(input=masked_logits, dim=1)
-        dist = Categorical(probs=probs)  # discrete distribution
+        is_explored = np.random.rand() < EPSILON
 
-        if np.random.rand() < EPSILON:
+        if is_explored:
             action_chosen = int(np.random.choice(legal_action_idxs))
-            action_chosen_tensor = torch.tensor(data=action_chosen, dtype=torch.long, device=logits.device)
-            log_prob = torch.log(torch.tensor(data=(1.0 / len(legal_action_idxs)), dtype=torch.float32, device=logits.device)).unsqueeze(0)
+            log_prob = torch.log(torch.tensor(data=(1.0 / len(legal_action_idxs)), dtype=torch.float32, device=legal_logits.device)).unsqueeze(0)
         else:
             sampled_tensor = dist.sample()
-            action_chosen_tensor = sampled_tensor
-            log_prob = dist.log_prob(action_chosen_tensor)
+            action_chosen = int(legal_action_idxs[sampled_tensor.item()])
+            log_prob = dist.log_prob(sampled_tensor).unsqueeze(0)
+
+        if self.replay_store is not None:
+            position = ReplayStore.encode_position(board=env.board, action=action_chosen)
+
+        if self.recompute_log_probs:
+            log_prob = PolicyStep(observation=observation.astype(np.uint8), legal_action_idxs=legal_action_idxs,
+                                  action=action_chosen, explored=is_explored)
+
+        curr_turn = env.board.turn
+        observation, (white_reward, black_reward), done, info = env.step(action_chosen)
+        self.count_result(winner=info.get('winner'))
+
+        if self.replay_store is not None:
+            position['reward'] = white_reward if curr_turn == chess.WHITE else black_reward
+            self.episode_positions.append(position)
+
+        return observation, white_reward, black_reward, done, info, log_prob
+
+
+    def make_batched_step(self, model, observations: np.ndarray, legal_masks: np.ndarray, device):
+        # one forward pass for every running game: (num_envs, channels, height, width)
+        observations_tensor = torch.from_numpy(observations).to(device=device)
+        legal_actions = RaggedActions.from_masks(legal_masks=torch.from_numpy(legal_masks).to(device=device))
+
+        with torch.set_grad_enabled(not self.recompute_log_probs):
+            legal_logits = model.forward_legal(observations_tensor, legal_actions)
+
+        # (num_envs, max legal moves num), the padding gets -inf
+        dist = Categorical(logits=legal_actions.to_padded(values=legal_logits))
+        cols = dist.sample()
+        log_probs = dist.log_prob(cols)
 
-        observation, (white_reward, black_reward), done, info = env.step(action_chosen_tensor.item())
-        winner = info.get('winner')
+        explored = np.random.rand(len(observations)) < EPSILON
+        explore = torch.from_numpy(explored).to(device=device)
 
+        if explore.any():
+            # uniform random legal move, its log_prob = log(1 / legal_moves_num) like in make_step
+            legal_moves_num = legal_actions.lengths
+            random_cols = (torch.rand(len(legal_moves_num), device=device) * legal_moves_num).long()
+            random_cols = torch.minimum(random_cols, legal_moves_num - 1)
+
+            cols = torch.where(explore, random_cols, cols)
+            log_probs = torch.where(explore, -torch.log(legal_moves_num.float()), log_probs)
+
+        padded_action_idxs = legal_actions.to_padded(values=legal_actions.action_idxs, fill_value=0)
+        actions = padded_action_idxs.gather(dim=1, index=cols.unsqueeze(1)).squeeze(1).cpu().numpy()
+
+        if self.recompute_log_probs:
+            log_probs = [
+                PolicyStep(observation=observations[i].astype(np.uint8), legal_action_idxs=np.flatnonzero(legal_masks[i]),
+                           action=int(actions[i]), explored=bool(explored[i]))
+                for i in range(len(observations))
+            ]
+
+        return actions, log_probs
+
+
+    def store_episode_positions(self, positions: List[np.ndarray], episode: int):
+        if self.replay_store is not None and positions:
+            self.replay_store.append_episode(positions=np.concatenate(positions), episode=episode)
+
+
+    def flush_replay_store(self):
+        if self.replay_store is not None:
+            self.replay_store.flush()
+
+
+    def count_result(self, winner):
         if winner == chess.WHITE:
             self.white_wins += 1
             self.save_game = True
@@ -173,14 +451,14 @@ class SelfPlay:
             self.draws += 1
             self.save_game = False
 
-        return observation, white_reward, black_reward, done, info, log_prob
-
 
     def reset_probs_and_rewards(self):
         self.all_white_log_probs = []
         self.all_black_log_probs = []
         self.all_white_rewards = []
         self.all_black_rewards = []
+        self.all_white_dones = []
+        self.all_black_dones = []
 
 
     def log_training_info(self, episode, eval_score_list, loss):
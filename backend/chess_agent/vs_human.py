@@ -1,34 +1,44 @@
 import chess
 import torch
+import itertools
+import torch.nn as nn
 from torch.distributions import Categorical
-from backend.chess_agent.models.cnn_fc.cnn_fc import CnnFc
 from backend.chess_env.chess_env import ChessEnv
-from backend.utils.utils import Utils
 from backend.utils.chess_env_utils import ChessEnvUtils
+from backend.utils.ragged_actions import RaggedActions
 
 
 class VsHuman:
 
     @staticmethod
-    def make_move(model: CnnFc, fen: str):
+    def make_move(model: nn.Module, fen: str):
         board = chess.Board(fen)
-        observation = ChessEnv.get_observation(board)
 
-        observation_tensor = torch.tensor(data=observation, dtype=torch.float32).permute(2, 0, 1).unsqueeze(0).to(device=Utils.get_device())
+        # observation_tensor = (batch_size = 1, channels, height, width)
+        observation_tensor = torch.empty((1, 12, 8, 8), dtype=torch.float32)
+        ChessEnv.get_observation(board=board, out=observation_tensor[0])
+        observation_tensor = observation_tensor.to(device=VsHuman.get_model_device(model=model))
 
-        logits = model(observation_tensor)
         legal_action_idxs = ChessEnvUtils.get_legal_action_idxs(board)
+        legal_actions = RaggedActions.from_lists([legal_action_idxs], device=observation_tensor.device)
 
-        mask = torch.full_like(input=logits, fill_value=float('-inf'))
-        mask[0, legal_action_idxs] = 0.0
-        masked_logits = mask + logits
+        with torch.inference_mode():
+            legal_logits = legal_actions.get_legal_logits(model=model, x=observation_tensor).float()
 
-        probs = torch.softmax(input=masked_logits, dim=1)
+        probs = torch.softmax(input=legal_logits, dim=0)
 
-        dist = Categorical(probs)  # discrete distribution
-        action_chosen = dist.sample()
+        dist = Categorical(probs)  # discrete distribution over the legal moves
+        action_chosen = int(legal_action_idxs[dist.sample().item()])
 
         move = ChessEnv.decode_action(board=board, action_no=action_chosen)
         board.push(move)
 
-        return move.uci()
\ No newline at end of file
+        return move.uci()
+
+
+    @staticmethod
+    def get_model_device(model: nn.Module) -> torch.device:
+        # exported variants (int8, onnx) run on the cpu whatever Utils.get_device says
+        tensor = next(itertools.chain(model.parameters(), model.buffers()), None)
+
+        return tensor.device if tensor is not None else torch.device("cpu")
@@ -0,0 +1,85 @@
+import chess
+import numpy as np
+from typing import List, Tuple, Dict, Any, Optional
+from backend.chess_env.chess_env import ChessEnv
+from backend.chess_env.observation_encoder import ObservationEncoder
+from backend.configs.game_config import GameConfig
+from backend.utils.chess_env_utils import ChessEnvUtils
+
+
+class BatchedChessEnv:
+
+    def __init__(self, num_envs: int):
+        if num_envs < 1:
+            raise ValueError(f"num_envs ({num_envs}) has to be >= 1")
+
+        self.num_envs = num_envs
+        self.envs = [ChessEnv() for _ in range(num_envs)]
+
+        # buffers are reused between steps, copy them if they have to outlive the next step
+        self.observations = np.zeros((num_envs, 12, 8, 8), dtype=np.float32)  # (N, channels, height, width)
+        self.legal_masks = np.zeros((num_envs, GameConfig.ACTION_SPACE), dtype=np.bool_)
+
+
+    @property
+    def boards(self) -> List[chess.Board]:
+        return [env.board for env in self.envs]
+
+
+    def get_turns(self) -> np.ndarray:
+        return np.array([env.board.turn for env in self.envs], dtype=np.bool_)
+
+
+    def step(self, actions, active: Optional[np.ndarray] = None, auto_reset: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        # active = (N,) bool, the other envs are not stepped (their actions are ignored)
+        # auto_reset=False keeps a finished game on its board until reset_env is called
+        rewards = np.zeros((self.num_envs, 2), dtype=np.float32)  # [:, 0] = white, [:, 1] = black
+        dones = np.zeros(self.num_envs, dtype=np.bool_)
+        infos = []
+
+        for i, env in enumerate(self.envs):
+            if active is not None and not active[i]:
+                infos.append({})
+                continue
+
+            _, (white_reward, black_reward), done, info = env.step(int(actions[i]))
+
+            rewards[i, 0] = white_reward
+            rewards[i, 1] = black_reward
+            dones[i] = done
+
+            if done:
+                # the finished game is kept in info because the env can be reset straight away
+                info['env_idx'] = i
+                info['final_board'] = env.board.copy()
+                info['eval_score_list'] = env.eval_score_list
+
+                if auto_reset:
+                    env.reset()
+
+            self.update_legal_mask(env_idx=i)
+            infos.append(info)
+
+        ObservationEncoder.encode_batch(boards=self.boards, out=self.observations)
+
+        return self.observations, self.legal_masks, rewards, dones, infos
+
+
+    def reset(self, seed=None, options=None) -> Tuple[np.ndarray, np.ndarray]:
+        for i, env in enumerate(self.envs):
+            env.reset(seed=seed, options=options)
+            self.update_legal_mask(env_idx=i)
+
+        ObservationEncoder.encode_batch(boards=self.boards, out=self.observations)
+
+        return self.observations, self.legal_masks
+
+
+    def reset_env(self, env_idx: int) -> None:
+        self.envs[env_idx].reset()
+        self.update_legal_mask(env_idx=env_idx)
+        ObservationEncoder.encode(board=self.envs[env_idx].board, out=self.observations[env_idx])
+
+
+    def update_legal_mask(self, env_idx: int) -> None:
+        ChessEnvUtils.get_legal_mask(board=self.envs[env_idx].board, out=self.legal_masks[env_idx])
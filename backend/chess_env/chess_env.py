@@ -4,11 +4,15 @@ import chess.pgn
 import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
-from typing import Tuple, Union, Dict
+from typing import Tuple, Union, Dict, Optional
+from backend.chess_env.game_archive import GameArchive
+from backend.chess_env.observation_encoder import ObservationEncoder
 from backend.evals.custom_eval import CustomEval
 from backend.configs.path_config import PathConfig
 from backend.configs.game_config import GameConfig
+from backend.utils.action_table import ActionTable
 from backend.utils.chess_env_utils import ChessEnvUtils
+from backend.utils.legal_move_cache import LegalMoveCache
 
 
 class ChessEnv(gym.Env):
@@ -21,7 +25,7 @@ class ChessEnv(gym.Env):
         self.black_elo = GameConfig.AGENT_DEFAULT_BLACK_ELO
 
         self.action_space = spaces.Discrete(GameConfig.ACTION_SPACE)  # all possible moves for each piece
-        self.observation_space = spaces.Box(0, 1, shape=(8, 8, 12), dtype=np.float32)  # 12 = all white pieces [0:6] and black pieces [6:12]
+        self.observation_space = spaces.Box(0, 1, shape=(12, 8, 8), dtype=np.float32)  # 12 = all white pieces [0:6] and black pieces [6:12]
 
         self.eval = CustomEval(board=self.board)
         self.eval_score_list = []
@@ -35,7 +39,7 @@ class ChessEnv(gym.Env):
         self.eval.board = self.board
         capture_reward_or_penalty = self.eval.evaluate_capture_decision(move_played=move) / GameConfig.CUSTOM_EVAL_SCALING_FACTOR
 
-        self.board.push(move)
+        self.eval.push(move)
 
         observation = self.get_observation(board=self.board)
         white_reward, black_reward, done, winner = self.get_reward()
@@ -53,7 +57,7 @@ class ChessEnv(gym.Env):
 
 
     def get_reward(self) -> Tuple[float, float, bool, Union[int, None]]:
-        if self.board.is_checkmate():
+        if LegalMoveCache.is_checkmate(board=self.board):
             winner = not self.board.turn
 
             if winner == chess.WHITE:
@@ -85,42 +89,19 @@ class ChessEnv(gym.Env):
 
 
     @staticmethod
-    def get_observation(board) -> np.ndarray:
-        observation = np.zeros((8, 8, 12), dtype=np.float32)
-
-        piece_map = {
-            chess.PAWN: 0,
-            chess.KNIGHT: 1,
-            chess.BISHOP: 2,
-            chess.ROOK: 3,
-            chess.QUEEN: 4,
-            chess.KING: 5,
-        }
-
-        for square, piece in board.piece_map().items():
-            row, col = divmod(square, 8)  # getting the coordinate from the square number e.g.: we have square no. 10 so we have  10 // 8 and 10 % 8  = (1, 2) =  B3
-            piece_type = piece_map[piece.piece_type]
-
-            if piece.color == chess.WHITE:
-                observation[row, col, piece_type] = 1
-            else:
-                observation[row, col, piece_type + 6] = 1
-
-        return observation
+    def get_observation(board: chess.Board, out: Optional[np.ndarray] = None) -> np.ndarray:
+        # (channels, height, width), square no. 10 = row 1, col 2 = C2
+        return ObservationEncoder.encode(board=board, out=out)
 
 
     @staticmethod
     def decode_action(board: chess.Board, action_no: int) -> Union[chess.Move, None]:
         # Decode the number of action to legal chess move_str e.g. e4, because AI choose only the number of action
-        for move in board.legal_moves:
-            if ChessEnvUtils.get_move_idx(move=move) == action_no:
-                return move
-
-        return None
+        return ActionTable.decode_action(board=board, action_no=action_no, legal_moves=LegalMoveCache.get(board=board).move_set)
 
 
     def is_draw(self) -> bool:
-        return (self.board.is_stalemate() or self.board.is_insufficient_material()
+        return (LegalMoveCache.is_stalemate(board=self.board) or self.board.is_insufficient_material()
                 or self.board.can_claim_threefold_repetition() or self.board.is_fivefold_repetition()
                 or len(self.board.move_stack) > GameConfig.MAX_MOVES_PER_EPISODE)
 
@@ -128,21 +109,34 @@ class ChessEnv(gym.Env):
     def reset(self, seed=None, options=None) -> np.ndarray:
         self.board.reset()
         self.eval.reset_castling_rewards()
+        self.eval.sync()
         self.eval_score_list = []
 
         return self.get_observation(board=self.board)  # we should also return info dict but for now its empty :D
 
 
-    def save_game_pgn(self, episode: int, event_name="self-play", mode_name="self-play-train") -> None:
-        game = chess.pgn.Game.from_board(board=self.board)
+    def save_game_pgn(self, episode: int, event_name="self-play", mode_name="self-play-train", board: Optional[chess.Board] = None,
+                      to_archive: bool = GameConfig.ARCHIVE_GAMES) -> None:
+        board = board if board is not None else self.board
+
+        game = chess.pgn.Game.from_board(board=board)
         game.headers["event"] = event_name
         game.headers["white_elo"] = str(self.white_elo)
         game.headers["black_elo"] = str(self.black_elo)
-        game.headers["result"] = self.board.result()
+        game.headers["result"] = board.result()
 
         pgn_str = str(game)
 
-        file_name = f"{mode_name}-episode{episode}-w_elo{int(self.white_elo)}-b_elo{int(self.black_elo)}.pgn"
+        if to_archive:
+            file_name = GameArchive.open(path=PathConfig.GAME_ARCHIVE_PATH_BASE).append_game(
+                pgn_str=pgn_str, episode=episode, mode=mode_name, white_elo=int(self.white_elo), black_elo=int(self.black_elo),
+                result=board.result(), moves_num=len(board.move_stack),
+            )
+
+            print(f"Game was archived as: {file_name}")
+            return
+
+        file_name = GameArchive.get_file_name(mode=mode_name, episode=episode, white_elo=int(self.white_elo), black_elo=int(self.black_elo))
         file_path = os.path.join(PathConfig.SAVED_GAMES_PATH_BASE, file_name)
 
         with open(file_path, "w", encoding="utf-8") as f:
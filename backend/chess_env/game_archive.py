@@ -0,0 +1,304 @@
+import os
+import re
+import glob
+import gzip
+import time
+import fcntl
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from backend.configs.game_config import GameConfig
+from backend.configs.path_config import PathConfig
+
+
+RESULTS = ("*", "1-0", "0-1", "1/2-1/2")
+
+# one record per archived game, every segment has its own append-only index file
+ARCHIVE_RECORD_DTYPE = np.dtype([
+    ('episode', '<u8'),
+    ('offset', '<u8'),  # byte offset of the game in the segment file
+    ('length', '<u4'),  # bytes of the game in the segment file (compressed size for .gz segments)
+    ('white_elo', '<i4'),
+    ('black_elo', '<i4'),
+    ('result', 'u1'),  # idx in RESULTS
+    ('moves_num', '<u2'),
+    ('saved_at', '<f8'),
+    ('mode', 'S32'),  # utf-8, a longer mode is rejected by append_game instead of truncated
+])
+
+
+class GameArchive:
+
+    # games appended to a few large segment files instead of one pgn file per game
+    # a gzip segment is a chain of gzip members, one per game, so a game is read back without decompressing the rest
+    # and the segment is still a valid .pgn.gz for zcat and other pgn tools
+    SEGMENT_PREFIX = "games-"
+    INDEX_SUFFIX = ".idx"
+    LOCK_FILE_NAME = ".lock"
+
+    # names of the games, the same for archived games and pgn files written by ChessEnv.save_game_pgn
+    FILE_NAME_PATTERN = re.compile(r"^(?P<mode>.+)-episode(?P<episode>\d+)-w_elo(?P<white_elo>-?\d+)-b_elo(?P<black_elo>-?\d+)\.pgn$")
+
+    _archives: Dict[Tuple[str, bool], 'GameArchive'] = {}
+    _archives_lock = threading.Lock()
+
+
+    def __init__(self, path: str, segment_bytes: int = GameConfig.ARCHIVE_SEGMENT_BYTES, compress: bool = GameConfig.ARCHIVE_COMPRESS,
+                 read_only: bool = False):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.compress = compress
+        self.read_only = read_only
+
+        self.segment_paths: List[str] = []
+        self.index_sizes: List[int] = []  # bytes of every index file loaded so far
+        self.records_buffer = np.empty(1024, dtype=ARCHIVE_RECORD_DTYPE)  # grows by doubling, records is a view of its filled part
+        self.record_segments_buffer = np.empty(1024, dtype=np.int32)
+        self.records = self.records_buffer[:0]
+        self.record_segments = self.record_segments_buffer[:0]
+        self.file_names: Dict[str, int] = {}  # file name -> record idx, the last game saved under a name wins
+        self.episodes: Dict[int, List[int]] = {}  # episode -> record idxs, several runs (modes) can save the same episode
+
+        self._lock = threading.Lock()
+
+        if not os.path.isdir(path):
+            if read_only:
+                raise FileNotFoundError(f"Game archive not found: {path}")
+
+            os.makedirs(path, exist_ok=True)
+
+        # a writer (ChessEnv.save_game_pgn) only appends, it doesn't keep the records of millions of games in memory
+        if read_only:
+            self.refresh()
+        else:
+            self.refresh_segments()
+
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+    @classmethod
+    def open(cls, path: Optional[str] = None, read_only: bool = False) -> Optional['GameArchive']:
+        # one instance per process and archive, None when no archive is configured or a read only one doesn't exist yet
+        path = path if path is not None else PathConfig.GAME_ARCHIVE_PATH_BASE
+
+        if not path or (read_only and not os.path.isdir(path)):
+            return None
+
+        with cls._archives_lock:
+            if (path, read_only) not in cls._archives:
+                cls._archives[(path, read_only)] = GameArchive(path=path, read_only=read_only)
+
+            return cls._archives[(path, read_only)]
+
+
+    def append_game(self, pgn_str: str, episode: int, mode: str, white_elo: int, black_elo: int, result: str, moves_num: int) -> str:
+        if self.read_only:
+            raise PermissionError("Game archive was opened read only")
+
+        # a truncated mode would give the record another file name, or cut a utf-8 character in half
+        encoded_mode = mode.encode("utf-8")
+
+        if len(encoded_mode) > ARCHIVE_RECORD_DTYPE['mode'].itemsize:
+            raise ValueError(f"Mode '{mode}' is longer than {ARCHIVE_RECORD_DTYPE['mode'].itemsize} bytes, it can't be archived")
+
+        data = f"{pgn_str}\n\n".encode("utf-8")
+
+        with self.file_lock():
+            self.refresh_segments()  # other processes may have started a segment since
+
+            segment_idx = len(self.segment_paths) - 1
+
+            if segment_idx < 0 or os.path.getsize(self.segment_paths[segment_idx]) >= self.segment_bytes:
+                segment_idx += 1
+                self.create_segment(segment_idx=segment_idx)
+
+            segment_path = self.segment_paths[segment_idx]
+
+            if segment_path.endswith(".gz"):
+                data = gzip.compress(data, mtime=0)
+
+            with open(segment_path, "ab") as f:
+                offset = f.tell()
+                f.write(data)
+
+            record = np.zeros(1, dtype=ARCHIVE_RECORD_DTYPE)
+            record['episode'] = episode
+            record['offset'] = offset
+            record['length'] = len(data)
+            record['white_elo'] = white_elo
+            record['black_elo'] = black_elo
+            record['result'] = RESULTS.index(result) if result in RESULTS else 0
+            record['moves_num'] = min(moves_num, np.iinfo(np.uint16).max)
+            record['saved_at'] = time.time()
+            record['mode'] = encoded_mode
+
+            # the record is written after the game, so the index never points past the data
+            with open(self.get_index_path(segment_idx=segment_idx), "ab") as f:
+                f.write(record.tobytes())
+
+        return GameArchive.get_file_name(mode=mode, episode=episode, white_elo=white_elo, black_elo=black_elo)
+
+
+    def refresh_segments(self) -> List[str]:
+        index_paths = sorted(glob.glob(os.path.join(glob.escape(self.path), f"{GameArchive.SEGMENT_PREFIX}*{GameArchive.INDEX_SUFFIX}")))
+
+        for index_path in index_paths[len(self.segment_paths):]:
+            self.segment_paths.append(self.get_segment_path(index_path=index_path))
+            self.index_sizes.append(0)
+
+        return index_paths
+
+
+    def refresh(self) -> int:
+        # loads only the records appended since the last refresh, a torn record at the end of an index waits for the next one
+        new_records, new_segments = [], []
+
+        with self._lock:
+            index_paths = self.refresh_segments()
+
+            for segment_idx, index_path in enumerate(index_paths):
+                loaded_bytes = self.index_sizes[segment_idx]
+                records_num = (os.path.getsize(index_path) - loaded_bytes) // ARCHIVE_RECORD_DTYPE.itemsize
+
+                if records_num <= 0:
+                    continue
+
+                records = np.fromfile(index_path, dtype=ARCHIVE_RECORD_DTYPE, count=records_num, offset=loaded_bytes)
+
+                new_records.append(records)
+                new_segments.append(np.full(len(records), segment_idx, dtype=np.int32))
+                self.index_sizes[segment_idx] += len(records) * ARCHIVE_RECORD_DTYPE.itemsize
+
+            if not new_records:
+                return 0
+
+            first_idx = len(self.records)
+            self.add_records(records=np.concatenate(new_records), record_segments=np.concatenate(new_segments))
+
+            for record_idx in range(first_idx, len(self.records)):
+                self.file_names[self.get_record_file_name(record_idx=record_idx)] = record_idx
+                self.episodes.setdefault(int(self.records[record_idx]['episode']), []).append(record_idx)
+
+            return len(self.records) - first_idx
+
+
+    def add_records(self, records: np.ndarray, record_segments: np.ndarray) -> None:
+        size = len(self.records)
+        new_size = size + len(records)
+
+        if new_size > len(self.records_buffer):
+            capacity = max(new_size, 2 * len(self.records_buffer))
+            self.records_buffer = np.concatenate([self.records, np.empty(capacity - size, dtype=ARCHIVE_RECORD_DTYPE)])
+            self.record_segments_buffer = np.concatenate([self.record_segments, np.empty(capacity - size, dtype=np.int32)])
+
+        self.records_buffer[size:new_size] = records
+        self.record_segments_buffer[size:new_size] = record_segments
+
+        self.records = self.records_buffer[:new_size]
+        self.record_segments = self.record_segments_buffer[:new_size]
+
+
+    def find(self, file_name: str) -> Optional[int]:
+        record_idx = self.file_names.get(file_name)
+
+        if record_idx is None and self.refresh() > 0:
+            record_idx = self.file_names.get(file_name)
+
+        return record_idx
+
+
+    def find_episode(self, episode: int, mode: Optional[str] = None) -> List[int]:
+        # record idxs of the games of an episode in archive order, only the ones saved in the given mode when it's set
+        if episode not in self.episodes:
+            self.refresh()
+
+        record_idxs = self.episodes.get(episode, [])
+
+        if mode is not None:
+            record_idxs = [record_idx for record_idx in record_idxs if self.records[record_idx]['mode'].decode("utf-8") == mode]
+
+        return list(record_idxs)
+
+
+    def read_game(self, record_idx: int) -> str:
+        record = self.records[record_idx]
+        segment_path = self.segment_paths[self.record_segments[record_idx]]
+
+        with open(segment_path, "rb") as f:
+            f.seek(int(record['offset']))
+            data = f.read(int(record['length']))
+
+        if segment_path.endswith(".gz"):
+            data = gzip.decompress(data)
+
+        return data.decode("utf-8").strip()
+
+
+    def get_location(self, record_idx: int) -> Tuple[str, int]:
+        return self.segment_paths[self.record_segments[record_idx]], int(self.records[record_idx]['offset'])
+
+
+    def get_record_file_name(self, record_idx: int) -> str:
+        record = self.records[record_idx]
+
+        return GameArchive.get_file_name(mode=record['mode'].decode("utf-8"), episode=int(record['episode']),
+                                         white_elo=int(record['white_elo']), black_elo=int(record['black_elo']))
+
+
+    def export(self, record_idxs: List[int], out_path: str) -> List[str]:
+        # back to one pgn file per game, named like ChessEnv.save_game_pgn names them
+        os.makedirs(out_path, exist_ok=True)
+        file_paths = []
+
+        for record_idx in record_idxs:
+            file_path = os.path.join(out_path, self.get_record_file_name(record_idx=record_idx))
+
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(self.read_game(record_idx=record_idx))
+
+            file_paths.append(file_path)
+
+        return file_paths
+
+
+    def create_segment(self, segment_idx: int) -> None:
+        extension = ".pgn.gz" if self.compress else ".pgn"
+        segment_path = os.path.join(self.path, f"{GameArchive.SEGMENT_PREFIX}{segment_idx:05d}{extension}")
+
+        open(segment_path, "ab").close()
+        open(self.get_index_path(segment_idx=segment_idx), "ab").close()
+
+        self.refresh_segments()
+
+
+    def get_index_path(self, segment_idx: int) -> str:
+        return os.path.join(self.path, f"{GameArchive.SEGMENT_PREFIX}{segment_idx:05d}{GameArchive.INDEX_SUFFIX}")
+
+
+    @staticmethod
+    def get_segment_path(index_path: str) -> str:
+        # a segment keeps the compression it was created with
+        base_path = index_path[:-len(GameArchive.INDEX_SUFFIX)]
+
+        return f"{base_path}.pgn.gz" if os.path.isfile(f"{base_path}.pgn.gz") else f"{base_path}.pgn"
+
+
+    @staticmethod
+    def get_file_name(mode: str, episode: int, white_elo: int, black_elo: int) -> str:
+        return f"{mode}-episode{episode}-w_elo{white_elo}-b_elo{black_elo}.pgn"
+
+
+    @contextmanager
+    def file_lock(self):
+        # writers of different processes (e.g. several self-play runs) append to the same archive one at a time
+        with open(os.path.join(self.path, GameArchive.LOCK_FILE_NAME), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
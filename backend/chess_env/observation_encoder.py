@@ -0,0 +1,79 @@
+import chess
+import torch
+import numpy as np
+from typing import List, Union
+
+
+class ObservationEncoder:
+
+    PLANES_NUM: int = 12  # all white pieces [0:6] and black pieces [6:12]
+
+    # _BIT_TABLE[byte] = bits of the byte (lsb first), so one byte of a bitboard becomes one rank (8 squares) of a plane
+    _BIT_TABLE: np.ndarray = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1, bitorder='little').astype(np.float32)
+
+
+    @staticmethod
+    def encode(board: chess.Board, out: Union[np.ndarray, torch.Tensor, None] = None) -> Union[np.ndarray, torch.Tensor]:
+        if out is None:
+            out = np.empty((ObservationEncoder.PLANES_NUM, 8, 8), dtype=np.float32)
+
+        bitboards = np.empty((1, ObservationEncoder.PLANES_NUM), dtype='<u8')
+        ObservationEncoder.fill_bitboards(board=board, bitboards=bitboards[0])
+
+        ObservationEncoder.unpack_bitboards(bitboards=bitboards, out=out)
+
+        return out
+
+
+    @staticmethod
+    def encode_batch(boards: List[chess.Board], out: Union[np.ndarray, torch.Tensor, None] = None) -> Union[np.ndarray, torch.Tensor]:
+        if out is None:
+            out = np.empty((len(boards), ObservationEncoder.PLANES_NUM, 8, 8), dtype=np.float32)
+
+        bitboards = np.empty((len(boards), ObservationEncoder.PLANES_NUM), dtype='<u8')
+
+        for i, board in enumerate(boards):
+            ObservationEncoder.fill_bitboards(board=board, bitboards=bitboards[i])
+
+        ObservationEncoder.unpack_bitboards(bitboards=bitboards, out=out)
+
+        return out
+
+
+    @staticmethod
+    def fill_bitboards(board: chess.Board, bitboards: np.ndarray) -> None:
+        # same plane order as the piece types: pawn, knight, bishop, rook, queen, king
+        piece_masks = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+
+        for color_offset, color_mask in ((0, board.occupied_co[chess.WHITE]), (6, board.occupied_co[chess.BLACK])):
+            for piece_idx, piece_mask in enumerate(piece_masks):
+                bitboards[color_offset + piece_idx] = piece_mask & color_mask
+
+
+    @staticmethod
+    def unpack_bitboards(bitboards: np.ndarray, out: Union[np.ndarray, torch.Tensor]) -> None:
+        # bitboards = (batch_size, 12) little endian uint64, out = (batch_size, 12, 8, 8) or (12, 8, 8) float32
+        bitboard_bytes = bitboards.reshape(-1).view(np.uint8)
+
+        out_array = ObservationEncoder.get_writable_array(out=out)
+
+        if out_array is not None:
+            np.take(ObservationEncoder._BIT_TABLE, bitboard_bytes, axis=0, out=out_array.reshape(-1, 8))
+        else:
+            # e.g. a cuda tensor, encode on the cpu and copy it in one transfer
+            planes = np.take(ObservationEncoder._BIT_TABLE, bitboard_bytes, axis=0)
+            out.copy_(torch.from_numpy(planes).view(out.shape), non_blocking=True)
+
+
+    @staticmethod
+    def get_writable_array(out: Union[np.ndarray, torch.Tensor]) -> Union[np.ndarray, None]:
+        if isinstance(out, torch.Tensor):
+            if out.device.type != 'cpu' or out.dtype != torch.float32 or not out.is_contiguous() or out.requires_grad:
+                return None
+
+            out = out.numpy()  # shares memory with the tensor
+
+        if out.dtype != np.float32 or not out.flags.c_contiguous:
+            raise ValueError(f"out has to be a C-contiguous float32 buffer, got {out.dtype}")
+
+        return out
@@ -0,0 +1,35 @@
+import os
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+
+class ApiConfig:
+    MODEL_CACHE_MAX_BYTES: int = int(os.getenv("MODEL_CACHE_MAX_BYTES", 2 * 1024 ** 3))  # memory budget of the loaded models
+    MODEL_MMAP: bool = os.getenv("MODEL_MMAP", "false").lower() == "true"  # memory-map the weights instead of reading them into RAM
+    MODEL_LOADER_WORKERS: int = int(os.getenv("MODEL_LOADER_WORKERS", 2))  # threads loading checkpoints outside the event loop
+
+    # uvicorn workers of one host attach to the same weights in shared memory instead of loading a copy each
+    SHARED_WEIGHTS: bool = os.getenv("SHARED_WEIGHTS", "false").lower() == "true"
+    SHARED_WEIGHTS_DIR: str = os.getenv("SHARED_WEIGHTS_DIR", "/dev/shm/chess-rl")
+
+    # /play-vs-agent requests for the same model within the wait window share one forward pass
+    INFERENCE_MAX_BATCH_SIZE: int = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", 32))
+    INFERENCE_MAX_WAIT_MS: float = float(os.getenv("INFERENCE_MAX_WAIT_MS", 5.0))
+
+    ANALYSIS_MAX_POSITIONS: int = int(os.getenv("ANALYSIS_MAX_POSITIONS", 5000))  # positions in one /analysis request
+    ANALYSIS_BATCH_SIZE: int = int(os.getenv("ANALYSIS_BATCH_SIZE", 256))  # positions per forward pass, results are streamed after each one
+
+    # sqlite index of SAVED_GAMES_PATH behind /file-list, by default a hidden file in that directory
+    GAMES_CATALOG_PATH: str = os.getenv("GAMES_CATALOG_PATH", "")
+    GAMES_CATALOG_RESCAN_INTERVAL_S: float = float(os.getenv("GAMES_CATALOG_RESCAN_INTERVAL_S", 60))  # catches files rewritten in place
+
+    PGN_CACHE_SIZE: int = int(os.getenv("PGN_CACHE_SIZE", 2048))  # parsed games behind /saved-game
+
+    POLICY_CACHE_SIZE: int = int(os.getenv("POLICY_CACHE_SIZE", 100_000))  # (model, position) move distributions, ~200 B each
+
+    # websocket game sessions
+    MAX_SESSIONS: int = int(os.getenv("MAX_SESSIONS", 5000))  # per process
+    SESSION_IDLE_TIMEOUT_S: float = float(os.getenv("SESSION_IDLE_TIMEOUT_S", 600))
+    SESSION_SWEEP_INTERVAL_S: float = float(os.getenv("SESSION_SWEEP_INTERVAL_S", 30))
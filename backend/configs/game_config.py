@@ -11,6 +11,15 @@ class GameConfig:
     CUSTOM_EVAL_SCALING_FACTOR: int = 50
     MAX_MOVES_PER_EPISODE: int = 250
 
+    LEGAL_MOVE_CACHE_SIZE: int = 4096  # positions, shared by every board in the process
+    EVAL_CACHE_SIZE: int = 200_000  # positions, shared by every CustomEval in the process
+    EXACT_MOBILITY: bool = False  # legal moves count instead of pseudo-legal one from the attack masks (much slower)
+
     AGENT_DEFAULT_WHITE_ELO: int = 700
     AGENT_DEFAULT_BLACK_ELO: int = 700
     K_FACTOR: int = 32
+
+    # decisive games are appended to the game archive (backend/chess_env/game_archive.py) instead of one pgn file each
+    ARCHIVE_GAMES: bool = False
+    ARCHIVE_COMPRESS: bool = True  # gzip segments, a game is compressed on its own
+    ARCHIVE_SEGMENT_BYTES: int = 256 * 1024 ** 2  # a new segment file is started after this size
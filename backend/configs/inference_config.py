@@ -0,0 +1,8 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class InferenceConfig:
+    MAX_BATCH_SIZE: int = 64  # observations in one forward pass
+    MAX_WAIT_MS: float = 2.0  # how long the first request of a batch waits for others
+    METRICS_WINDOW: int = 1000  # last n requests used for the latency percentiles
@@ -8,4 +8,6 @@ load_dotenv()
 class PathConfig:
     SAVED_MODELS_PATH_BASE: str = os.getenv("SAVED_MODELS_PATH")
     SAVED_GAMES_PATH_BASE: str = os.getenv("SAVED_GAMES_PATH")
-    SAVED_GRAPHS_PATH_BASE: str = os.getenv("SAVED_GRAPHS_PATH")
\ No newline at end of file
+    SAVED_GRAPHS_PATH_BASE: str = os.getenv("SAVED_GRAPHS_PATH")
+    REPLAY_STORE_PATH_BASE: str = os.getenv("REPLAY_STORE_PATH")
+    GAME_ARCHIVE_PATH_BASE: str = os.getenv("GAME_ARCHIVE_PATH")
\ No newline at end of file
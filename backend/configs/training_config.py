@@ -13,4 +13,23 @@ class TrainingConfig:
                          # If gamma = 0.99: the model will focus on the future rewards
     EPSILON: float = 0.2  # Exploration rate defining how often model makes random moves to explore chess board
 
-    UPDATE_FREQUENCY: int = 2  # after n episodes model will be updated
\ No newline at end of file
+    UPDATE_FREQUENCY: int = 2  # after n episodes model will be updated
+
+    NUM_ENVS: int = 16  # games played at once with one batched forward pass (SelfPlay.train_batched), 1 = one game at a time
+
+    # collect observations without autograd graphs and recompute log_probs in batched forward passes at update time
+    # opt-in, by default the log_probs keep the graphs built while playing like before (the actor/learner always recomputes)
+    RECOMPUTE_LOG_PROBS: bool = False
+    LOG_PROB_MINIBATCH_SIZE: int = 256  # positions per forward/backward pass, bounds peak memory of the update
+
+    # actor/learner self-play (backend/chess_agent/actor_learner.py)
+    ACTOR_LEARNER: bool = False  # backend/main.py trains with NUM_WORKERS actor processes instead of SelfPlay
+    NUM_WORKERS: int = 8  # actor processes collecting episodes
+    WEIGHT_SYNC_INTERVAL: int = 1  # episodes collected by an actor between weight syncs
+    MAX_STALENESS: int = 2  # trajectories played by weights older than n updates are dropped, the newer ones are importance weighted
+    IMPORTANCE_RATIO_CLIP: float = 1.0  # upper bound of pi_current / pi_behavior for moves of older weights
+    TRAJECTORY_QUEUE_SIZE: int = 64
+    ACTOR_INFERENCE_PROCESS: bool = True  # actors share one batched forward pass (backend/chess_agent/inference_server.py) on the learner device
+
+    # replay store (backend/chess_agent/replay_store.py)
+    REPLAY_SEGMENT_SIZE: int = 1_000_000  # positions per memory-mapped segment file (~110 MB)
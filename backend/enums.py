@@ -2,4 +2,5 @@ from enum import Enum
 
 
 class ModelType(Enum):
-    CNN_FC = "CnnFc"
\ No newline at end of file
+    CNN_FC = "CnnFc"
+    RES_CONV = "ResConv"
\ No newline at end of file
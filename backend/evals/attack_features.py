@@ -0,0 +1,66 @@
+import chess
+from backend.utils.legal_move_cache import LegalMoveCache
+
+
+class AttackFeatures:
+
+    CENTER_SQUARES = [chess.D4, chess.D5, chess.E4, chess.E5]
+    BB_LAST_RANKS = chess.BB_RANK_1 | chess.BB_RANK_8
+
+
+    @staticmethod
+    def get_mobility(board: chess.Board, color: chess.Color) -> int:
+        # pseudo-legal moves num from attack masks (pins, checks and castling are ignored)
+        own = board.occupied_co[color]
+        enemy = board.occupied_co[not color]
+        empty = ~board.occupied & chess.BB_ALL
+
+        mobility = 0
+
+        for square in chess.scan_forward(own & ~board.pawns):
+            mobility += chess.popcount(board.attacks_mask(square) & ~own)
+
+        pawns = board.pawns & own
+
+        if color == chess.WHITE:
+            single_pushes = (pawns << 8) & empty
+            double_pushes = ((single_pushes & chess.BB_RANK_3) << 8) & empty
+        else:
+            single_pushes = (pawns >> 8) & empty
+            double_pushes = ((single_pushes & chess.BB_RANK_6) >> 8) & empty
+
+        capture_targets = enemy
+
+        if board.ep_square is not None and board.turn == color:
+            capture_targets |= chess.BB_SQUARES[board.ep_square]
+
+        captures = 0
+        promotion_captures = 0
+
+        for square in chess.scan_forward(pawns):
+            pawn_captures = chess.BB_PAWN_ATTACKS[color][square] & capture_targets
+
+            captures += chess.popcount(pawn_captures)
+            promotion_captures += chess.popcount(pawn_captures & AttackFeatures.BB_LAST_RANKS)
+
+        promotion_pushes = chess.popcount(single_pushes & AttackFeatures.BB_LAST_RANKS)
+
+        # each promotion counts as 4 moves (queen, rook, bishop, knight) like in the legal moves list
+        mobility += chess.popcount(single_pushes) + chess.popcount(double_pushes) + captures
+        mobility += 3 * (promotion_pushes + promotion_captures)
+
+        return mobility
+
+
+    @staticmethod
+    def get_exact_mobility(board: chess.Board, color: chess.Color) -> int:
+        # legal moves num as if color was to move, for parity checks with the pseudo-legal count
+        board_copy = board.copy(stack=False)
+        board_copy.turn = color
+
+        return len(LegalMoveCache.get_legal_moves(board=board_copy))
+
+
+    @staticmethod
+    def get_center_control(board: chess.Board, color: chess.Color) -> int:
+        return sum(chess.popcount(board.attackers_mask(color, square)) for square in AttackFeatures.CENTER_SQUARES)
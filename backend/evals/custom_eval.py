@@ -1,6 +1,14 @@
 import chess
-from typing import List, Dict, Set
+import chess.polyglot
+import threading
+import numpy as np
+from cachetools import LRUCache
+from typing import Dict, Tuple, Iterable
+from backend.chess_env.observation_encoder import ObservationEncoder
 from backend.configs.game_config import GameConfig
+from backend.evals.attack_features import AttackFeatures
+from backend.evals.static_exchange import StaticExchange
+from backend.utils.legal_move_cache import LegalMoveCache
 
 
 class CustomEval:
@@ -14,6 +22,22 @@ class CustomEval:
         chess.KING: 0
     }
 
+    FEATURE_NAMES: Tuple[str, ...] = ('material', 'threats', 'king_safety', 'mobility', 'center_control', 'pawn_structure')
+    WEIGHTS: np.ndarray = np.array([2.0, 1.0, 1.0, 0.75, 0.5, 0.5])
+
+    # piece value per observation plane (white planes [0:6] are positive, black planes [6:12] negative)
+    PLANE_VALUES: np.ndarray = np.array(list(map(piece_values.get, chess.PIECE_TYPES)) * 2) * np.repeat([1, -1], 6)
+    BB_FILES: np.ndarray = np.array(chess.BB_FILES, dtype=np.uint64)
+
+
+    # zobrist hash -> (threats, king shelter, mobility, center control), shared by every evaluator in the process
+    # and by the threads of the api executor (PositionAnalyzer), so every access goes through _cache_lock
+    _eval_cache: LRUCache[int, Tuple[float, float, float, float]] = LRUCache(maxsize=GameConfig.EVAL_CACHE_SIZE)
+    _cache_lock = threading.Lock()
+
+    cache_hits: int = 0
+    cache_misses: int = 0
+
 
     def __init__(self, board: chess.Board):
         self.board = board
@@ -21,98 +45,233 @@ class CustomEval:
         self.white_castling_reward_given = False
         self.black_castling_reward_given = False
 
+        # incremental terms, updated by push/pop
+        self.material = 0
+        self.pawn_files = {chess.WHITE: [0] * 8, chess.BLACK: [0] * 8}  # pawns num per file
+        self.incremental_history = []
+        self.synced_key = None
+
+        self.sync()
+
 
     def evaluate_board(self) -> float:
-        # weights
-        w1, w2, w3, w4, w5, w6 = 2.0, 1.0, 1, 0.75, 0.5, 0.5
-
-        evaluation = (
-            w1 * self.evaluate_material() +
-            w2 * self.evaluate_threats() +
-            w3 * self.evaluate_king_safety() +
-            w4 * self.evaluate_mobility() +
-            w5 * self.evaluate_center_control() +
-            w6 * self.evaluate_pawn_structure()
+        if self.synced_key != self.get_sync_key():
+            self.sync()  # the board was changed without push/pop
+
+        threats, king_shelter, mobility, center_control = self.evaluate_cached_terms()
+
+        features = (
+            self.material,
+            threats,
+            king_shelter + self.evaluate_castling(),
+            mobility,
+            center_control,
+            self.get_pawn_structure_from_files(),
         )
 
-        return evaluation
+        return float(np.dot(features, CustomEval.WEIGHTS))
 
 
-    def evaluate_material(self) -> float:
-        evaluation = 0
+    @classmethod
+    def evaluate_batch(cls, boards: Iterable[chess.Board]) -> np.ndarray:
+        # (N, 6) features, one column per FEATURE_NAMES term, equal to the per-board evaluate_* terms
+        # vectorised over the batch: material and pawn_structure (popcounts of the piece bitboards)
+        # per board in a python loop, through the shared zobrist cache: threats, king_safety, mobility and center_control
+        # king_safety has only the king shelter part, the castling bonus depends on rewards given during the game
+        boards = list(boards)
+        features = np.zeros((len(boards), len(cls.FEATURE_NAMES)), dtype=np.float64)
 
-        for square, piece in self.board.piece_map().items():
-            value = CustomEval.piece_values.get(piece.piece_type)
+        if not boards:
+            return features
 
-            evaluation += value if piece.color == chess.WHITE else -value
+        bitboards = np.empty((len(boards), ObservationEncoder.PLANES_NUM), dtype=np.uint64)
 
-        return evaluation
+        for i, board in enumerate(boards):
+            ObservationEncoder.fill_bitboards(board=board, bitboards=bitboards[i])
 
+        # pieces num per plane -> material
+        features[:, 0] = np.bitwise_count(bitboards) @ cls.PLANE_VALUES
 
-    def evaluate_threats(self) -> float:
-        def push_square_to_list(legal_moves_f: Set[chess.Move], from_sq_f: chess.Square, to_sq_f: chess.Square, list_f: List[chess.Square]) -> List[chess.Square]:
-            move_f = chess.Move(from_square=from_sq_f, to_square=to_sq_f)
+        # pawns num per file (N, 2 colors, 8 files) -> pawn structure
+        pawn_files = np.bitwise_count(bitboards[:, [0, 6], None] & cls.BB_FILES).astype(np.int64)
+        weak_pawns = cls.count_weak_pawns_batch(pawn_files=pawn_files)
+        features[:, 5] = weak_pawns[:, 1] - weak_pawns[:, 0]
 
-            if move_f in legal_moves_f:
-                board_copy_f = self.board.copy()
-                board_copy_f.push(move_f)
+        evaluator = cls(board=boards[0])
 
-                if not board_copy_f.is_check():
-                    list_f.append(from_sq_f)
+        for i, board in enumerate(boards):
+            evaluator.board = board
+            features[i, 1:5] = evaluator.evaluate_cached_terms()
 
-            return list_f
+        return features
 
-        evaluation = 0
-        legal_moves = set(self.board.legal_moves)
 
-        for to_sq, piece in self.board.piece_map().items():
-            sign = 1 if self.board.piece_at(to_sq).color == chess.WHITE else -1
+    @classmethod
+    def score_batch(cls, features: np.ndarray) -> np.ndarray:
+        return features @ cls.WEIGHTS
+
+
+    @staticmethod
+    def count_weak_pawns_batch(pawn_files: np.ndarray) -> np.ndarray:
+        # pawn_files = (..., 8) pawns num per file, the same rules as in evaluate_pawn_structure
+        padded_files = np.pad(pawn_files, [(0, 0)] * (pawn_files.ndim - 1) + [(1, 1)])
+        has_neighbours = (padded_files[..., :-2] > 0) | (padded_files[..., 2:] > 0)
+
+        isolated_pawns = np.where(has_neighbours, 0, pawn_files)
+        doubled_pawns = np.where(pawn_files > 1, pawn_files * (pawn_files - 2), 0)
+
+        return (isolated_pawns + doubled_pawns).sum(axis=-1)
+
+
+    def evaluate_cached_terms(self) -> Tuple[float, float, float, float]:
+        key = chess.polyglot.zobrist_hash(self.board)
+
+        with CustomEval._cache_lock:
+            terms = CustomEval._eval_cache.get(key)
+
+            if terms is not None:
+                CustomEval.cache_hits += 1
+                return terms
+
+            CustomEval.cache_misses += 1
+
+        terms = (
+            self.evaluate_threats(),
+            self.evaluate_king_shelter(),
+            self.evaluate_mobility(exact=GameConfig.EXACT_MOBILITY),
+            self.evaluate_center_control(),
+        )
+
+        with CustomEval._cache_lock:
+            CustomEval._eval_cache[key] = terms
+
+        return terms
+
+
+    def push(self, move: chess.Move) -> None:
+        if self.synced_key != self.get_sync_key():
+            self.sync()
+
+        self.incremental_history.append((self.material, [self.pawn_files[chess.WHITE][:], self.pawn_files[chess.BLACK][:]]))
+
+        mover_color = self.board.turn
+        sign = 1 if mover_color == chess.WHITE else -1
+
+        if self.board.is_en_passant(move):
+            self.material += sign * CustomEval.piece_values[chess.PAWN]
+            self.pawn_files[not mover_color][chess.square_file(move.to_square)] -= 1
+        else:
+            captured_piece_type = self.board.piece_type_at(move.to_square)
+
+            if captured_piece_type is not None:
+                self.material += sign * CustomEval.piece_values[captured_piece_type]
+
+                if captured_piece_type == chess.PAWN:
+                    self.pawn_files[not mover_color][chess.square_file(move.to_square)] -= 1
+
+        if self.board.piece_type_at(move.from_square) == chess.PAWN:
+            self.pawn_files[mover_color][chess.square_file(move.from_square)] -= 1
+
+            if move.promotion:
+                self.material += sign * (CustomEval.piece_values[move.promotion] - CustomEval.piece_values[chess.PAWN])
+            else:
+                self.pawn_files[mover_color][chess.square_file(move.to_square)] += 1
+
+        self.board.push(move)
+        self.synced_key = self.get_sync_key()
+
+
+    def pop(self) -> chess.Move:
+        move = self.board.pop()
+
+        if self.incremental_history:
+            self.material, (white_pawn_files, black_pawn_files) = self.incremental_history.pop()
+            self.pawn_files = {chess.WHITE: white_pawn_files, chess.BLACK: black_pawn_files}
+            self.synced_key = self.get_sync_key()
+        else:
+            self.sync()
+
+        return move
 
-            attackers = []
-            for from_sq in self.board.attackers(not piece.color, to_sq):
-                attackers = push_square_to_list(legal_moves_f=legal_moves, from_sq_f=from_sq, to_sq_f=to_sq, list_f=attackers)
 
-            defenders = []
-            for from_sq in self.board.attackers(piece.color, to_sq):
-                defenders = push_square_to_list(legal_moves_f=legal_moves, from_sq_f=from_sq, to_sq_f=to_sq, list_f=attackers)
+    def sync(self) -> None:
+        self.material = self.evaluate_material()
 
+        for color in (chess.WHITE, chess.BLACK):
+            self.pawn_files[color] = [0] * 8
 
-            if not attackers:
-                continue
+            for square in self.board.pieces(chess.PAWN, color):
+                self.pawn_files[color][chess.square_file(square)] += 1
 
-            curr_piece_value = CustomEval.piece_values.get(piece.piece_type)
+        self.incremental_history = []
+        self.synced_key = self.get_sync_key()
 
-            if not defenders:
-                evaluation -= curr_piece_value * sign
-                continue
 
-            attackers_value_sum = self.get_pieces_value_sum_by_squares(squares=attackers)
-            defenders_value_sum = self.get_pieces_value_sum_by_squares(squares=defenders)
+    def get_sync_key(self) -> Tuple:
+        # material and pawn files depend on every piece, occupied alone misses e.g. a piece replaced by another one on the same square
+        return len(self.board.move_stack), self.board._transposition_key()
 
-            avg_attackers_value = attackers_value_sum / len(attackers)
 
-            if attackers_value_sum <= defenders_value_sum and len(attackers) > len(defenders) and avg_attackers_value < curr_piece_value:
-                potential_loss = curr_piece_value - avg_attackers_value
+    @classmethod
+    def configure_cache(cls, maxsize: int) -> None:
+        with cls._cache_lock:
+            cls._eval_cache = LRUCache(maxsize=maxsize)
+            cls.cache_hits = 0
+            cls.cache_misses = 0
 
-                if potential_loss > 0:
-                    evaluation -= potential_loss * sign
+
+    @classmethod
+    def get_cache_stats(cls) -> Dict[str, float]:
+        with cls._cache_lock:
+            requests = cls.cache_hits + cls.cache_misses
+
+            return {
+                'hits': cls.cache_hits,
+                'misses': cls.cache_misses,
+                'hit_rate': cls.cache_hits / requests if requests else 0.0,
+                'size': len(cls._eval_cache),
+                'maxsize': cls._eval_cache.maxsize,
+            }
+
+
+    def evaluate_material(self) -> float:
+        evaluation = 0
+
+        for square, piece in self.board.piece_map().items():
+            value = CustomEval.piece_values.get(piece.piece_type)
+
+            evaluation += value if piece.color == chess.WHITE else -value
 
         return evaluation
 
 
-    def evaluate_mobility(self) -> float:
-        board_copy = self.board.copy()
+    def evaluate_threats(self) -> float:
+        # only the side to move can capture now, so only the pieces of the other side are threatened
+        evaluation = 0
+        attacker_color = self.board.turn
+        sign = 1 if attacker_color == chess.BLACK else -1  # sign of the threatened pieces
+
+        for square in chess.scan_forward(self.board.occupied_co[not attacker_color] & ~self.board.kings):
+            potential_loss = StaticExchange.evaluate_square(board=self.board, square=square, attacker_color=attacker_color)
+
+            if potential_loss > 0:
+                evaluation -= potential_loss * sign
+
+        return evaluation
 
-        board_copy.turn = chess.WHITE
-        white_player_moves = len(list(board_copy.legal_moves))
 
-        board_copy.turn = chess.BLACK
-        black_player_moves = len(list(board_copy.legal_moves))
+    def evaluate_mobility(self, exact: bool = False) -> float:
+        if exact:
+            return AttackFeatures.get_exact_mobility(self.board, chess.WHITE) - AttackFeatures.get_exact_mobility(self.board, chess.BLACK)
 
-        return white_player_moves - black_player_moves
+        return AttackFeatures.get_mobility(self.board, chess.WHITE) - AttackFeatures.get_mobility(self.board, chess.BLACK)
 
 
     def evaluate_king_safety(self) -> float:
+        return self.evaluate_king_shelter() + self.evaluate_castling()
+
+
+    def evaluate_king_shelter(self) -> float:
         white_king = self.board.king(chess.WHITE)
         black_king = self.board.king(chess.BLACK)
 
@@ -126,6 +285,14 @@ class CustomEval:
             if self.board.piece_at(sq) is not None and self.board.piece_at(sq).color == chess.BLACK
         ) / 2
 
+        return white_king_safety - black_king_safety
+
+
+    def evaluate_castling(self) -> float:
+        # depends on the move history and on the rewards already given, so it is never cached
+        white_king_safety = 0
+        black_king_safety = 0
+
         if len(self.board.move_stack) >= 2:
             last_move = self.board.move_stack[-1]
 
@@ -149,16 +316,7 @@ class CustomEval:
 
 
     def evaluate_center_control(self) -> float:
-        center_squares = [chess.D4, chess.D5, chess.E4, chess.E5]
-
-        white_control = 0
-        black_control = 0
-
-        for sq in center_squares:
-            white_control += len(self.board.attackers(chess.WHITE, sq))
-            black_control += len(self.board.attackers(chess.BLACK, sq))
-
-        return white_control - black_control
+        return AttackFeatures.get_center_control(self.board, chess.WHITE) - AttackFeatures.get_center_control(self.board, chess.BLACK)
 
 
     def evaluate_pawn_structure(self) -> float:
@@ -197,36 +355,44 @@ class CustomEval:
         return black_weak_pawns - white_weak_pawns
 
 
-    def evaluate_capture_decision(self, move_played: chess.Move) -> float:
-        mover_piece = self.board.piece_at(move_played.from_square)
-        mover_color = mover_piece.color
+    def get_pawn_structure_from_files(self) -> float:
+        # same result as evaluate_pawn_structure, but from the incrementally updated pawns num per file
+        def count_weak_pawns(pawn_files):
+            weak_pawns = 0
 
-        reward_or_penalty = 0
-        good_captures_list = []
+            for file, pawns_num in enumerate(pawn_files):
+                if not pawns_num:
+                    continue
 
-        for move in self.board.legal_moves:
-            if self.board.is_capture(move):
-                piece_captured = self.board.piece_at(move.to_square)
-                piece_moving = self.board.piece_at(move.from_square)
+                has_left_neighbours = file > 0 and pawn_files[file - 1] > 0
+                has_right_neighbours = file < 7 and pawn_files[file + 1] > 0
 
-                if not piece_captured or not piece_moving or piece_captured.color == mover_color:
-                    continue
+                if not has_left_neighbours and not has_right_neighbours:
+                    weak_pawns += pawns_num
 
-                board_copy = self.board.copy()
-                board_copy.push(move)
+                if pawns_num > 1:
+                    weak_pawns += pawns_num * (pawns_num - 2)  # each doubled pawn adds (same_file_pawns - 1)
 
-                if board_copy.is_check():
-                    continue
+            return weak_pawns
+
+        return count_weak_pawns(self.pawn_files[chess.BLACK]) - count_weak_pawns(self.pawn_files[chess.WHITE])
+
+
+    def evaluate_capture_decision(self, move_played: chess.Move) -> float:
+        reward_or_penalty = 0
+        good_captures = {}
 
-                gain = CustomEval.piece_values.get(piece_captured.piece_type) - CustomEval.piece_values.get(piece_moving.piece_type)
+        for move in LegalMoveCache.get_legal_moves(board=self.board):
+            if self.board.is_capture(move):
+                gain = StaticExchange.evaluate_move(board=self.board, move=move)
 
                 if gain > 1:
-                    good_captures_list.append((move, gain))
+                    good_captures[move] = gain
 
-        if good_captures_list:
-            best_move, best_gain = max(good_captures_list, key=lambda x: x[1])
+        if good_captures:
+            best_gain = max(good_captures.values())
 
-            if move_played not in [m for m, _ in good_captures_list]:
+            if move_played not in good_captures:
                 reward_or_penalty -= best_gain
             else:
                 reward_or_penalty += best_gain
@@ -234,13 +400,6 @@ class CustomEval:
         return reward_or_penalty
 
 
-    def get_pieces_value_sum_by_squares(self, squares: List[chess.Square]) -> float:
-        return sum(
-            CustomEval.piece_values.get(self.board.piece_at(sq).piece_type)
-            for sq in squares if self.board.piece_at(sq)
-        )
-
-
     def reset_castling_rewards(self):
         self.white_castling_reward_given = False
         self.black_castling_reward_given = False
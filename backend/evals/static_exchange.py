@@ -0,0 +1,127 @@
+import chess
+from typing import Dict, List, Tuple, Optional
+
+
+class StaticExchange:
+
+    # the king can't be exchanged, its big value stops any sequence that would need to give it away
+    piece_values: Dict[int, int] = {
+        chess.PAWN: 1,
+        chess.KNIGHT: 3,
+        chess.BISHOP: 3,
+        chess.ROOK: 5,
+        chess.QUEEN: 9,
+        chess.KING: 1000
+    }
+
+
+    @staticmethod
+    def evaluate_move(board: chess.Board, move: chess.Move) -> float:
+        # material the side to move nets by playing the capture move and the best following exchanges on its to_square
+        mover_color = board.turn
+        mover_type = board.piece_type_at(move.from_square)
+        occupied = board.occupied ^ chess.BB_SQUARES[move.from_square]
+
+        if board.is_en_passant(move):
+            captured_value = StaticExchange.piece_values[chess.PAWN]
+            occupied ^= chess.BB_SQUARES[move.to_square - 8 if mover_color == chess.WHITE else move.to_square + 8]
+        else:
+            captured_type = board.piece_type_at(move.to_square)
+            captured_value = StaticExchange.piece_values[captured_type] if captured_type else 0
+
+        on_square_type = move.promotion or mover_type
+        gains = [captured_value + StaticExchange.piece_values[on_square_type] - StaticExchange.piece_values[mover_type]]
+
+        return StaticExchange.swap(board=board, square=move.to_square, side=not mover_color, occupied=occupied,
+                                   on_square_value=StaticExchange.piece_values[on_square_type], gains=gains)
+
+
+    @staticmethod
+    def evaluate_square(board: chess.Board, square: chess.Square, attacker_color: chess.Color) -> float:
+        # material attacker_color can win by starting an exchange on square (0 if it shouldn't start it at all)
+        target_type = board.piece_type_at(square)
+
+        if target_type is None:
+            return 0
+
+        attacker_square, attacker_type = StaticExchange.get_least_valuable_attacker(board=board, square=square, side=attacker_color, occupied=board.occupied)
+
+        if attacker_square is None or not StaticExchange.can_capture(board=board, square=square, side=attacker_color,
+                                                                      attacker_square=attacker_square, attacker_type=attacker_type, occupied=board.occupied):
+            return 0
+
+        gains = [StaticExchange.piece_values[target_type]]
+
+        gain = StaticExchange.swap(board=board, square=square, side=not attacker_color, occupied=board.occupied ^ chess.BB_SQUARES[attacker_square],
+                                   on_square_value=StaticExchange.piece_values[attacker_type], gains=gains)
+
+        return max(0, gain)
+
+
+    @staticmethod
+    def swap(board: chess.Board, square: chess.Square, side: chess.Color, occupied: int, on_square_value: float, gains: List[float]) -> float:
+        # gains[0] is the gain of the first capture, side is the one to recapture next
+        while True:
+            attacker_square, attacker_type = StaticExchange.get_least_valuable_attacker(board=board, square=square, side=side, occupied=occupied)
+
+            if attacker_square is None or not StaticExchange.can_capture(board=board, square=square, side=side,
+                                                                          attacker_square=attacker_square, attacker_type=attacker_type, occupied=occupied):
+                break
+
+            gains.append(on_square_value - gains[-1])
+
+            on_square_value = StaticExchange.piece_values[attacker_type]
+            occupied ^= chess.BB_SQUARES[attacker_square]  # removing the attacker uncovers x-ray attackers behind it
+            side = not side
+
+        # each side can stop the exchange whenever continuing loses material
+        for i in range(len(gains) - 1, 0, -1):
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+
+        return gains[0]
+
+
+    @staticmethod
+    def can_capture(board: chess.Board, square: chess.Square, side: chess.Color, attacker_square: chess.Square, attacker_type: int, occupied: int) -> bool:
+        if attacker_type != chess.KING:
+            return True
+
+        # the king can't recapture onto a square that is still attacked
+        occupied_after = occupied ^ chess.BB_SQUARES[attacker_square]
+
+        return not StaticExchange.get_attackers_mask(board=board, square=square, occupied=occupied_after) & board.occupied_co[not side] & occupied_after
+
+
+    @staticmethod
+    def get_least_valuable_attacker(board: chess.Board, square: chess.Square, side: chess.Color, occupied: int) -> Tuple[Optional[chess.Square], Optional[int]]:
+        attackers = StaticExchange.get_attackers_mask(board=board, square=square, occupied=occupied) & board.occupied_co[side] & occupied
+
+        if not attackers:
+            return None, None
+
+        for piece_type in chess.PIECE_TYPES:
+            piece_attackers = attackers & board.pieces_mask(piece_type, side)
+
+            if piece_attackers:
+                return chess.lsb(piece_attackers), piece_type
+
+        return None, None
+
+
+    @staticmethod
+    def get_attackers_mask(board: chess.Board, square: chess.Square, occupied: int) -> int:
+        # attackers of both colors with sliding attacks computed for the given occupancy (x-rays through removed pieces)
+        queens_and_rooks = board.queens | board.rooks
+        queens_and_bishops = board.queens | board.bishops
+
+        attackers = (
+            (chess.BB_KING_ATTACKS[square] & board.kings) |
+            (chess.BB_KNIGHT_ATTACKS[square] & board.knights) |
+            (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] & queens_and_rooks) |
+            (chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied] & queens_and_rooks) |
+            (chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied] & queens_and_bishops) |
+            (chess.BB_PAWN_ATTACKS[chess.WHITE][square] & board.pawns & board.occupied_co[chess.BLACK]) |
+            (chess.BB_PAWN_ATTACKS[chess.BLACK][square] & board.pawns & board.occupied_co[chess.WHITE])
+        )
+
+        return attackers & occupied
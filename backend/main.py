@@ -1,57 +1,72 @@
 from backend.chess_agent.agent_config import LEARNING_RATE
 from backend.chess_agent.models.policy import CnnPlusFc
+from backend.chess_agent.actor_learner import ActorLearner
+from backend.chess_agent.replay_store import ReplayStore
 from backend.chess_agent.self_play import SelfPlay
 from backend.chess_env.chess_env import ChessEnv
+from backend.chess_env.batched_chess_env import BatchedChessEnv
+from backend.configs.path_config import PathConfig
+from backend.configs.training_config import TrainingConfig
 from backend.config import SAVED_MODELS_PATH, ACTION_SPACE
 from backend.utils.utils import Utils
 
 
-device = Utils.get_device()
+# the actor processes are spawned, they import this module again and must not start a training of their own
+if __name__ == "__main__":
+    device = Utils.get_device()
 
 
-# SELF PLAY
-chess_env = ChessEnv()
+    # SELF PLAY
+    chess_env = ChessEnv()
 
-# chess_model = CnnFc(
-#     conv_layers_num=4,
-#     in_channels_list=[12, 64, 128, 256],
-#     out_channels_list=[64, 128, 256, 512],
-#     kernel_size_list=[3, 3, 3, 3],
-#     fc_layers_num=3,
-#     fc_in_features_list=[65536, 32768, 16384],
-#     fc_out_features_list=[32768, 16384, ACTION_SPACE],
-# ).to(device=device)
+    # chess_model = CnnFc(
+    #     conv_layers_num=4,
+    #     in_channels_list=[12, 64, 128, 256],
+    #     out_channels_list=[64, 128, 256, 512],
+    #     kernel_size_list=[3, 3, 3, 3],
+    #     fc_layers_num=3,
+    #     fc_in_features_list=[65536, 32768, 16384],
+    #     fc_out_features_list=[32768, 16384, ACTION_SPACE],
+    # ).to(device=device)
 
-# chess_model = CnnFc(
-#     conv_layers_num=3,
-#     in_channels_list=[12, 64, 128],
-#     out_channels_list=[64, 128, 256],
-#     kernel_size_list=[3, 3, 3],
-#     fc_layers_num=3,
-#     fc_in_features_list=[16384, 8192, 4096],
-#     fc_out_features_list=[8192, 4096, ACTION_SPACE],
-# ).to(device=device)
+    # chess_model = CnnFc(
+    #     conv_layers_num=3,
+    #     in_channels_list=[12, 64, 128],
+    #     out_channels_list=[64, 128, 256],
+    #     kernel_size_list=[3, 3, 3],
+    #     fc_layers_num=3,
+    #     fc_in_features_list=[16384, 8192, 4096],
+    #     fc_out_features_list=[8192, 4096, ACTION_SPACE],
+    # ).to(device=device)
 
-# FOR 4GB VRAM
-chess_model = CnnPlusFc(
-    conv_layers_num=3,
-    in_channels_list=[12, 64, 128],
-    out_channels_list=[64, 128, 256],
-    kernel_size_list=[3, 3, 3],
-    fc_layers_num=2,
-    fc_in_features_list=[16384, 2048],
-    fc_out_features_list=[2048, ACTION_SPACE],
-).to(device=device)
+    # FOR 4GB VRAM
+    chess_model = CnnPlusFc(
+        conv_layers_num=3,
+        in_channels_list=[12, 64, 128],
+        out_channels_list=[64, 128, 256],
+        kernel_size_list=[3, 3, 3],
+        fc_layers_num=2,
+        fc_in_features_list=[16384, 2048],
+        fc_out_features_list=[2048, ACTION_SPACE],
+    ).to(device=device)
 
 
-model, optimizer = Utils.create_default_model_and_optimizer()
+    model, optimizer = Utils.create_default_model_and_optimizer()
 
-# LOAD MODEL AND OPTIM FROM .pth
-# model_file_name = 'chess-rl-model-episodes6000-22-49-34_21-05-2025.pth'
-# Utils.load_model(model=model, optimizer=optimizer, file_name=model_file_name)
+    # LOAD MODEL AND OPTIM FROM .pth
+    # model_file_name = 'chess-rl-model-episodes6000-22-49-34_21-05-2025.pth'
+    # Utils.load_model(model=model, optimizer=optimizer, file_name=model_file_name)
 
 
-self_play = SelfPlay(device=device)
-self_play.train(env=chess_env, model=model, optimizer=optimizer)
-
+    # every played position is kept in the replay store when REPLAY_STORE_PATH is set
+    replay_store = ReplayStore(path=PathConfig.REPLAY_STORE_PATH_BASE) if PathConfig.REPLAY_STORE_PATH_BASE else None
 
+    if TrainingConfig.ACTOR_LEARNER:
+        actor_learner = ActorLearner(device=device, replay_store=replay_store)
+        actor_learner.train_actor_learner(model=model, optimizer=optimizer)
+    elif TrainingConfig.NUM_ENVS > 1:
+        self_play = SelfPlay(device=device, replay_store=replay_store)
+        self_play.train_batched(env=BatchedChessEnv(num_envs=TrainingConfig.NUM_ENVS), model=model, optimizer=optimizer)
+    else:
+        self_play = SelfPlay(device=device, replay_store=replay_store)
+        self_play.train(env=chess_env, model=model, optimizer=optimizer)
@@ -0,0 +1,95 @@
+import os
+import argparse
+import numpy as np
+from backend.chess_env.game_archive import GameArchive, RESULTS
+from backend.configs.path_config import PathConfig
+from backend.utils.pgn_reader import PgnReader
+
+
+# python -m backend.scripts.export_games export --out /tmp/games --min-episode 1000 --max-episode 2000
+# python -m backend.scripts.export_games pack --delete
+
+
+def export_games(archive: GameArchive, out_path: str, episodes, min_episode, max_episode, result, limit) -> None:
+    selected = np.ones(len(archive), dtype=np.bool_)
+
+    if episodes:
+        selected &= np.isin(archive.records['episode'], episodes)
+    if min_episode is not None:
+        selected &= archive.records['episode'] >= min_episode
+    if max_episode is not None:
+        selected &= archive.records['episode'] <= max_episode
+    if result is not None:
+        selected &= archive.records['result'] == RESULTS.index(result)
+
+    record_idxs = np.flatnonzero(selected)[:limit].tolist()
+    file_paths = archive.export(record_idxs=record_idxs, out_path=out_path)
+
+    print(f"Exported {len(file_paths)} games to: {out_path}")
+
+
+def pack_games(archive: GameArchive, games_path: str, delete: bool) -> None:
+    # moves the one-file-per-game pgns written by ChessEnv.save_game_pgn into the archive
+    packed = 0
+
+    with os.scandir(games_path) as entries:
+        file_paths = sorted(entry.path for entry in entries if entry.name.endswith(".pgn") and entry.is_file())
+
+    for file_path in file_paths:
+        match = GameArchive.FILE_NAME_PATTERN.match(os.path.basename(file_path))
+        parsed_game = PgnReader.parse(file_path=file_path)
+
+        if match is None or parsed_game is None:
+            print(f"Skipped: {file_path}")
+            continue
+
+        with open(file_path, "r", encoding="utf-8") as f:
+            pgn_str = f.read().strip()
+
+        try:
+            archive.append_game(pgn_str=pgn_str, episode=int(match["episode"]), mode=match["mode"], white_elo=int(match["white_elo"]),
+                                black_elo=int(match["black_elo"]), result=parsed_game.headers.get("result", "*"), moves_num=len(parsed_game.moves))
+        except ValueError as e:
+            print(f"Skipped: {file_path} ({e})")
+            continue
+
+        if delete:
+            os.remove(file_path)
+
+        packed += 1
+
+    print(f"Packed {packed} games into: {archive.path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export games from the game archive or pack saved pgn files into it")
+    parser.add_argument("--archive", default=PathConfig.GAME_ARCHIVE_PATH_BASE, help="game archive directory (GAME_ARCHIVE_PATH)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="write archived games as individual pgn files")
+    export_parser.add_argument("--out", required=True, help="output directory")
+    export_parser.add_argument("--episodes", type=int, nargs="*", help="exact episodes")
+    export_parser.add_argument("--min-episode", type=int)
+    export_parser.add_argument("--max-episode", type=int)
+    export_parser.add_argument("--result", choices=RESULTS)
+    export_parser.add_argument("--limit", type=int)
+
+    pack_parser = subparsers.add_parser("pack", help="append the pgn files of a directory to the archive")
+    pack_parser.add_argument("--games", default=PathConfig.SAVED_GAMES_PATH_BASE, help="directory of saved pgn files (SAVED_GAMES_PATH)")
+    pack_parser.add_argument("--delete", action="store_true", help="remove every packed pgn file")
+
+    args = parser.parse_args()
+
+    if not args.archive:
+        parser.error("no game archive, set GAME_ARCHIVE_PATH or pass --archive")
+
+    if args.command == "export":
+        archive = GameArchive(path=args.archive, read_only=True)
+        export_games(archive=archive, out_path=args.out, episodes=args.episodes, min_episode=args.min_episode,
+                     max_episode=args.max_episode, result=args.result, limit=args.limit)
+    else:
+        pack_games(archive=GameArchive(path=args.archive), games_path=args.games, delete=args.delete)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import os
+import argparse
+from backend.chess_agent.checkpoints.model_exporter import ModelExporter
+from backend.configs.path_config import PathConfig
+
+
+# python -m backend.scripts.export_model chess-rl-model-episodes6000.pth
+# python -m backend.scripts.export_model /path/to/model.pth --variants int8 onnx --min-agreement 0.98
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export cpu serving variants of a checkpoint and check their policy parity")
+    parser.add_argument("checkpoint", help="checkpoint path, or a file name in SAVED_MODELS_PATH")
+    parser.add_argument("--variants", nargs="+", choices=ModelExporter.VARIANTS, default=list(ModelExporter.VARIANTS))
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="warn below this top-1 agreement with the float model")
+
+    args = parser.parse_args()
+
+    filepath = args.checkpoint
+
+    if not os.path.isfile(filepath) and PathConfig.SAVED_MODELS_PATH_BASE:
+        filepath = os.path.join(PathConfig.SAVED_MODELS_PATH_BASE, args.checkpoint)
+
+    if not os.path.isfile(filepath):
+        parser.error(f"checkpoint not found: {args.checkpoint}")
+
+    if ModelExporter.is_variant(filepath=filepath):
+        parser.error(f"{args.checkpoint} is already an exported variant, pass the float checkpoint")
+
+    exported = ModelExporter.export(filepath=filepath, variants=tuple(args.variants), min_agreement=args.min_agreement)
+
+    for variant, report in exported.items():
+        print(f"{variant}: {report['path']} (top-1 agreement: {report['top1_agreement']:.1%})")
+
+
+if __name__ == "__main__":
+    main()
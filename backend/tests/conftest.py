@@ -0,0 +1,30 @@
+import random
+import chess
+import pytest
+from typing import List
+
+
+def play_random_positions(positions_num: int, seed: int = 0) -> List[chess.Board]:
+    # positions of random games, a new game starts when one ends
+    rng = random.Random(seed)
+    board = chess.Board()
+    boards = []
+
+    while len(boards) < positions_num:
+        if board.is_game_over():
+            board = chess.Board()
+
+        board.push(rng.choice(list(board.legal_moves)))
+        boards.append(board.copy())
+
+    return boards
+
+
+@pytest.fixture(scope="session")
+def random_boards() -> List[chess.Board]:
+    return play_random_positions(positions_num=500)
+
+
+@pytest.fixture(scope="session")
+def many_random_boards() -> List[chess.Board]:
+    return play_random_positions(positions_num=3000, seed=1)
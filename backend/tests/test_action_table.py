@@ -0,0 +1,64 @@
+import chess
+import numpy as np
+import pytest
+from backend.configs.game_config import GameConfig
+from backend.utils.action_table import ActionTable
+
+
+def test_legal_moves_round_trip(random_boards):
+    for board in random_boards:
+        for move in board.legal_moves:
+            action_no = ActionTable.get_move_idx(move=move)
+
+            assert 0 <= action_no < GameConfig.ACTION_SPACE
+            assert ActionTable.decode_action(board=board, action_no=action_no) == move
+
+
+def test_legal_moves_get_distinct_idxs(random_boards):
+    for board in random_boards:
+        action_idxs = ActionTable.get_legal_action_idxs(board=board)
+
+        assert len(np.unique(action_idxs)) == board.legal_moves.count()
+
+
+@pytest.mark.parametrize("promotion", [chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT])
+@pytest.mark.parametrize("uci", ["b7b8", "b7a8", "b7c8"])
+def test_promotions_round_trip(promotion, uci):
+    board = chess.Board("n1n4k/1P6/8/8/8/8/8/K7 w - - 0 1")
+    move = chess.Move.from_uci(uci + chess.piece_symbol(promotion))
+
+    assert board.is_legal(move)
+    assert ActionTable.decode_action(board=board, action_no=ActionTable.get_move_idx(move=move)) == move
+
+
+def test_black_promotion_round_trip():
+    board = chess.Board("k7/8/8/8/8/8/6p1/K7 b - - 0 1")
+
+    for promotion in (chess.QUEEN, chess.KNIGHT):
+        move = chess.Move(chess.G2, chess.G1, promotion=promotion)
+        assert ActionTable.decode_action(board=board, action_no=ActionTable.get_move_idx(move=move)) == move
+
+
+def test_castling_and_en_passant_round_trip():
+    for fen, uci in (("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1g1"), ("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1", "e8c8"),
+                     ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2", "e5d6")):
+        board = chess.Board(fen)
+        move = chess.Move.from_uci(uci)
+
+        assert ActionTable.decode_action(board=board, action_no=ActionTable.get_move_idx(move=move)) == move
+
+
+def test_illegal_and_out_of_range_actions_decode_to_none():
+    board = chess.Board()
+
+    assert ActionTable.decode_action(board=board, action_no=-1) is None
+    assert ActionTable.decode_action(board=board, action_no=GameConfig.ACTION_SPACE) is None
+    assert ActionTable.decode_action(board=board, action_no=ActionTable.get_move_idx(move=chess.Move.from_uci("e2e5"))) is None
+
+
+def test_legal_mask_matches_legal_moves(random_boards):
+    for board in random_boards[:50]:
+        mask = ActionTable.get_legal_mask(board=board)
+
+        assert mask.dtype == np.bool_ and mask.shape == (GameConfig.ACTION_SPACE,)
+        assert set(np.flatnonzero(mask)) == {ActionTable.get_move_idx(move=move) for move in board.legal_moves}
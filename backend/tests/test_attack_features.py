@@ -0,0 +1,80 @@
+import chess
+import numpy as np
+from backend.evals.attack_features import AttackFeatures
+from backend.evals.custom_eval import CustomEval
+
+
+# the move-list based terms AttackFeatures replaced
+def baseline_mobility(board: chess.Board) -> int:
+    board_copy = board.copy()
+
+    board_copy.turn = chess.WHITE
+    white_player_moves = board_copy.legal_moves.count()
+
+    board_copy.turn = chess.BLACK
+    black_player_moves = board_copy.legal_moves.count()
+
+    return white_player_moves - black_player_moves
+
+
+def baseline_center_control(board: chess.Board) -> int:
+    white_control = 0
+    black_control = 0
+
+    for sq in [chess.D4, chess.D5, chess.E4, chess.E5]:
+        white_control += len(board.attackers(chess.WHITE, sq))
+        black_control += len(board.attackers(chess.BLACK, sq))
+
+    return white_control - black_control
+
+
+def pseudo_legal_moves_num(board: chess.Board, color: chess.Color) -> int:
+    # pseudo-legal moves as if color was to move, without castling (what get_mobility counts)
+    board_copy = board.copy(stack=False)
+
+    if board_copy.turn != color:
+        board_copy.turn = color
+        board_copy.ep_square = None  # en passant belongs to the side to move only
+
+    return sum(1 for move in board_copy.pseudo_legal_moves if not board_copy.is_castling(move))
+
+
+def test_center_control_matches_baseline(many_random_boards):
+    for board in many_random_boards:
+        assert CustomEval(board=board).evaluate_center_control() == baseline_center_control(board=board)
+
+
+def test_exact_mobility_matches_baseline(many_random_boards):
+    for board in many_random_boards:
+        assert CustomEval(board=board).evaluate_mobility(exact=True) == baseline_mobility(board=board)
+
+
+def test_mobility_counts_pseudo_legal_moves(many_random_boards):
+    for board in many_random_boards:
+        for color in chess.COLORS:
+            assert AttackFeatures.get_mobility(board, color) == pseudo_legal_moves_num(board=board, color=color)
+
+
+def test_mobility_stays_close_to_baseline(many_random_boards):
+    gaps = []
+    in_check = []
+
+    for board in many_random_boards:
+        for color in chess.COLORS:
+            board_copy = board.copy(stack=False)
+            board_copy.turn = color
+            legal_moves_num = sum(1 for move in board_copy.legal_moves if not board_copy.is_castling(move))
+
+            # legal moves are a subset of the pseudo-legal ones
+            assert AttackFeatures.get_mobility(board, color) >= legal_moves_num
+
+        gaps.append(CustomEval(board=board).evaluate_mobility() - baseline_mobility(board=board))
+        in_check.append(board.is_check())
+
+    gaps = np.array(gaps)
+    in_check = np.array(in_check)
+
+    # no bias on average, the large gaps come from checks (most pseudo-legal moves of the side in check are illegal)
+    assert abs(gaps.mean()) < 1.0
+    assert np.median(np.abs(gaps)) <= 1.0
+    assert np.abs(gaps[~in_check]).mean() < 2.0
@@ -0,0 +1,54 @@
+import chess
+import numpy as np
+from backend.chess_env.batched_chess_env import BatchedChessEnv
+from backend.chess_env.observation_encoder import ObservationEncoder
+from backend.utils.action_table import ActionTable
+
+
+FOOLS_MATE = ["f2f3", "e7e5", "g2g4", "d8h4"]
+
+
+def play(env: BatchedChessEnv, ucis, **step_kwargs):
+    # the same moves on every board
+    for uci in ucis:
+        actions = np.full(env.num_envs, ActionTable.get_move_idx(move=chess.Move.from_uci(uci)))
+        observations, legal_masks, rewards, dones, infos = env.step(actions, **step_kwargs)
+
+    return dones, infos
+
+
+def test_finished_game_is_reset():
+    env = BatchedChessEnv(num_envs=2)
+    env.reset()
+
+    dones, infos = play(env=env, ucis=FOOLS_MATE)
+
+    assert dones.all()
+    assert all(info['final_board'].is_checkmate() for info in infos)
+    assert all(board == chess.Board() for board in env.boards)
+
+
+def test_finished_game_is_kept_without_auto_reset():
+    env = BatchedChessEnv(num_envs=2)
+    env.reset()
+
+    dones, infos = play(env=env, ucis=FOOLS_MATE, auto_reset=False)
+
+    assert dones.all() and all(board.is_checkmate() for board in env.boards)
+
+    env.reset_env(env_idx=1)
+
+    assert env.boards[0].is_checkmate() and env.boards[1] == chess.Board()
+    np.testing.assert_array_equal(env.observations[1], ObservationEncoder.encode(board=chess.Board()))
+    np.testing.assert_array_equal(np.flatnonzero(env.legal_masks[1]), np.sort(ActionTable.get_legal_action_idxs(board=chess.Board())))
+
+
+def test_inactive_envs_are_not_stepped():
+    env = BatchedChessEnv(num_envs=3)
+    env.reset()
+    active = np.array([True, False, True])
+
+    dones, infos = play(env=env, ucis=FOOLS_MATE, active=active, auto_reset=False)
+
+    assert dones.tolist() == [True, False, True]
+    assert infos[1] == {} and env.boards[1] == chess.Board()
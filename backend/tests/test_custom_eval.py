@@ -0,0 +1,42 @@
+import chess
+import numpy as np
+from backend.configs.game_config import GameConfig
+from backend.evals.custom_eval import CustomEval
+
+
+def evaluate_features(board: chess.Board) -> list:
+    evaluator = CustomEval(board=board)
+
+    return [
+        evaluator.evaluate_material(),
+        evaluator.evaluate_threats(),
+        evaluator.evaluate_king_shelter(),
+        evaluator.evaluate_mobility(exact=GameConfig.EXACT_MOBILITY),
+        evaluator.evaluate_center_control(),
+        evaluator.evaluate_pawn_structure(),
+    ]
+
+
+def test_evaluate_batch_matches_per_board_evaluation(many_random_boards):
+    CustomEval.configure_cache(maxsize=GameConfig.EVAL_CACHE_SIZE)  # cold cache, every term is computed by the batch
+
+    features = CustomEval.evaluate_batch(boards=many_random_boards)
+
+    np.testing.assert_array_equal(features, [evaluate_features(board=board) for board in many_random_boards])
+
+    # the second pass comes from the cache
+    np.testing.assert_array_equal(CustomEval.evaluate_batch(boards=many_random_boards), features)
+
+
+def test_score_batch_matches_evaluate_board(random_boards):
+    features = CustomEval.evaluate_batch(boards=random_boards)
+
+    for board, score in zip(random_boards, CustomEval.score_batch(features=features)):
+        evaluator = CustomEval(board=board)
+        evaluator.white_castling_reward_given = evaluator.black_castling_reward_given = True  # no castling bonus
+
+        assert np.isclose(evaluator.evaluate_board(), score)
+
+
+def test_evaluate_batch_of_no_boards():
+    assert CustomEval.evaluate_batch(boards=[]).shape == (0, len(CustomEval.FEATURE_NAMES))
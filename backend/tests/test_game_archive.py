@@ -0,0 +1,114 @@
+import os
+import gzip
+import chess
+import chess.pgn
+import pytest
+from backend.chess_env.game_archive import GameArchive
+
+
+def make_pgn(moves_num: int, result: str = "*") -> str:
+    board = chess.Board()
+
+    for _ in range(moves_num):
+        board.push(next(iter(board.legal_moves)))
+
+    game = chess.pgn.Game.from_board(board=board)
+    game.headers["result"] = result
+
+    return str(game)
+
+
+@pytest.fixture(params=[True, False], ids=["gzip", "plain"])
+def archive(request, tmp_path):
+    return GameArchive(path=str(tmp_path / "archive"), compress=request.param, segment_bytes=2048)
+
+
+def append(archive: GameArchive, episode: int, mode: str = "self-play-train", moves_num: int = 10) -> str:
+    return archive.append_game(pgn_str=make_pgn(moves_num=moves_num), episode=episode, mode=mode, white_elo=700 + episode,
+                               black_elo=650, result="*", moves_num=moves_num)
+
+
+def test_append_find_and_read(archive):
+    pgns = {}
+
+    for episode in range(1, 41):
+        file_name = append(archive=archive, episode=episode, moves_num=episode % 15)
+        pgns[file_name] = make_pgn(moves_num=episode % 15)
+
+    reader = GameArchive(path=archive.path, read_only=True)
+
+    assert len(reader) == 40
+    assert len(reader.segment_paths) > 1  # 2 KB segments
+
+    for file_name, pgn_str in pgns.items():
+        record_idx = reader.find(file_name=file_name)
+
+        assert reader.get_record_file_name(record_idx=record_idx) == file_name
+        assert reader.read_game(record_idx=record_idx) == pgn_str
+
+    assert reader.find(file_name="self-play-train-episode999-w_elo1-b_elo1.pgn") is None
+
+
+def test_reader_sees_games_appended_after_it_was_opened(archive):
+    append(archive=archive, episode=1)
+    reader = GameArchive(path=archive.path, read_only=True)
+
+    file_name = append(archive=archive, episode=2)
+
+    assert len(reader) == 1
+    assert reader.find(file_name=file_name) == 1
+    assert reader.find_episode(episode=2) == [1]
+
+
+def test_find_episode(archive):
+    append(archive=archive, episode=1)
+    append(archive=archive, episode=2)
+    append(archive=archive, episode=1, mode="vs-stockfish")
+
+    reader = GameArchive(path=archive.path, read_only=True)
+
+    assert reader.find_episode(episode=1) == [0, 2]
+    assert reader.find_episode(episode=1, mode="vs-stockfish") == [2]
+    assert reader.find_episode(episode=3) == []
+
+
+def test_export_round_trip(archive, tmp_path):
+    file_names = [append(archive=archive, episode=episode, moves_num=episode) for episode in range(1, 6)]
+    reader = GameArchive(path=archive.path, read_only=True)
+
+    file_paths = reader.export(record_idxs=list(range(5)), out_path=str(tmp_path / "exported"))
+
+    assert [os.path.basename(file_path) for file_path in file_paths] == file_names
+
+    for episode, file_path in enumerate(file_paths, start=1):
+        with open(file_path, "r", encoding="utf-8") as f:
+            assert f.read() == make_pgn(moves_num=episode)
+
+
+def test_gzip_segment_is_a_valid_pgn_file(tmp_path):
+    archive = GameArchive(path=str(tmp_path), compress=True)
+
+    for episode in range(3):
+        append(archive=archive, episode=episode, moves_num=episode + 1)
+
+    with gzip.open(archive.segment_paths[0], "rt", encoding="utf-8") as f:
+        games = [game for game in iter(lambda: chess.pgn.read_game(f), None)]
+
+    assert [len(list(game.mainline_moves())) for game in games] == [1, 2, 3]
+
+
+def test_mode_longer_than_record_field_is_rejected(archive):
+    with pytest.raises(ValueError):
+        append(archive=archive, episode=1, mode="m" * 31 + "ż")  # 33 bytes in utf-8
+
+    assert len(GameArchive(path=archive.path, read_only=True)) == 0
+
+
+def test_read_only_archive(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        GameArchive(path=str(tmp_path / "missing"), read_only=True)
+
+    GameArchive(path=str(tmp_path / "archive"))
+
+    with pytest.raises(PermissionError):
+        append(archive=GameArchive(path=str(tmp_path / "archive"), read_only=True), episode=1)
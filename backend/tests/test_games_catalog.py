@@ -0,0 +1,98 @@
+import os
+import chess
+import chess.pgn
+import pytest
+from backend.api.games_catalog import GamesCatalog, GamesQuery
+from backend.chess_env.game_archive import GameArchive
+from backend.configs.api_config import ApiConfig
+from backend.configs.path_config import PathConfig
+
+
+def write_game(games_path: str, mode: str, episode: int, white_elo: int, black_elo: int, moves: str, result: str) -> str:
+    game = chess.pgn.Game()
+    game.headers["result"] = result
+    node = game
+
+    for uci in moves.split():
+        node = node.add_variation(chess.Move.from_uci(uci))
+
+    file_name = GameArchive.get_file_name(mode=mode, episode=episode, white_elo=white_elo, black_elo=black_elo)
+
+    with open(os.path.join(games_path, file_name), "w", encoding="utf-8") as f:
+        f.write(str(game))
+
+    return file_name
+
+
+@pytest.fixture
+def games_path(tmp_path, monkeypatch):
+    games_path = tmp_path / "games"
+    games_path.mkdir()
+
+    monkeypatch.setattr(PathConfig, "SAVED_GAMES_PATH_BASE", str(games_path))
+    monkeypatch.setattr(PathConfig, "GAME_ARCHIVE_PATH_BASE", str(tmp_path / "archive"))
+    monkeypatch.setattr(ApiConfig, "GAMES_CATALOG_PATH", str(tmp_path / "catalog.sqlite"))
+    monkeypatch.setattr(ApiConfig, "GAMES_CATALOG_RESCAN_INTERVAL_S", 0.0)
+    monkeypatch.setattr(GamesCatalog, "_connection", None)
+    monkeypatch.setattr(GamesCatalog, "_dir_mtime_ns", None)
+    monkeypatch.setattr(GameArchive, "_archives", {})
+
+    yield str(games_path)
+
+    if GamesCatalog._connection is not None:
+        GamesCatalog._connection.close()
+
+
+def test_query_filters_sorts_and_pages(games_path):
+    write_game(games_path, "self-play-train", 1, 700, 650, "e2e4 e7e5", "1-0")
+    write_game(games_path, "self-play-train", 2, 720, 680, "d2d4", "0-1")
+    write_game(games_path, "vs-stockfish", 3, 900, 1500, "e2e4 e7e5 g1f3 b8c6", "1/2-1/2")
+
+    games, total = GamesCatalog.query(GamesQuery(sort_by="episode", descending=False))
+
+    assert total == 3
+    assert [game["episode"] for game in games] == [1, 2, 3]
+    assert [game["moves_num"] for game in games] == [2, 1, 4]
+    assert [game["result"] for game in games] == ["1-0", "0-1", "1/2-1/2"]
+
+    assert GamesCatalog.query(GamesQuery(mode="self-play-train"))[1] == 2
+    assert [game["episode"] for game in GamesCatalog.query(GamesQuery(min_moves=2, sort_by="episode"))[0]] == [3, 1]
+    assert [game["episode"] for game in GamesCatalog.query(GamesQuery(min_elo=660, max_elo=800))[0]] == [2]
+
+    games, total = GamesCatalog.query(GamesQuery(sort_by="episode", descending=False, offset=1, limit=1))
+
+    assert total == 3 and [game["episode"] for game in games] == [2]
+
+
+def test_refresh_parses_only_changed_files(games_path):
+    write_game(games_path, "self-play-train", 1, 700, 650, "e2e4", "*")
+    write_game(games_path, "self-play-train", 2, 700, 650, "e2e4", "*")
+    GamesCatalog.refresh(force=True)
+    files_parsed = GamesCatalog.files_parsed
+
+    file_name = write_game(games_path, "self-play-train", 3, 700, 650, "e2e4", "*")
+    GamesCatalog.refresh(force=True)
+
+    assert GamesCatalog.files_parsed == files_parsed + 1
+
+    os.remove(os.path.join(games_path, file_name))
+
+    assert GamesCatalog.query(GamesQuery())[1] == 2
+
+
+def test_archived_games_are_listed(games_path):
+    write_game(games_path, "self-play-train", 1, 700, 650, "e2e4", "*")
+
+    archive = GameArchive.open()
+    file_name = archive.append_game(pgn_str='[result "1-0"]\n\n1. e4 1-0', episode=2, mode="self-play-train", white_elo=710,
+                                    black_elo=640, result="1-0", moves_num=1)
+
+    games, total = GamesCatalog.query(GamesQuery(sort_by="episode", descending=False))
+
+    assert total == 2
+    assert games[1]["file_name"] == file_name and games[1]["result"] == "1-0"
+
+
+def test_unknown_sort_column_is_rejected(games_path):
+    with pytest.raises(ValueError):
+        GamesCatalog.query(GamesQuery(sort_by="size; DROP TABLE games"))
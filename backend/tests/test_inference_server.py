@@ -0,0 +1,89 @@
+import chess
+import torch
+import numpy as np
+import pytest
+from concurrent.futures import wait
+from backend.chess_agent.inference_server import InferenceServer, InferenceServerStoppedError
+from backend.chess_env.observation_encoder import ObservationEncoder
+from backend.configs.game_config import GameConfig
+from backend.utils.action_table import ActionTable
+
+
+class LinearPolicy(torch.nn.Module):
+
+    # full forward pass only, like an exported model
+    def __init__(self):
+        super().__init__()
+        self.linear = torch.nn.Linear(ObservationEncoder.PLANES_NUM * 64, GameConfig.ACTION_SPACE)
+        self.forward_calls = 0
+
+
+    def forward(self, x):
+        self.forward_calls += 1
+        return self.linear(x.flatten(start_dim=1))
+
+
+def submit_queued(server: InferenceServer, requests):
+    # submitted before the server runs, so all of them land in the first batch
+    futures = [server.submit(observation=observation, legal_action_idxs=legal_action_idxs) for observation, legal_action_idxs in requests]
+    server.start()
+    wait(futures, timeout=10)
+
+    return futures
+
+
+@pytest.fixture
+def server():
+    server = InferenceServer(model=LinearPolicy().eval(), device="cpu", max_batch_size=8, max_wait_ms=50)
+    yield server
+    server.stop()
+
+
+def test_requests_are_batched(server, random_boards):
+    boards = random_boards[:8]
+    futures = submit_queued(server=server, requests=[(ObservationEncoder.encode(board=board), ActionTable.get_legal_action_idxs(board=board))
+                                                     for board in boards])
+
+    for board, future in zip(boards, futures):
+        result = future.result()
+
+        assert result.action in ActionTable.get_legal_action_idxs(board=board)
+        assert result.probs.shape == (board.legal_moves.count(),) and np.isclose(result.probs.sum(), 1.0)
+
+    assert server.batches_num == 1 and server.model.forward_calls == 1
+
+
+def test_one_bad_request_fails_alone(server, random_boards):
+    boards = random_boards[:4]
+    requests = [(ObservationEncoder.encode(board=board), ActionTable.get_legal_action_idxs(board=board)) for board in boards]
+    requests.insert(2, (ObservationEncoder.encode(board=boards[0]), np.array([GameConfig.ACTION_SPACE + 10])))  # fails the forward pass
+
+    futures = submit_queued(server=server, requests=requests)
+
+    assert isinstance(futures[2].exception(), IndexError)
+
+    for board, future in zip(boards, futures[:2] + futures[3:]):
+        assert future.result().action in ActionTable.get_legal_action_idxs(board=board)
+
+
+def test_position_without_legal_moves_is_rejected(server):
+    mated = chess.Board("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3")
+    future = server.start().submit_board(board=mated)
+
+    with pytest.raises(ValueError, match="no legal moves"):
+        future.result(timeout=1)
+
+    assert server.requests_num == 0
+
+
+def test_stopped_server_drains_queued_requests_and_rejects_new_ones(random_boards):
+    server = InferenceServer(model=LinearPolicy().eval(), device="cpu", max_batch_size=4, max_wait_ms=1)
+    futures = [server.submit_board(board=board) for board in random_boards[:10]]
+
+    server.start()
+    server.stop(wait=True)
+
+    assert all(future.exception() is None for future in futures)
+
+    with pytest.raises(InferenceServerStoppedError):
+        server.submit_board(board=random_boards[0]).result(timeout=1)
@@ -0,0 +1,34 @@
+import chess
+import torch
+import numpy as np
+from backend.chess_env.observation_encoder import ObservationEncoder
+
+
+def encode_reference(board: chess.Board) -> np.ndarray:
+    # the piece loop the encoder replaced, (12, 8, 8) with the rank as the row and the file as the column
+    observation = np.zeros((ObservationEncoder.PLANES_NUM, 8, 8), dtype=np.float32)
+
+    for square, piece in board.piece_map().items():
+        row, col = divmod(square, 8)
+        observation[piece.piece_type - 1 + (0 if piece.color == chess.WHITE else 6), row, col] = 1
+
+    return observation
+
+
+def test_encode_matches_reference(random_boards):
+    for board in [chess.Board(), *random_boards]:
+        np.testing.assert_array_equal(ObservationEncoder.encode(board=board), encode_reference(board=board))
+
+
+def test_encode_batch_matches_encode(random_boards):
+    observations = ObservationEncoder.encode_batch(boards=random_boards[:64])
+
+    assert observations.shape == (64, ObservationEncoder.PLANES_NUM, 8, 8) and observations.dtype == np.float32
+    np.testing.assert_array_equal(observations, np.stack([ObservationEncoder.encode(board=board) for board in random_boards[:64]]))
+
+
+def test_encode_into_tensor(random_boards):
+    out = torch.empty((8, ObservationEncoder.PLANES_NUM, 8, 8), dtype=torch.float32)
+    ObservationEncoder.encode_batch(boards=random_boards[:8], out=out)
+
+    np.testing.assert_array_equal(out.numpy(), np.stack([encode_reference(board=board) for board in random_boards[:8]]))
@@ -0,0 +1,36 @@
+import torch
+import numpy as np
+from backend.configs.game_config import GameConfig
+from backend.utils.action_table import ActionTable
+from backend.utils.ragged_actions import RaggedActions
+
+
+def test_from_lists_matches_from_masks(random_boards):
+    boards = random_boards[:32]
+    legal_action_idxs_lst = [np.sort(ActionTable.get_legal_action_idxs(board=board)) for board in boards]
+    legal_masks = torch.from_numpy(np.stack([ActionTable.get_legal_mask(board=board) for board in boards]))
+
+    from_lists = RaggedActions.from_lists(legal_action_idxs_lst)
+    from_masks = RaggedActions.from_masks(legal_masks=legal_masks)
+
+    for name in ("batch_idxs", "action_idxs", "col_idxs", "lengths"):
+        assert torch.equal(getattr(from_lists, name), getattr(from_masks, name)), name
+
+
+def test_to_padded():
+    legal_actions = RaggedActions.from_lists([np.array([5, 7, 9]), np.array([1])])
+
+    padded = legal_actions.to_padded(values=torch.tensor([1.0, 2.0, 3.0, 4.0]))
+
+    assert torch.equal(padded, torch.tensor([[1.0, 2.0, 3.0], [4.0, float('-inf'), float('-inf')]]))
+    assert torch.equal(legal_actions.to_padded(values=legal_actions.action_idxs, fill_value=-1), torch.tensor([[5, 7, 9], [1, -1, -1]]))
+
+
+def test_legal_logits_of_a_full_forward_pass():
+    # a model without forward_legal (e.g. an exported one) is gathered at the legal actions
+    legal_actions = RaggedActions.from_lists([np.array([3, 0]), np.array([GameConfig.ACTION_SPACE - 1])])
+    logits = torch.arange(2 * GameConfig.ACTION_SPACE, dtype=torch.float32).view(2, -1)
+
+    legal_logits = legal_actions.get_legal_logits(model=lambda x: logits, x=torch.zeros(2))
+
+    assert legal_logits.tolist() == [3.0, 0.0, 2.0 * GameConfig.ACTION_SPACE - 1]
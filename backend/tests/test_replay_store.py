@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from backend.chess_agent.replay_store import ReplayStore
+from backend.chess_env.observation_encoder import ObservationEncoder
+from backend.utils.action_table import ActionTable
+
+
+def encode_episode(boards):
+    return np.concatenate([
+        ReplayStore.encode_position(board=board, action=ActionTable.get_move_idx(move=board.peek()), reward=float(i))
+        for i, board in enumerate(boards)
+    ])
+
+
+def test_append_flush_and_reopen(tmp_path, random_boards):
+    # a small segment size, so the episodes are split across segment files
+    store = ReplayStore(path=str(tmp_path), segment_size=16)
+    store.append_episode(positions=encode_episode(random_boards[:20]), episode=1)
+    store.append_episode(positions=encode_episode(random_boards[20:30]), episode=2)
+    store.flush()
+
+    reopened = ReplayStore(path=str(tmp_path), read_only=True)
+    positions = reopened.get(idxs=np.arange(30))
+
+    assert len(reopened) == 30 and len(reopened.segments) == 2
+    assert positions['episode'].tolist() == [1] * 20 + [2] * 10
+    assert np.flatnonzero(positions['done']).tolist() == [19, 29]
+    assert positions['reward'].tolist() == list(range(20)) + list(range(10))
+
+    with pytest.raises(PermissionError):
+        reopened.append_episode(positions=encode_episode(random_boards[:1]), episode=3)
+
+
+def test_positions_decode_to_boards_and_observations(tmp_path, random_boards):
+    boards = random_boards[:50]
+    positions = encode_episode(boards)
+
+    np.testing.assert_array_equal(ReplayStore.decode_observations(positions=positions), ObservationEncoder.encode_batch(boards=boards))
+
+    for board, position in zip(boards, positions):
+        assert ReplayStore.decode_board(position=position).fen().split()[:4] == board.fen().split()[:4]
+
+
+def test_sample(tmp_path, random_boards):
+    store = ReplayStore(path=str(tmp_path), segment_size=16)
+    store.append_episode(positions=encode_episode(random_boards[:40]), episode=7)
+
+    batch = store.sample(batch_size=64, rng=np.random.default_rng(0))
+
+    assert len(batch) == 64 and set(batch['episode'].tolist()) == {7}
+
+
+def test_sample_of_an_empty_store_raises(tmp_path):
+    with pytest.raises(ValueError, match="empty"):
+        ReplayStore(path=str(tmp_path)).sample(batch_size=8)
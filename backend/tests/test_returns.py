@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from backend.chess_agent.returns import Returns
+
+
+def discounted_returns_reference(rewards, dones, gamma):
+    returns = np.zeros(len(rewards), dtype=np.float32)
+    running = 0.0
+
+    for t in reversed(range(len(rewards))):
+        running = rewards[t] + gamma * running * (not dones[t])
+        returns[t] = running
+
+    return returns
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_discounted_returns_match_reference(seed):
+    rng = np.random.default_rng(seed)
+    rewards = rng.normal(size=200).astype(np.float32)
+    dones = rng.random(200) < 0.05
+    dones[-1] = True
+
+    np.testing.assert_allclose(Returns.discounted_returns(rewards=rewards, dones=dones, gamma=0.99),
+                               discounted_returns_reference(rewards=rewards, dones=dones, gamma=0.99), rtol=1e-5, atol=1e-5)
+
+
+def test_discounted_returns_restart_at_episode_boundaries():
+    returns = Returns.discounted_returns(rewards=[1.0, 1.0, 1.0, 1.0], dones=[False, True, False, True], gamma=0.5)
+
+    np.testing.assert_allclose(returns, [1.5, 1.0, 1.5, 1.0])
+
+
+def test_unfinished_tail_is_an_episode():
+    returns = Returns.discounted_returns(rewards=[1.0, 1.0, 2.0, 2.0], dones=[False, True, False, False], gamma=0.5)
+
+    np.testing.assert_allclose(returns, [1.5, 1.0, 3.0, 2.0])
+
+
+def test_empty_rewards():
+    assert len(Returns.discounted_returns(rewards=[], dones=[], gamma=0.99)) == 0
+
+
+def test_batched_returns_bootstrap_from_last_returns():
+    rewards = np.array([[1.0, 0.0], [1.0, 1.0]], dtype=np.float32)
+    dones = np.array([[False, False], [True, False]])
+
+    returns = Returns.discounted_returns_batched(rewards=rewards, dones=dones, gamma=0.5, last_returns=np.array([10.0, 10.0]))
+
+    np.testing.assert_allclose(returns, [[1.5, 3.0], [1.0, 6.0]])
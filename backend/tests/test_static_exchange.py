@@ -0,0 +1,33 @@
+import chess
+import pytest
+from backend.evals.static_exchange import StaticExchange
+
+
+@pytest.mark.parametrize("fen, uci, expected", [
+    ("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1", "e1e5", 1),  # undefended pawn
+    ("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1", "d3e5", -2),  # knight for a pawn after the exchanges on e5
+    ("4k3/8/3p4/4n3/8/8/8/3KR3 w - - 0 1", "e1e5", -2),  # rook for a knight defended by a pawn
+    ("4k3/8/2p5/3p4/4Q3/8/8/4K3 w - - 0 1", "e4d5", -8),  # queen for a pawn
+    ("4k3/4r3/8/4p3/8/8/4R3/4R1K1 w - - 0 1", "e2e5", 1),  # the rook behind recaptures (x-ray)
+    ("4k3/4r3/8/4p3/8/8/8/4R1K1 w - - 0 1", "e1e5", -4),  # the same without the second rook
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2", "e5d6", 1),  # en passant
+    ("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1", "b7b8q", 8),  # promotion
+])
+def test_evaluate_move_on_known_exchanges(fen, uci, expected):
+    board = chess.Board(fen)
+    move = chess.Move.from_uci(uci)
+
+    assert board.is_legal(move)
+    assert StaticExchange.evaluate_move(board=board, move=move) == expected
+
+
+def test_evaluate_square():
+    board = chess.Board("4k3/8/2p5/3n4/4P3/8/8/4K3 w - - 0 1")
+
+    assert StaticExchange.evaluate_square(board=board, square=chess.D5, attacker_color=chess.WHITE) == 2  # pawn takes a defended knight
+    assert StaticExchange.evaluate_square(board=board, square=chess.E4, attacker_color=chess.BLACK) == 0  # nothing attacks e4
+
+    board = chess.Board("4k3/8/5n2/8/4P3/8/8/4K3 b - - 0 1")
+
+    assert StaticExchange.evaluate_square(board=board, square=chess.E4, attacker_color=chess.BLACK) == 1  # undefended pawn
+    assert StaticExchange.evaluate_square(board=board, square=chess.F6, attacker_color=chess.WHITE) == 0  # no attacker
@@ -0,0 +1,126 @@
+import chess
+import torch
+import numpy as np
+from typing import Tuple, Union, Optional, Iterable, AbstractSet
+from backend.configs.game_config import GameConfig
+
+
+# action idx = from_square * 73 + plane
+#   planes [0:56]  - queen-like moves: 8 directions * 7 distances (queen promotions are encoded here too)
+#   planes [56:64] - knight moves
+#   planes [64:73] - underpromotions: 3 directions (capture to lower file, push, capture to higher file) * 3 pieces
+QUEEN_DIRECTIONS = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]  # (delta_row, delta_col)
+KNIGHT_DIRECTIONS = [(2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2), (1, -2), (2, -1)]
+UNDERPROMOTION_PIECES = [chess.KNIGHT, chess.BISHOP, chess.ROOK]
+PLANES_NUM = 73
+
+
+def build_action_tables() -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    idx_to_from = np.full(GameConfig.ACTION_SPACE, -1, dtype=np.int64)  # -1 = plane leads off the board
+    idx_to_to = np.zeros(GameConfig.ACTION_SPACE, dtype=np.int64)
+    idx_to_promotion = np.zeros(GameConfig.ACTION_SPACE, dtype=np.int64)  # 0 = no (or queen) promotion
+    move_to_idx = np.full((64, 64, 7), -1, dtype=np.int64)  # [from_square, to_square, promotion piece type or 0]
+
+    for from_square in range(64):
+        from_row, from_col = divmod(from_square, 8)
+
+        targets = []  # (plane, delta_row, delta_col, promotion)
+
+        for direction_idx, (delta_row, delta_col) in enumerate(QUEEN_DIRECTIONS):
+            for distance in range(1, 8):
+                targets.append((direction_idx * 7 + distance - 1, delta_row * distance, delta_col * distance, 0))
+
+        for knight_idx, (delta_row, delta_col) in enumerate(KNIGHT_DIRECTIONS):
+            targets.append((56 + knight_idx, delta_row, delta_col, 0))
+
+        # only pawns on the 7th rank (white) or 2nd rank (black) can promote, so from_row defines the direction
+        if from_row in (1, 6):
+            promotion_row_delta = 1 if from_row == 6 else -1
+
+            for direction_idx, delta_col in enumerate((-1, 0, 1)):
+                for piece_idx, piece_type in enumerate(UNDERPROMOTION_PIECES):
+                    targets.append((64 + direction_idx * 3 + piece_idx, promotion_row_delta, delta_col, piece_type))
+
+        for plane, delta_row, delta_col, promotion in targets:
+            to_row, to_col = from_row + delta_row, from_col + delta_col
+
+            if not (0 <= to_row < 8 and 0 <= to_col < 8):
+                continue
+
+            idx = from_square * PLANES_NUM + plane
+            to_square = to_row * 8 + to_col
+
+            idx_to_from[idx] = from_square
+            idx_to_to[idx] = to_square
+            idx_to_promotion[idx] = promotion
+            move_to_idx[from_square, to_square, promotion] = idx
+
+            if promotion == 0:
+                move_to_idx[from_square, to_square, chess.QUEEN] = idx
+
+    return idx_to_from, idx_to_to, idx_to_promotion, move_to_idx
+
+
+class ActionTable:
+
+    IDX_TO_FROM, IDX_TO_TO, IDX_TO_PROMOTION, MOVE_TO_IDX = build_action_tables()
+
+
+    @staticmethod
+    def get_move_idx(move: chess.Move) -> int:
+        return int(ActionTable.MOVE_TO_IDX[move.from_square, move.to_square, move.promotion or 0])
+
+
+    @staticmethod
+    def decode_action(board: chess.Board, action_no: int, legal_moves: Optional[AbstractSet[chess.Move]] = None) -> Optional[chess.Move]:
+        action_no = int(action_no)
+
+        if not 0 <= action_no < GameConfig.ACTION_SPACE or ActionTable.IDX_TO_FROM[action_no] < 0:
+            return None
+
+        from_square = int(ActionTable.IDX_TO_FROM[action_no])
+        to_square = int(ActionTable.IDX_TO_TO[action_no])
+        promotion = int(ActionTable.IDX_TO_PROMOTION[action_no]) or None
+
+        # pawn reaching the last rank through a queen-like plane is a queen promotion
+        if promotion is None and board.pawns & chess.BB_SQUARES[from_square] and chess.square_rank(to_square) in (0, 7):
+            promotion = chess.QUEEN
+
+        move = chess.Move(from_square=from_square, to_square=to_square, promotion=promotion)
+        is_legal = move in legal_moves if legal_moves is not None else board.is_legal(move)
+
+        return move if is_legal else None
+
+
+    @staticmethod
+    def get_action_idxs(moves: Iterable[chess.Move]) -> np.ndarray:
+        moves = np.array([(move.from_square, move.to_square, move.promotion or 0) for move in moves], dtype=np.int64).reshape(-1, 3)
+
+        return ActionTable.MOVE_TO_IDX[moves[:, 0], moves[:, 1], moves[:, 2]]
+
+
+    @staticmethod
+    def get_legal_action_idxs(board: chess.Board) -> np.ndarray:
+        return ActionTable.get_action_idxs(moves=board.legal_moves)
+
+
+    @staticmethod
+    def get_mask(action_idxs: np.ndarray, out: Union[np.ndarray, None] = None) -> np.ndarray:
+        if out is None:
+            out = np.zeros(GameConfig.ACTION_SPACE, dtype=np.bool_)
+        else:
+            out[:] = False
+
+        out[action_idxs] = True
+
+        return out
+
+
+    @staticmethod
+    def get_legal_mask(board: chess.Board, out: Union[np.ndarray, None] = None) -> np.ndarray:
+        return ActionTable.get_mask(action_idxs=ActionTable.get_legal_action_idxs(board=board), out=out)
+
+
+    @staticmethod
+    def get_legal_mask_tensor(board: chess.Board, device: Union[torch.device, str] = "cpu") -> torch.Tensor:
+        return torch.from_numpy(ActionTable.get_legal_mask(board=board)).to(device=device)
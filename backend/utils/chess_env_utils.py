@@ -1,48 +1,26 @@
 import chess
-from typing import List, Tuple
+import numpy as np
+from typing import Tuple, Optional
 from backend.configs.game_config import GameConfig
+from backend.utils.action_table import ActionTable
+from backend.utils.legal_move_cache import LegalMoveCache
 
 
 class ChessEnvUtils:
 
     @staticmethod
-    def get_legal_action_idxs(board: chess.Board) -> List[int]:
-        legal_moves = list(board.legal_moves)
-        legal_moves_idx = []
-
-        for move in legal_moves:
-            legal_moves_idx.append(ChessEnvUtils.get_move_idx(move=move))
-
-        return legal_moves_idx
+    def get_legal_action_idxs(board: chess.Board) -> np.ndarray:
+        return LegalMoveCache.get_legal_action_idxs(board=board)
 
 
     @staticmethod
-    def get_offset_move(move: chess.Move) -> int:
-        if move.promotion:
-            return 225 + (move.promotion - 2)  # move_str.promotion - 2 = skip pawn
-
-        from_square = move.from_square  # idx of square
-        to_square = move.to_square  # idx of square
-
-        from_square_row, from_square_col = divmod(from_square, 8)
-        to_square_row, to_square_col = divmod(to_square, 8)
-
-        delta_row = to_square_row - from_square_row  # the min-max of delta_row is [-7, 7]
-        delta_col = to_square_col - from_square_col  # the min-max of delta_col is [-7, 7]
-
-        delta_row += 7  # avoid negative nums -> [0, 14]
-        delta_col += 7  # avoid negative nums -> [0, 14]
-
-        return delta_row * 15 + delta_col
+    def get_legal_mask(board: chess.Board, out: Optional[np.ndarray] = None) -> np.ndarray:
+        return ActionTable.get_mask(action_idxs=LegalMoveCache.get_legal_action_idxs(board=board), out=out)
 
 
     @staticmethod
     def get_move_idx(move: chess.Move) -> int:
-        from_square = move.from_square
-
-        move_offset = ChessEnvUtils.get_offset_move(move=move)
-
-        return from_square * 73 + move_offset  # we have 73 because each square can have 4762 / 64 = 74.4 (73 idx)
+        return ActionTable.get_move_idx(move=move)
 
 
     @staticmethod
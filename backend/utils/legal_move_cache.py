@@ -0,0 +1,96 @@
+import chess
+import threading
+import numpy as np
+from dataclasses import dataclass
+from cachetools import LRUCache
+from typing import Tuple, FrozenSet, Dict, Hashable
+from backend.configs.game_config import GameConfig
+from backend.utils.action_table import ActionTable
+
+
+@dataclass(frozen=True)
+class LegalMoves:
+    moves: Tuple[chess.Move, ...]
+    move_set: FrozenSet[chess.Move]
+    action_idxs: np.ndarray
+
+
+class LegalMoveCache:
+
+    # shared by every thread of the process (e.g. the PositionAnalyzer executor), an LRUCache reorders itself even on get
+    _cache: LRUCache[Hashable, LegalMoves] = LRUCache(maxsize=GameConfig.LEGAL_MOVE_CACHE_SIZE)
+    _lock = threading.Lock()
+
+    hits: int = 0
+    misses: int = 0
+
+
+    @classmethod
+    def get(cls, board: chess.Board) -> LegalMoves:
+        # position hash: pieces, turn, castling rights and a legal en passant square (the same key python-chess uses for repetitions)
+        key = board._transposition_key()
+
+        with cls._lock:
+            legal_moves = cls._cache.get(key)
+
+            if legal_moves is not None:
+                cls.hits += 1
+                return legal_moves
+
+            cls.misses += 1
+
+        moves = tuple(board.generate_legal_moves())
+        action_idxs = ActionTable.get_action_idxs(moves=moves)
+        action_idxs.setflags(write=False)  # the same array is returned to every caller
+
+        legal_moves = LegalMoves(
+            moves=moves,
+            move_set=frozenset(moves),
+            action_idxs=action_idxs,
+        )
+
+        with cls._lock:
+            cls._cache[key] = legal_moves
+
+        return legal_moves
+
+
+    @classmethod
+    def get_legal_moves(cls, board: chess.Board) -> Tuple[chess.Move, ...]:
+        return cls.get(board=board).moves
+
+
+    @classmethod
+    def get_legal_action_idxs(cls, board: chess.Board) -> np.ndarray:
+        return cls.get(board=board).action_idxs
+
+
+    @classmethod
+    def is_checkmate(cls, board: chess.Board) -> bool:
+        return board.is_check() and not cls.get(board=board).moves
+
+
+    @classmethod
+    def is_stalemate(cls, board: chess.Board) -> bool:
+        return not board.is_check() and not cls.get(board=board).moves
+
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, float]:
+        with cls._lock:
+            requests = cls.hits + cls.misses
+
+            return {
+                'hits': cls.hits,
+                'misses': cls.misses,
+                'hit_rate': cls.hits / requests if requests else 0.0,
+                'size': len(cls._cache),
+            }
+
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            cls._cache.clear()
+            cls.hits = 0
+            cls.misses = 0
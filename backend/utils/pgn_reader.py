@@ -0,0 +1,118 @@
+import io
+import os
+import chess
+import logging
+import chess.pgn
+import threading
+from cachetools import LRUCache
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from backend.chess_env.game_archive import GameArchive
+from backend.configs.api_config import ApiConfig
+
+
+@dataclass(frozen=True)
+class ParsedGame:
+    headers: Dict[str, str]
+    moves: List[str]  # mainline in uci, up to the first illegal move
+    errors: List[Exception]
+
+
+class MainlineVisitor(chess.pgn.BaseVisitor):
+
+    # collects only the headers and the mainline, no GameNode tree is built, variations are skipped unparsed
+    def begin_game(self):
+        self.headers = {}
+        self.moves = []
+        self.errors = []
+
+
+    def visit_header(self, tagname: str, tagvalue: str):
+        self.headers[tagname] = tagvalue
+
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+
+    def visit_move(self, board: chess.Board, move: chess.Move):
+        self.moves.append(move.uci())
+
+
+    def handle_error(self, error: Exception):
+        # logged and kept like chess.pgn.GameBuilder does, the moves before the error are still returned
+        logging.getLogger("chess.pgn").error("%s while parsing %r", error, self.headers)
+        self.errors.append(error)
+
+
+    def result(self) -> ParsedGame:
+        return ParsedGame(headers=self.headers, moves=self.moves, errors=self.errors)
+
+
+class PgnReader:
+
+    # parsed saved games, an entry is valid as long as the (mtime_ns, size) of the file is the same
+    _cache: LRUCache = LRUCache(maxsize=ApiConfig.PGN_CACHE_SIZE)
+    _lock = threading.Lock()
+
+    hits = 0
+    misses = 0
+
+
+    @classmethod
+    def read(cls, file_path: str) -> Optional[ParsedGame]:
+        stat = os.stat(file_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with cls._lock:
+            cached: Optional[Tuple[Tuple[int, int], Optional[ParsedGame]]] = cls._cache.get(file_path)
+
+            if cached is not None and cached[0] == version:
+                cls.hits += 1
+                return cached[1]
+
+            cls.misses += 1
+
+        parsed_game = PgnReader.parse(file_path=file_path)
+
+        with cls._lock:
+            cls._cache[file_path] = (version, parsed_game)
+
+        return parsed_game
+
+
+    @classmethod
+    def read_archived(cls, archive: GameArchive, record_idx: int) -> Optional[ParsedGame]:
+        # archived games never change, their place in the archive is the key
+        key = archive.get_location(record_idx=record_idx)
+
+        with cls._lock:
+            cached = cls._cache.get(key)
+
+            if cached is not None:
+                cls.hits += 1
+                return cached[1]
+
+            cls.misses += 1
+
+        parsed_game = chess.pgn.read_game(io.StringIO(archive.read_game(record_idx=record_idx)), Visitor=MainlineVisitor)
+
+        with cls._lock:
+            cls._cache[key] = (None, parsed_game)
+
+        return parsed_game
+
+
+    @staticmethod
+    def parse(file_path: str) -> Optional[ParsedGame]:
+        # the file is streamed by the pgn tokenizer, None for a file without a game
+        with open(file_path, "r", encoding="utf-8") as f:
+            return chess.pgn.read_game(f, Visitor=MainlineVisitor)
+
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            cls._cache.clear()
+            cls.hits = 0
+            cls.misses = 0
@@ -0,0 +1,61 @@
+import torch
+import numpy as np
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class RaggedActions:
+    # legal actions of N positions flattened into one dimension, row after row
+    batch_idxs: torch.Tensor  # (L,) position of every legal action in the batch
+    action_idxs: torch.Tensor  # (L,) action idx in the full action space
+    col_idxs: torch.Tensor  # (L,) index of the action inside its row
+    lengths: torch.Tensor  # (N,) legal actions num of every position
+
+
+    @staticmethod
+    def from_lists(legal_action_idxs_lst: List[np.ndarray], device='cpu') -> 'RaggedActions':
+        lengths = np.array([len(legal_action_idxs) for legal_action_idxs in legal_action_idxs_lst], dtype=np.int64)
+        offsets = np.cumsum(lengths) - lengths
+
+        batch_idxs = np.repeat(np.arange(len(lengths)), lengths)
+        action_idxs = np.concatenate(legal_action_idxs_lst).astype(np.int64, copy=False)
+        col_idxs = np.arange(len(batch_idxs)) - offsets[batch_idxs]
+
+        return RaggedActions(
+            batch_idxs=torch.from_numpy(batch_idxs).to(device=device),
+            action_idxs=torch.from_numpy(action_idxs).to(device=device),
+            col_idxs=torch.from_numpy(col_idxs).to(device=device),
+            lengths=torch.from_numpy(lengths).to(device=device),
+        )
+
+
+    @staticmethod
+    def from_masks(legal_masks: torch.Tensor) -> 'RaggedActions':
+        # legal_masks = (N, ACTION_SPACE) bool
+        batch_idxs, action_idxs = legal_masks.nonzero(as_tuple=True)
+        lengths = legal_masks.sum(dim=1)
+        offsets = torch.cumsum(lengths, dim=0) - lengths
+
+        return RaggedActions(
+            batch_idxs=batch_idxs,
+            action_idxs=action_idxs,
+            col_idxs=torch.arange(len(batch_idxs), device=legal_masks.device) - offsets[batch_idxs],
+            lengths=lengths,
+        )
+
+
+    def to_padded(self, values: torch.Tensor, fill_value: float = float('-inf')) -> torch.Tensor:
+        # (L,) values -> (N, max legal actions num) padded with fill_value
+        padded = values.new_full((len(self.lengths), int(self.lengths.max())), fill_value)
+        padded[self.batch_idxs, self.col_idxs] = values
+
+        return padded
+
+
+    def get_legal_logits(self, model, x: torch.Tensor) -> torch.Tensor:
+        # exported models (TorchScript, ONNX) lose forward_legal, they fall back to the full forward pass
+        if hasattr(model, 'forward_legal'):
+            return model.forward_legal(x, self)
+
+        return model(x)[self.batch_idxs, self.action_idxs]
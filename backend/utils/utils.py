@@ -2,10 +2,9 @@ import os
 from typing import List, Tuple, Any
 import torch
 import torch.optim as optim
-import chess.pgn
 import matplotlib.pyplot as plt
 from datetime import datetime
-from io import StringIO
+from backend.utils.pgn_reader import PgnReader
 from backend.chess_agent.models.policy import CnnPlusFc
 from backend.chess_agent.agent_config import UPDATE_FREQUENCY, EPISODES, LEARNING_RATE, GAMMA, EPSILON, INIT_EPISODE
 from backend.config import SAVED_MODELS_PATH, SAVED_GRAPHS_PATH, TERMINAL_BONUS, CASTLING_BONUS, EVAL_SCALING_FACTOR
@@ -58,8 +57,22 @@ class Utils:
         print(f"Model and optimizer were loaded!")
 
 
+    @staticmethod
+    def load_inference_model(file_name: str, mmap: bool = False):
+        from backend.chess_agent.checkpoints.checkpoint_manager import CheckpointManager
+        return CheckpointManager.load_inference_model(filepath=str(os.path.join(SAVED_MODELS_PATH, file_name)), mmap=mmap)
+
+
     @staticmethod
     def create_default_model_and_optimizer() -> Tuple[CnnPlusFc, torch.optim.Optimizer]:
+        default_model = Utils.create_default_model()
+        default_optimizer = optim.Adam(default_model.parameters(), lr=LEARNING_RATE)
+
+        return default_model, default_optimizer
+
+
+    @staticmethod
+    def create_default_model() -> CnnPlusFc:
         device = Utils.get_device()
 
         default_model = CnnPlusFc(
@@ -72,30 +85,32 @@ class Utils:
             fc_out_features_list=[2048, 4762],
         ).to(device=device)
 
-        default_optimizer = optim.Adam(default_model.parameters(), lr=LEARNING_RATE)
-
-        return default_model, default_optimizer
+        return default_model
 
 
     @staticmethod
     def extract_data_from_pgn(file):
-        with open(file, 'r') as f:
-            pgn_text = f.read()
+        # the replay viewer asks for the same games again and again, they are parsed once per file version
+        return Utils.get_saved_game_content(parsed_game=PgnReader.read(file_path=file))
 
-        pgn_io = StringIO(pgn_text)
-        game = chess.pgn.read_game(pgn_io)
 
-        white_elo = game.headers["white_elo"].split('.')[0]
-        black_elo = game.headers["black_elo"].split('.')[0]
-        result = game.headers["result"]
-
-        moves = []
+    @staticmethod
+    def extract_data_from_archive(archive, record_idx: int):
+        return Utils.get_saved_game_content(parsed_game=PgnReader.read_archived(archive=archive, record_idx=record_idx))
 
-        for move in game.mainline_moves():
-            moves.append(move.uci())
 
+    @staticmethod
+    def get_saved_game_content(parsed_game):
         from backend.api.models import SavedGameContent
-        return SavedGameContent(white_elo=white_elo, black_elo=black_elo, result=result, moves=moves)
+
+        if parsed_game is None:  # a file without a game
+            return SavedGameContent(white_elo='-1', black_elo='-1', result="", moves=[])
+
+        white_elo = parsed_game.headers["white_elo"].split('.')[0]
+        black_elo = parsed_game.headers["black_elo"].split('.')[0]
+        result = parsed_game.headers["result"]
+
+        return SavedGameContent(white_elo=white_elo, black_elo=black_elo, result=result, moves=list(parsed_game.moves))
 
 
     @staticmethod